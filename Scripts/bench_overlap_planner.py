@@ -0,0 +1,168 @@
+"""
+Benchmark the overlap planning mode against random picks on a synthetic
+recipe corpus: distinct ingredients per plan, shopping list rows from
+generate_shopping_list_data and planning time.
+
+Usage (from the repository root):
+    python Scripts/bench_overlap_planner.py --recipes 5000 --plans 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("EVENTLET_NO_GREENDNS", "yes")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (
+    app,
+    db,
+    Ingredient,
+    Recipe,
+    generate_shopping_list_data,
+    get_plan_recipe_ids,
+)
+from overlap import IngredientMatrix, minimize_shopping_list
+from planner import (
+    MEAL_TYPE_BITS,
+    WEEK_DAYS,
+    PlanSettings,
+    RecipeCandidate,
+    build_candidate_snapshot,
+    plan_meals,
+)
+
+
+def make_corpus(num_recipes, num_ingredients, seed):
+    """
+    Synthetic recipes: 6-12 ingredients each drawn from a Zipf-like
+    vocabulary (a few staples are in many recipes, most items in few).
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"ingredient {i}" for i in range(num_ingredients)]
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(num_ingredients)]
+    candidates, ingredients = [], {}
+    for recipe_id in range(1, num_recipes + 1):
+        mask = 0
+        while not mask:
+            mask = sum(
+                bit
+                for bit, share in zip(MEAL_TYPE_BITS.values(), (0.2, 0.4, 0.6))
+                if rng.random() < share
+            )
+        candidates.append(RecipeCandidate(recipe_id, rng.choice((2, 4, 6)), mask))
+        names = set()
+        while len(names) < rng.randint(6, 12):
+            names.add(rng.choices(vocabulary, weights)[0])
+        ingredients[recipe_id] = sorted(names)
+    return candidates, ingredients
+
+
+def load_corpus(candidates, ingredients):
+    """Writes the corpus through Core inserts (no per-row ORM work)."""
+    db.session.execute(
+        Recipe.__table__.insert(),
+        [
+            {
+                "id": c.id,
+                "name": f"Recipe {c.id}",
+                "servings": c.servings,
+                "is_breakfast": bool(c.meal_mask & MEAL_TYPE_BITS["Breakfast"]),
+                "is_lunch": bool(c.meal_mask & MEAL_TYPE_BITS["Lunch"]),
+                "is_dinner": bool(c.meal_mask & MEAL_TYPE_BITS["Dinner"]),
+            }
+            for c in candidates
+        ],
+    )
+    db.session.execute(
+        Ingredient.__table__.insert(),
+        [
+            {
+                "recipe_id": recipe_id,
+                "name": name,
+                "quantity": "1",
+                "quantity_value": 1.0,
+                "unit": "",
+                "unit_canonical": "",
+            }
+            for recipe_id, names in ingredients.items()
+            for name in names
+        ],
+    )
+    db.session.commit()
+
+
+def shopping_rows(plan_ids):
+    return sum(len(items) for items in generate_shopping_list_data(plan_ids).values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--ingredients", type=int, default=1500)
+    parser.add_argument("--plans", type=int, default=50)
+    parser.add_argument("--people", type=int, default=2)
+    parser.add_argument("--repeat-interval", type=int, default=7)
+    parser.add_argument("--budget", type=float, default=0.05, help="seconds per plan")
+    args = parser.parse_args()
+
+    candidates, ingredients = make_corpus(args.recipes, args.ingredients, seed=1)
+    snapshot = build_candidate_snapshot(candidates)
+    start = time.perf_counter()
+    matrix = IngredientMatrix(ingredients)
+    print(
+        f"{args.recipes:,} recipes x {len(matrix.columns):,} ingredients, "
+        f"matrix built in {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+
+    settings = PlanSettings(meal_repeat_interval=args.repeat_interval)
+    days = list(WEEK_DAYS)
+    random_plans, overlap_plans = [], []
+    random_time = overlap_time = 0.0
+    for seed in range(args.plans):
+        start = time.perf_counter()
+        result = plan_meals(
+            snapshot, settings, {}, args.people, days=days, rng=random.Random(seed)
+        )
+        random_time += time.perf_counter() - start
+        start = time.perf_counter()
+        improved = minimize_shopping_list(
+            result,
+            snapshot,
+            matrix,
+            settings,
+            args.people,
+            rng=random.Random(seed),
+            time_budget=args.budget,
+        )
+        overlap_time += time.perf_counter() - start
+        random_plans.append(result.plan_ids)
+        overlap_plans.append(improved.plan_ids)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        with app.app_context():
+            db.create_all()
+            load_corpus(candidates, ingredients)
+            with app.test_request_context("/"):
+                for label, plans, elapsed in (
+                    ("random", random_plans, random_time),
+                    ("overlap", overlap_plans, random_time + overlap_time),
+                ):
+                    distinct = [
+                        matrix.distinct_ingredients(get_plan_recipe_ids(plan))
+                        for plan in plans
+                    ]
+                    rows = [shopping_rows(plan) for plan in plans]
+                    print(
+                        f"{label:<8} {statistics.mean(distinct):8.1f} ingredients  "
+                        f"{statistics.mean(rows):8.1f} shopping rows  "
+                        f"{elapsed / args.plans * 1000:8.2f} ms/plan"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark shopping list materialization: the old per-object ORM path
+(delete-all + one ShoppingListItem per row) against sync_shopping_list,
+which writes through Core executemany statements.
+
+Usage (from the repository root):
+    python Scripts/bench_shopping_list.py --accounts 500 --items 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("EVENTLET_NO_GREENDNS", "yes")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, socketio, Account, ShoppingListItem, sync_shopping_list
+
+
+def make_list(num_items, variant=0):
+    """Synthetic generate_shopping_list_data output spread over 10 aisles."""
+    data = {}
+    for i in range(num_items):
+        aisle = f"Aisle {i % 10}"
+        data.setdefault(aisle, []).append(
+            {"name": f"item {i}", "quantity": float(i % 7 + 1 + variant), "unit": "g"}
+        )
+    return data
+
+
+def orm_materialize(account_id, data):
+    """The pre-bulk path: delete everything, then add one ORM object per row."""
+    ShoppingListItem.query.filter_by(account_id=account_id).delete()
+    for aisle, items in data.items():
+        for item in items:
+            db.session.add(
+                ShoppingListItem(
+                    account_id=account_id,
+                    name=item["name"],
+                    quantity=item["quantity"],
+                    unit=item["unit"],
+                    aisle=aisle,
+                    is_checked=False,
+                )
+            )
+    db.session.commit()
+
+
+def timed(label, func, account_ids, data, total_rows):
+    start = time.perf_counter()
+    for account_id in account_ids:
+        func(account_id, data)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<32} {elapsed:8.2f} s  "
+        f"{total_rows / elapsed:12,.0f} rows/s  "
+        f"{elapsed / len(account_ids) * 1000:8.1f} ms/account"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=500)
+    parser.add_argument("--items", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Nobody is listening; don't spend time serializing socket payloads
+    socketio.emit = lambda *a, **kw: None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        with app.app_context():
+            db.create_all()
+            accounts = [Account(name=f"Bench {i}") for i in range(args.accounts)]
+            db.session.add_all(accounts)
+            db.session.commit()
+            account_ids = [a.id for a in accounts]
+            total = args.accounts * args.items
+            print(f"Materializing {args.items:,} items for {args.accounts:,} accounts ({total:,} rows)")
+
+            data = make_list(args.items)
+            changed = make_list(args.items, variant=1)
+            timed("ORM delete-all + add", orm_materialize, account_ids, data, total)
+            db.session.execute(ShoppingListItem.__table__.delete())
+            db.session.commit()
+            timed("bulk sync (empty list)", sync_shopping_list, account_ids, data, total)
+            timed("bulk sync (all quantities)", sync_shopping_list, account_ids, changed, total)
+            timed("bulk sync (unchanged)", sync_shopping_list, account_ids, changed, total)
+
+
+if __name__ == "__main__":
+    main()
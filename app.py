@@ -1,17 +1,21 @@
 # meal_planner/app.py
 
 # --- Standard Library Imports ---
+import csv
+import io
+import click
 import os
 import random
 import math
 from collections import defaultdict
 from decimal import Decimal, InvalidOperation
-from typing import Dict, Any, List, Optional, Set, Tuple  # Added for type hints
-from datetime import datetime, timedelta, UTC
+from typing import Dict, Any, Callable, Iterable, List, Optional, Set, Tuple  # Added for type hints
+from datetime import date, datetime, timedelta, UTC
 import re
 import socket
 import time
 import json
+import threading
 import uuid
 from functools import wraps
 from pathlib import Path
@@ -28,10 +32,14 @@ from flask import (
     jsonify,
     abort,
     send_file,
+    make_response,
+    g,
+    Response,
+    stream_with_context,
 )
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.sql import func
-from sqlalchemy.orm import joinedload, aliased  # Explicit import for clarity
+from sqlalchemy.orm import joinedload, aliased, validates  # Explicit import for clarity
 from flask_migrate import Migrate
 from flask_login import (
     LoginManager,
@@ -48,9 +56,71 @@ from wtforms.validators import DataRequired, Email
 import bcrypt
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from sqlalchemy import or_, and_, func, text
+from sqlalchemy import or_, and_, func, text, select, bindparam, case, event, inspect, tuple_
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import exists
+from units import UNIT_REGISTRY, parse_quantity, canonical_unit, unit_base
+from planner import (
+    MEAL_TYPE_BITS,
+    PLANNING_MODE_EXPIRING,
+    PLANNING_MODE_OVERLAP,
+    PLANNING_MODE_PANTRY,
+    PLANNING_MODE_RANDOM,
+    PLANNING_MODE_VARIETY,
+    PLANNING_MODES,
+    CandidateSnapshot,
+    IngredientIndex,
+    PlanCache,
+    PlanDiff,
+    PlanSettings,
+    RecipeCandidate,
+    build_candidate_snapshot,
+    carry_over_locks,
+    iter_plan_days,
+    cooked_recipe_ids,
+    date_slot_id,
+    day_label,
+    diff_plans,
+    plan_cache_key,
+    plan_dated_meals,
+    plan_manual_leftovers,
+)
+from overlap import IngredientMatrix, minimize_shopping_list
+from variety import DEFAULT_TIME_BUDGET_MS, best_of_plans
+from nutrition import (
+    NUTRIENT_LABELS,
+    NUTRIENTS,
+    NutrientIngredientRow,
+    RecipeNutrients,
+    meet_nutrient_targets,
+    read_nutrient_csv,
+)
+from budget import (
+    IngredientCostRow,
+    PriceTable,
+    RecipeCosts,
+    fit_budget,
+    format_cost,
+    load_price_table,
+    plan_budget,
+)
+from expiry import (
+    USE_SOON_DAYS,
+    ExpiringStock,
+    ExpiryQueue,
+    PantryBatch,
+    RecipeAmountRow,
+    RecipeAmounts,
+    days_left,
+    expiry_scores,
+    use_expiring_first,
+)
+from batch_planner import (
+    DEFAULT_CHUNK_SIZE,
+    AccountPlanJob,
+    SharedInputs,
+    plan_accounts,
+)
 
 
 # --- Forms ---
@@ -71,6 +141,10 @@ class InviteUserForm(FlaskForm):
 # --- Configuration ---
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DATABASE_PATH = os.path.join(BASE_DIR, "database.db")
+# Ingredient prices for plan costs (see budget.load_price_table)
+PRICE_TABLE_PATH = os.environ.get(
+    "PRICE_TABLE_PATH", os.path.join(BASE_DIR, "prices.csv")
+)
 
 # --- Flask App Initialization ---
 import logging
@@ -119,8 +193,8 @@ def load_user(user_id):
 
 
 # --- Database Models ---
-# NOTE: Storing quantity as String is not ideal for calculations but kept due to constraints.
-# Consider migrating to db.Numeric or db.Float if DB changes are allowed later.
+# NOTE: Ingredient/PantryItem keep the quantity text as entered; the parsed
+# number and canonical unit are stored alongside it (see units.py).
 
 
 # User and Account Models
@@ -162,6 +236,8 @@ class Account(db.Model):
     name = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    # Monotonic counter bumped by every shopping list write (see bump_shopping_list_version)
+    shopping_list_version = db.Column(db.Integer, default=0, nullable=False)
     users = db.relationship(
         "User",
         secondary="account_user",
@@ -243,20 +319,101 @@ class Recipe(db.Model):
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
 
+    __table_args__ = (
+        # Candidate lookups per meal type and per account
+        db.Index("ix_recipe_is_breakfast", "is_breakfast"),
+        db.Index("ix_recipe_is_lunch", "is_lunch"),
+        db.Index("ix_recipe_is_dinner", "is_dinner"),
+        db.Index("ix_recipe_account_id", "account_id"),
+    )
+
     def __repr__(self):
         return f"<Recipe {self.name}>"
 
 
+class RecipeCatalogVersion(db.Model):
+    """
+    Single row counting recipe writes. Bumped on every flush that touches
+    a Recipe so each worker process can tell when its cached planning
+    candidates are stale. The token is random per database, so two
+    databases never share a (token, version) pair.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    token = db.Column(db.String(32), nullable=False)
+
+
+class IngredientCatalog(db.Model):
+    """
+    One row per distinct ingredient name (normalized lowercase/stripped).
+    Owns the aisle and default unit for every Ingredient, PantryItem and
+    ShoppingListItem with that name, so an aisle change is a one-row update.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    normalized_name = db.Column(db.String(100), nullable=False, unique=True)
+    aisle = db.Column(db.String(50), nullable=True, index=True)
+    default_unit = db.Column(db.String(50), nullable=True)
+
+    def __repr__(self):
+        return f"<IngredientCatalog {self.normalized_name}>"
+
+
+class IngredientNutrients(db.Model):
+    """
+    Nutrients per base unit (g, ml or item) of a catalog ingredient, as
+    imported by `flask import-nutrients`. Columns follow nutrition.NUTRIENTS.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    catalog_id = db.Column(
+        db.Integer, db.ForeignKey("ingredient_catalog.id"), nullable=False
+    )
+    base_unit = db.Column(db.String(10), nullable=False, default="")
+    energy_kcal = db.Column(db.Float, nullable=False, default=0)
+    protein_g = db.Column(db.Float, nullable=False, default=0)
+    carbohydrate_g = db.Column(db.Float, nullable=False, default=0)
+    fat_g = db.Column(db.Float, nullable=False, default=0)
+    fibre_g = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "catalog_id", "base_unit", name="unique_ingredient_nutrients_unit"
+        ),
+    )
+
+
 class Ingredient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.String(50))
     unit = db.Column(db.String(50))
-    aisle = db.Column(db.String(50))
-    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False)
+    aisle = db.Column(db.String(50))  # Unused; the aisle lives in IngredientCatalog
+    recipe_id = db.Column(
+        db.Integer, db.ForeignKey("recipe.id"), nullable=False, index=True
+    )
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
+    # Parsed from quantity/unit on write; aggregation reads only these
+    quantity_value = db.Column(db.Float, nullable=True)
+    unit_canonical = db.Column(db.String(50), nullable=False, default="")
+    # Assigned on flush from the name (see assign_ingredient_catalog)
+    catalog_id = db.Column(
+        db.Integer, db.ForeignKey("ingredient_catalog.id"), nullable=True, index=True
+    )
+    catalog = db.relationship("IngredientCatalog")
+
+    @validates("quantity")
+    def _parse_quantity(self, key, value):
+        self.quantity_value = parse_quantity(value)
+        return value
+
+    @validates("unit")
+    def _canonicalize_unit(self, key, value):
+        self.unit_canonical = canonical_unit(value)
+        return value
 
     def __repr__(self):
         return f"<Ingredient {self.name} for Recipe {self.recipe_id}>"
@@ -267,10 +424,35 @@ class PantryItem(db.Model):
     name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.String(50))
     unit = db.Column(db.String(50))
-    aisle = db.Column(db.String(50))
+    aisle = db.Column(db.String(50))  # Unused; the aisle lives in IngredientCatalog
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
+    # Parsed from quantity/unit on write; aggregation reads only these
+    quantity_value = db.Column(db.Float, nullable=True)
+    unit_canonical = db.Column(db.String(50), nullable=False, default="")
+    # Assigned on flush from the name (see assign_ingredient_catalog)
+    catalog_id = db.Column(
+        db.Integer, db.ForeignKey("ingredient_catalog.id"), nullable=True, index=True
+    )
+    catalog = db.relationship("IngredientCatalog")
+    # Use-by date; dated items feed the expiring planning mode (see expiry.py)
+    expires_on = db.Column(db.Date, nullable=True, index=True)
+
+    __table_args__ = (
+        # Matches the normalized-name lookups in update_pantry and aggregation
+        db.Index("ix_pantry_item_normalized_name", func.lower(func.trim(name))),
+    )
+
+    @validates("quantity")
+    def _parse_quantity(self, key, value):
+        self.quantity_value = parse_quantity(value)
+        return value
+
+    @validates("unit")
+    def _canonicalize_unit(self, key, value):
+        self.unit_canonical = canonical_unit(value)
+        return value
 
     def __repr__(self):
         return f"<PantryItem {self.name}>"
@@ -280,7 +462,7 @@ class LockedMeal(db.Model):
     """Model for storing locked meals in the database."""
 
     id = db.Column(db.Integer, primary_key=True)
-    day = db.Column(db.String(10), nullable=False)
+    day = db.Column(db.String(10), nullable=False)  # ISO date, e.g. "2026-10-19"
     meal_type = db.Column(db.String(20), nullable=False)
     recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=True)
     manual_text = db.Column(db.String(200), nullable=True)
@@ -298,7 +480,9 @@ class LockedMeal(db.Model):
 
 class AccountSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    account_id = db.Column(db.Integer, db.ForeignKey("account.id"), nullable=False)
+    account_id = db.Column(
+        db.Integer, db.ForeignKey("account.id"), nullable=False, index=True
+    )
     num_people = db.Column(db.Integer, default=1)
     meal_plan_start_day = db.Column(
         db.String(10), default="Monday"
@@ -307,6 +491,12 @@ class AccountSettings(db.Model):
     meal_repeat_interval = db.Column(
         db.Integer, default=0
     )  # 0 means no restriction, otherwise number of days
+    planning_mode = db.Column(
+        db.String(20), default=PLANNING_MODE_RANDOM
+    )  # "random", "overlap" (shared ingredients) or "pantry" (cupboard first)
+    weekly_budget = db.Column(db.Float, nullable=True)  # None means no budget
+    # JSON of daily per-person minimums, e.g. {"protein_g": 50}
+    nutrient_targets = db.Column(db.Text, nullable=True)
     default_breakfast_id = db.Column(db.Integer, db.ForeignKey("recipe.id"))
     default_lunch_id = db.Column(db.Integer, db.ForeignKey("recipe.id"))
     default_dinner_id = db.Column(db.Integer, db.ForeignKey("recipe.id"))
@@ -331,17 +521,236 @@ class ShoppingListItem(db.Model):
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
+    catalog_id = db.Column(
+        db.Integer, db.ForeignKey("ingredient_catalog.id"), nullable=True, index=True
+    )
+    catalog = db.relationship("IngredientCatalog")
+
+    __table_args__ = (
+        # Serves the per-account listing already in display order
+        db.Index("ix_shopping_list_item_account_aisle_name", "account_id", "aisle", "name"),
+    )
 
     def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "quantity": self.quantity,
-            "unit": self.unit,
-            "aisle": self.aisle,
-            "is_checked": self.is_checked,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        return shopping_list_row_dict(self)
+
+
+class ShoppingListChange(db.Model):
+    """
+    Compact change log for shopping list items. Holds only the latest change
+    per item (a tombstone once the item is deleted), stamped with the list
+    version that produced it.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey("account.id"), nullable=False)
+    # No foreign key: tombstones outlive the item they describe
+    item_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    is_deleted = db.Column(db.Boolean, default=False, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("account_id", "item_id", name="uix_shopping_change_item"),
+        db.Index("ix_shopping_change_account_version", "account_id", "version"),
+    )
+
+
+class PregeneratedPlan(db.Model):
+    """
+    An account's plan for its next plan week, generated ahead of time by
+    `flask plan-accounts`. Once that week begins, the dashboard takes it,
+    with its leftover locks, the next time the account has no plan for the
+    week in the session.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(
+        db.Integer, db.ForeignKey("account.id"), nullable=False, unique=True
+    )
+    # First and last day (plan_span), e.g. "2026-10-19/2026-10-25"
+    days = db.Column(db.String(80), nullable=False)
+    seed = db.Column(db.BigInteger, nullable=False)
+    plan = db.Column(db.Text, nullable=False)  # JSON plan_ids
+    locks = db.Column(db.Text, nullable=False, default="{}")  # JSON leftover locks
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PlanHistory(db.Model):
+    """
+    The plan an account was shown for one plan week, keyed by the date the
+    week started (the plan itself is keyed by ISO date). Later plans read
+    the days before them back as planner history, so meal_repeat_interval
+    holds across the week boundary.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey("account.id"), nullable=False)
+    week_start = db.Column(db.Date, nullable=False)
+    plan = db.Column(db.Text, nullable=False)  # JSON plan_ids
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("account_id", "week_start", name="uix_plan_history_week"),
+    )
+
+
+# Number of versions the change log keeps; older clients get a full reload
+SHOPPING_LIST_CHANGE_RETENTION = 200
+
+# Models whose name links them to an IngredientCatalog entry
+CATALOGED_MODELS = (Ingredient, PantryItem, ShoppingListItem)
+
+
+def normalize_ingredient_name(name: Optional[str]) -> str:
+    """Catalog key for an ingredient name: stripped and lowercased."""
+    return (name or "").strip().lower()
+
+
+@event.listens_for(db.session, "before_flush")
+def assign_ingredient_catalog(session, flush_context, instances) -> None:
+    """
+    Links new or renamed ingredient rows to their catalog entry, creating
+    entries for unseen names. The catalog alone owns the aisle: nothing
+    written to a row's own aisle column reaches it (see set_catalog_aisles),
+    and new shopping list rows copy the catalog aisle they are listed under.
+    """
+    pending = []
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, CATALOGED_MODELS) or not obj.name:
+            continue
+        state = inspect(obj)
+        if state.pending or state.attrs.name.history.has_changes():
+            pending.append(obj)
+    if not pending:
+        return
+
+    names = {normalize_ingredient_name(obj.name) for obj in pending}
+    with session.no_autoflush:
+        entries = {
+            entry.normalized_name: entry
+            for entry in session.query(IngredientCatalog).filter(
+                IngredientCatalog.normalized_name.in_(names)
+            )
         }
+        # Entries created earlier in this transaction but not yet flushed
+        for obj in session.new:
+            if isinstance(obj, IngredientCatalog):
+                entries.setdefault(obj.normalized_name, obj)
+    for obj in pending:
+        key = normalize_ingredient_name(obj.name)
+        entry = entries.get(key)
+        if entry is None:
+            entry = IngredientCatalog(
+                normalized_name=key,
+                default_unit=getattr(obj, "unit_canonical", None) or None,
+            )
+            session.add(entry)
+            entries[key] = entry
+        obj.catalog = entry
+        if isinstance(obj, ShoppingListItem) and entry.aisle and not obj.aisle:
+            obj.aisle = entry.aisle
+
+
+def bump_recipe_catalog_version(session) -> None:
+    """Increments the recipe catalog version inside the session's transaction."""
+    table = RecipeCatalogVersion.__table__
+    result = session.execute(
+        table.update().where(table.c.id == 1).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        session.execute(
+            table.insert().values(id=1, version=1, token=uuid.uuid4().hex)
+        )
+
+
+@event.listens_for(db.session, "before_flush")
+def bump_recipe_catalog_on_write(session, flush_context, instances) -> None:
+    """
+    Any added, edited or deleted Recipe or Ingredient invalidates planning
+    candidates and the ingredient matrix.
+    """
+    if any(isinstance(obj, (Recipe, Ingredient)) for obj in session.new) or any(
+        isinstance(obj, (Recipe, Ingredient)) for obj in session.deleted
+    ) or any(
+        isinstance(obj, (Recipe, Ingredient)) and session.is_modified(obj)
+        for obj in session.dirty
+    ):
+        bump_recipe_catalog_version(session)
+
+
+def catalog_aisle(obj: Any) -> Optional[str]:
+    """Aisle for an ingredient row, from its catalog entry only."""
+    return (obj.catalog.aisle or None) if obj.catalog is not None else None
+
+
+def get_catalog_ids(names: Iterable[str]) -> Dict[str, int]:
+    """Maps normalized ingredient names to catalog IDs in one indexed lookup."""
+    keys = {normalize_ingredient_name(name) for name in names}
+    if not keys:
+        return {}
+    return dict(
+        db.session.query(IngredientCatalog.normalized_name, IngredientCatalog.id)
+        .filter(IngredientCatalog.normalized_name.in_(keys))
+        .all()
+    )
+
+
+def set_catalog_aisles(new_aisles: Dict[str, Optional[str]]) -> Dict[int, int]:
+    """
+    Sets the catalog aisle of each ingredient name (creating entries for
+    unseen names) and moves the shopping list rows listed under the ones
+    that changed, all inside the current transaction. Returns account_id
+    -> new shopping list version for the lists that changed; the caller
+    commits and emits the deltas.
+    """
+    new_aisles = {
+        normalize_ingredient_name(name): aisle for name, aisle in new_aisles.items()
+    }
+    entries = {
+        entry.normalized_name: entry
+        for entry in IngredientCatalog.query.filter(
+            IngredientCatalog.normalized_name.in_(new_aisles)
+        )
+    }
+    changed = []
+    for name, new_aisle in new_aisles.items():
+        entry = entries.get(name)
+        if entry is None:
+            entry = IngredientCatalog(normalized_name=name)
+            db.session.add(entry)
+        elif entry.aisle == new_aisle:
+            continue
+        entry.aisle = new_aisle
+        changed.append(entry)
+    if not changed:
+        return {}
+    db.session.flush()
+
+    # Shopping list rows store their aisle; move them via the indexed FK
+    catalog_ids = [entry.id for entry in changed]
+    affected_item_ids: Dict[int, List[int]] = defaultdict(list)
+    for affected_account_id, affected_item_id in db.session.query(
+        ShoppingListItem.account_id, ShoppingListItem.id
+    ).filter(ShoppingListItem.catalog_id.in_(catalog_ids)):
+        affected_item_ids[affected_account_id].append(affected_item_id)
+    shopping_table = ShoppingListItem.__table__
+    catalog_table = IngredientCatalog.__table__
+    db.session.execute(
+        shopping_table.update()
+        .where(shopping_table.c.catalog_id.in_(catalog_ids))
+        .values(
+            aisle=select(catalog_table.c.aisle)
+            .where(catalog_table.c.id == shopping_table.c.catalog_id)
+            .scalar_subquery(),
+            updated_at=datetime.utcnow(),
+        )
+    )
+    return {
+        affected_account_id: record_shopping_list_changes(
+            affected_account_id, upserted_ids=item_ids
+        )
+        for affected_account_id, item_ids in affected_item_ids.items()
+    }
 
 
 # --- Helper Functions ---
@@ -356,22 +765,29 @@ def get_pantry_items() -> Dict[str, PantryItem]:
 
 
 def update_pantry(
-    item_name: str, quantity: str, unit: str, aisle: Optional[str] = None
+    item_name: str,
+    quantity: str,
+    unit: str,
+    aisle: Optional[str] = None,
+    expires_on: Optional[date] = None,
 ) -> None:
     """
     Adds a new item or updates an existing item in the pantry.
     Performs case-insensitive matching based on the normalized name.
+    An update without expires_on keeps the item's existing expiry date.
+    A given aisle becomes the catalog aisle for the item's name.
     """
     normalized_name = item_name.strip().lower()
     # Case-insensitive query to find existing item
     pantry_item = PantryItem.query.filter(
-        func.lower(PantryItem.name) == normalized_name
+        func.lower(func.trim(PantryItem.name)) == normalized_name
     ).first()
 
     if pantry_item:
         pantry_item.quantity = quantity.strip() if quantity else None
         pantry_item.unit = unit.strip() if unit else None
-        pantry_item.aisle = aisle.strip() if aisle else None
+        if expires_on is not None:
+            pantry_item.expires_on = expires_on
         flash(f"Updated '{pantry_item.name}' in pantry.", "info")
     else:
         # Create new item if not found
@@ -379,18 +795,49 @@ def update_pantry(
             name=item_name.strip(),
             quantity=quantity.strip() if quantity else None,
             unit=unit.strip() if unit else None,
-            aisle=aisle.strip() if aisle else None,
+            expires_on=expires_on,
         )
         db.session.add(pantry_item)
         flash(f"Added '{item_name.strip()}' to pantry.", "success")
+    if pantry_item.quantity and pantry_item.quantity_value is None:
+        flash(
+            f"Couldn't read quantity '{pantry_item.quantity}' for "
+            f"'{pantry_item.name}'; it won't be deducted from the shopping list.",
+            "warning",
+        )
     try:
+        new_versions = (
+            set_catalog_aisles({normalized_name: aisle.strip()})
+            if aisle and aisle.strip()
+            else {}
+        )
         db.session.commit()
+        for affected_account_id, version in new_versions.items():
+            emit_shopping_list_delta(
+                affected_account_id, "list_regenerated", version=version
+            )
     except Exception as e:
         db.session.rollback()
         flash(f"Error updating pantry: {e}", "danger")
         app.logger.error(f"Error updating pantry item '{item_name}': {e}")  # Log error
 
 
+def flash_unparsed_quantities(ingredients: Iterable["Ingredient"]) -> None:
+    """Warns about ingredient quantities the parser could not read."""
+    unparsed = [
+        f"{ing.name} ({ing.quantity})"
+        for ing in ingredients
+        if ing.quantity and ing.quantity_value is None
+    ]
+    if unparsed:
+        flash(
+            "Couldn't read the quantity for: "
+            + ", ".join(unparsed)
+            + ". These count as 0 on the shopping list.",
+            "warning",
+        )
+
+
 def remove_from_pantry(item_id: int) -> None:
     """Removes an item from the pantry by its primary key ID."""
     # Use get for efficient primary key lookup
@@ -419,22 +866,383 @@ def format_decimal(value: Optional[Decimal]) -> str:
 
 
 def get_distinct_aisles() -> List[str]:
-    """Gets unique, non-empty, sorted aisle names from Ingredients and Pantry."""
-    # Query distinct aisles from Ingredients
-    q1 = (
-        db.session.query(Ingredient.aisle)
-        .filter(Ingredient.aisle.isnot(None), Ingredient.aisle != "")
+    """Gets unique, non-empty, sorted aisle names from the ingredient catalog."""
+    rows = (
+        db.session.query(IngredientCatalog.aisle)
+        .filter(IngredientCatalog.aisle.isnot(None), IngredientCatalog.aisle != "")
         .distinct()
+        .order_by(IngredientCatalog.aisle)
+        .all()
     )
-    # Query distinct aisles from Pantry
-    q2 = (
-        db.session.query(PantryItem.aisle)
-        .filter(PantryItem.aisle.isnot(None), PantryItem.aisle != "")
-        .distinct()
+    return [row[0] for row in rows]
+
+
+class RecipePrefetcher:
+    """
+    Request-scoped identity map of recipes. Callers prefetch every ID they
+    will need in one IN query (or load all recipes once); existence checks
+    and servings lookups are then answered from memory.
+    """
+
+    def __init__(self) -> None:
+        self._recipes: Dict[int, Optional[Recipe]] = {}
+        self._all_loaded = False
+
+    def prefetch(self, recipe_ids: Iterable[Any]) -> None:
+        """Loads the given recipe IDs not seen yet with a single query."""
+        missing = set()
+        for recipe_id in recipe_ids:
+            try:
+                recipe_id = int(recipe_id)
+            except (TypeError, ValueError):
+                continue
+            if recipe_id > 0 and recipe_id not in self._recipes:
+                missing.add(recipe_id)
+        if not missing or self._all_loaded:
+            return
+        for recipe in Recipe.query.filter(Recipe.id.in_(missing)):
+            self._recipes[recipe.id] = recipe
+        for recipe_id in missing:
+            # Remember misses too, so a bad ID is only looked up once
+            self._recipes.setdefault(recipe_id, None)
+
+    def all(self) -> List[Recipe]:
+        """Every recipe, loaded once per request."""
+        if not self._all_loaded:
+            self._recipes = {recipe.id: recipe for recipe in Recipe.query.all()}
+            self._all_loaded = True
+        return [recipe for recipe in self._recipes.values() if recipe is not None]
+
+    def get(self, recipe_id: Any) -> Optional[Recipe]:
+        """Returns the recipe, querying only for IDs that were not prefetched."""
+        try:
+            recipe_id = int(recipe_id)
+        except (TypeError, ValueError):
+            return None
+        self.prefetch([recipe_id])
+        return self._recipes.get(recipe_id)
+
+    def exists(self, recipe_id: Any) -> bool:
+        return self.get(recipe_id) is not None
+
+    def servings(self, recipe_id: Any) -> Optional[int]:
+        recipe = self.get(recipe_id)
+        return recipe.servings if recipe is not None else None
+
+
+_candidate_snapshot: Optional[CandidateSnapshot] = None
+_candidate_snapshot_lock = threading.Lock()
+
+
+def load_candidate_snapshot(key: Optional[Tuple[str, int]]) -> CandidateSnapshot:
+    """Builds a snapshot from the recipe table (only the planning columns)."""
+    rows = db.session.execute(
+        select(
+            Recipe.id,
+            Recipe.servings,
+            Recipe.is_breakfast,
+            Recipe.is_lunch,
+            Recipe.is_dinner,
+        ).order_by(Recipe.id)
     )
-    # Combine results using union, convert to set for uniqueness, filter out None again just in case, sort.
-    all_aisles = {row[0] for row in q1.union(q2).all() if row[0]}
-    return sorted(list(all_aisles))
+    return build_candidate_snapshot(
+        (
+            RecipeCandidate(
+                row.id,
+                row.servings,
+                (MEAL_TYPE_BITS["Breakfast"] if row.is_breakfast else 0)
+                | (MEAL_TYPE_BITS["Lunch"] if row.is_lunch else 0)
+                | (MEAL_TYPE_BITS["Dinner"] if row.is_dinner else 0),
+            )
+            for row in rows
+        ),
+        key,
+    )
+
+
+def get_candidate_snapshot() -> CandidateSnapshot:
+    """
+    Planning candidates for the current recipe catalog. The per-process
+    snapshot is reused while the catalog version in the database is
+    unchanged, so the steady state costs one version read per request and
+    no recipe queries.
+    """
+    global _candidate_snapshot
+    if "candidate_snapshot" in g:
+        return g.candidate_snapshot
+    row = db.session.execute(
+        select(RecipeCatalogVersion.token, RecipeCatalogVersion.version).where(
+            RecipeCatalogVersion.id == 1
+        )
+    ).first()
+    key = (row.token, row.version) if row else None
+    snapshot = _candidate_snapshot
+    if key is None or snapshot is None or snapshot.key != key:
+        with _candidate_snapshot_lock:
+            snapshot = _candidate_snapshot
+            if key is None or snapshot is None or snapshot.key != key:
+                snapshot = load_candidate_snapshot(key)
+                if key is not None:
+                    _candidate_snapshot = snapshot
+    g.candidate_snapshot = snapshot
+    return snapshot
+
+
+class CatalogVersionCache:
+    """
+    A per-process value built from the recipe catalog (e.g. an ingredient
+    index), rebuilt when the catalog version changes. A key of None (no
+    version row yet) builds the value without caching it.
+    """
+
+    def __init__(self, build: Callable[[Optional[Tuple[str, int]]], Any]) -> None:
+        self._build = build
+        self._key: Optional[Tuple[str, int]] = None
+        self._value: Any = None
+        self._lock = threading.Lock()
+
+    def get(self, key: Optional[Tuple[str, int]]) -> Any:
+        if key is not None and self._key == key:
+            return self._value
+        if key is None:
+            return self._build(key)
+        with self._lock:
+            if self._key != key:
+                self._value = self._build(key)
+                self._key = key
+            return self._value
+
+
+def load_recipe_ingredient_keys() -> Dict[int, Set[Any]]:
+    """recipe_id -> canonical ingredient keys (catalog id, else normalized name)."""
+    recipe_ingredients: Dict[int, Set[Any]] = defaultdict(set)
+    rows = db.session.execute(
+        select(Ingredient.recipe_id, Ingredient.catalog_id, Ingredient.name)
+    )
+    for row in rows:
+        recipe_ingredients[row.recipe_id].add(
+            row.catalog_id or normalize_ingredient_name(row.name)
+        )
+    return recipe_ingredients
+
+
+_ingredient_matrix_cache = CatalogVersionCache(
+    lambda key: IngredientMatrix(load_recipe_ingredient_keys(), key)
+)
+_ingredient_index_cache = CatalogVersionCache(
+    lambda key: IngredientIndex(load_recipe_ingredient_keys(), key)
+)
+
+
+def get_ingredient_matrix(candidates: CandidateSnapshot) -> IngredientMatrix:
+    """Recipe x catalog ingredient matrix for the overlap planning mode."""
+    return _ingredient_matrix_cache.get(candidates.key)
+
+
+def get_ingredient_index(candidates: CandidateSnapshot) -> IngredientIndex:
+    """Catalog ingredient -> recipes index for the pantry and expiring modes."""
+    return _ingredient_index_cache.get(candidates.key)
+
+
+_price_table: Optional[PriceTable] = None
+_price_table_lock = threading.Lock()
+
+
+def get_price_table() -> PriceTable:
+    """The price CSV at PRICE_TABLE_PATH, reread when the file changes."""
+    global _price_table
+    try:
+        key = (PRICE_TABLE_PATH, os.path.getmtime(PRICE_TABLE_PATH))
+    except OSError:
+        key = None
+    table = _price_table
+    if table is None or table.key != key:
+        with _price_table_lock:
+            table = _price_table = load_price_table(PRICE_TABLE_PATH)
+    return table
+
+
+def load_recipe_cost_rows() -> List[IngredientCostRow]:
+    """Every recipe ingredient with its parsed quantity and the recipe's servings."""
+    rows = db.session.execute(
+        select(
+            Ingredient.recipe_id,
+            Recipe.servings,
+            Ingredient.name,
+            Ingredient.quantity_value,
+            Ingredient.unit_canonical,
+        ).join(Recipe, Recipe.id == Ingredient.recipe_id)
+    )
+    return [IngredientCostRow(*row) for row in rows]
+
+
+_recipe_cost_cache = CatalogVersionCache(
+    lambda key: RecipeCosts(load_recipe_cost_rows(), get_price_table(), key)
+)
+
+
+def get_recipe_costs(candidates: CandidateSnapshot) -> RecipeCosts:
+    """Per-serving recipe costs for the catalog version and price table in use."""
+    prices = get_price_table()
+    key = (candidates.key, prices.key) if candidates.key is not None else None
+    return _recipe_cost_cache.get(key)
+
+
+def load_recipe_nutrient_rows() -> List[NutrientIngredientRow]:
+    """Every recipe ingredient with its catalog key, parsed quantity and servings."""
+    rows = db.session.execute(
+        select(
+            Ingredient.recipe_id,
+            Recipe.servings,
+            Ingredient.catalog_id,
+            Ingredient.name,
+            Ingredient.quantity_value,
+            Ingredient.unit_canonical,
+        ).join(Recipe, Recipe.id == Ingredient.recipe_id)
+    )
+    return [
+        NutrientIngredientRow(
+            row.recipe_id,
+            row.servings,
+            row.catalog_id or normalize_ingredient_name(row.name),
+            row.quantity_value,
+            row.unit_canonical,
+        )
+        for row in rows
+    ]
+
+
+def load_nutrient_table() -> Dict[Tuple[Any, str], Tuple[float, ...]]:
+    """(catalog id, base unit) -> nutrients per base unit, in NUTRIENTS order."""
+    table = IngredientNutrients.__table__
+    rows = db.session.execute(
+        select(
+            table.c.catalog_id,
+            table.c.base_unit,
+            *(table.c[nutrient] for nutrient in NUTRIENTS),
+        )
+    )
+    return {(row[0], row[1]): tuple(row[2:]) for row in rows}
+
+
+_recipe_nutrients_cache = CatalogVersionCache(
+    lambda key: RecipeNutrients(load_recipe_nutrient_rows(), load_nutrient_table(), key)
+)
+
+
+def get_recipe_nutrients(candidates: CandidateSnapshot) -> RecipeNutrients:
+    """
+    Per-serving recipe nutrient vectors, rebuilt with the candidate snapshot
+    (importing nutrients bumps the catalog version).
+    """
+    return _recipe_nutrients_cache.get(candidates.key)
+
+
+def get_pantry_stock_keys() -> Set[Any]:
+    """
+    Canonical keys of the ingredients in stock. Items whose quantity could
+    not be parsed ("some") count as in stock; zero or negative ones do not.
+    """
+    rows = db.session.execute(
+        select(PantryItem.catalog_id, PantryItem.name).where(
+            or_(PantryItem.quantity_value.is_(None), PantryItem.quantity_value > 0)
+        )
+    )
+    return {row.catalog_id or normalize_ingredient_name(row.name) for row in rows}
+
+
+def load_recipe_amount_rows() -> List[RecipeAmountRow]:
+    """Every recipe ingredient with its catalog key and parsed quantity."""
+    rows = db.session.execute(
+        select(
+            Ingredient.recipe_id,
+            Ingredient.catalog_id,
+            Ingredient.name,
+            Ingredient.quantity_value,
+            Ingredient.unit_canonical,
+        )
+    )
+    return [
+        RecipeAmountRow(
+            row.recipe_id,
+            row.catalog_id or normalize_ingredient_name(row.name),
+            row.quantity_value,
+            row.unit_canonical,
+        )
+        for row in rows
+    ]
+
+
+_recipe_amounts_cache = CatalogVersionCache(
+    lambda key: RecipeAmounts(load_recipe_amount_rows(), key)
+)
+
+
+def get_expiry_queue() -> ExpiryQueue:
+    """
+    Dated pantry stock, soonest-expiring first. The pantry is shared, so
+    every account plans from the same queue. Items that are used up (zero
+    or negative quantity) are left out.
+    """
+    rows = db.session.execute(
+        select(
+            PantryItem.id,
+            PantryItem.name,
+            PantryItem.catalog_id,
+            PantryItem.quantity_value,
+            PantryItem.unit_canonical,
+            PantryItem.expires_on,
+        ).where(
+            PantryItem.expires_on.isnot(None),
+            or_(PantryItem.quantity_value.is_(None), PantryItem.quantity_value > 0),
+        )
+    )
+    batches = []
+    for row in rows:
+        base_unit, factor = unit_base(row.unit_canonical or "")
+        batches.append(
+            PantryBatch(
+                row.expires_on,
+                row.id,
+                row.name,
+                row.catalog_id or normalize_ingredient_name(row.name),
+                row.quantity_value * factor if row.quantity_value is not None else None,
+                base_unit,
+            )
+        )
+    return ExpiryQueue(batches)
+
+
+def get_expiring_stock(
+    candidates: CandidateSnapshot,
+    today: Optional[date] = None,
+    start: Optional[date] = None,
+) -> ExpiringStock:
+    """
+    What the expiring planning mode needs, for a plan whose first day is
+    start (default today).
+    """
+    return ExpiringStock(
+        get_expiry_queue(),
+        get_ingredient_index(candidates),
+        _recipe_amounts_cache.get(candidates.key),
+        today or date.today(),
+        start,
+    )
+
+
+def get_recipe_prefetcher() -> RecipePrefetcher:
+    """The RecipePrefetcher for the current request (created on first use)."""
+    if "recipe_prefetcher" not in g:
+        g.recipe_prefetcher = RecipePrefetcher()
+    return g.recipe_prefetcher
+
+
+@app.teardown_request
+def drop_request_caches(exc: Optional[BaseException]) -> None:
+    # g can outlive the request (e.g. a shared app context), so reset here
+    g.pop("recipe_prefetcher", None)
+    g.pop("candidate_snapshot", None)
 
 
 def get_persistent_locks() -> Dict[str, Dict[str, Any]]:
@@ -460,46 +1268,249 @@ def get_persistent_locks() -> Dict[str, Dict[str, Any]]:
     return locks
 
 
-def update_persistent_lock(slot_id: str, lock_info: Optional[Dict[str, Any]]) -> None:
+def apply_lock_changes(
+    changes: Dict[str, Optional[Dict[str, Any]]],
+    clear_lock_types: Iterable[str] = (),
+) -> None:
     """
-    Update the persistent lock for a meal slot in the database.
+    Applies a set of slot lock changes atomically: one DELETE covering the
+    changed slots (and any lock types being cleared), one executemany
+    INSERT for the new locks and a single commit.
 
     Args:
-        slot_id: The slot identifier (e.g., 'Monday_Breakfast')
-        lock_info: Dictionary containing lock information or None to remove the lock
+        changes: slot_id (e.g. '2026-10-19_Breakfast') -> lock info, or None to unlock
+        clear_lock_types: lock types (e.g. 'leftover') to remove everywhere first
     """
+    clear_lock_types = list(clear_lock_types)
+    if not changes and not clear_lock_types:
+        return
+    table = LockedMeal.__table__
+    slots = [tuple(slot_id.split("_", 1)) for slot_id in changes]
+    conditions = []
+    if slots:
+        conditions.append(tuple_(table.c.day, table.c.meal_type).in_(slots))
+    if clear_lock_types:
+        conditions.append(table.c.lock_type.in_(clear_lock_types))
+    rows = [
+        {
+            "day": day,
+            "meal_type": meal_type,
+            "recipe_id": lock_info.get("recipe_id"),
+            # Persist manual text using the same key used in the session
+            "manual_text": lock_info.get("text"),
+            "is_manual": lock_info.get("manual", False),
+            "is_default": lock_info.get("default", False),
+            "lock_type": lock_info.get("lock_type", "user"),
+        }
+        for (day, meal_type), lock_info in zip(slots, changes.values())
+        if lock_info
+    ]
     try:
-        day, meal_type = slot_id.split("_")
-
-        # Remove any existing locks for this slot
-        LockedMeal.query.filter_by(day=day, meal_type=meal_type).delete()
-
-        if lock_info:
-            # Create new lock with lock type information
-            new_lock = LockedMeal(
-                day=day,
-                meal_type=meal_type,
-                recipe_id=lock_info.get("recipe_id"),
-                # Persist manual text using the same key used in the session
-                manual_text=lock_info.get("text"),
-                is_manual=lock_info.get("manual", False),
-                is_default=lock_info.get("default", False),
-                lock_type=lock_info.get(
-                    "lock_type", "user"
-                ),  # Add lock type with default 'user'
-            )
-            db.session.add(new_lock)
-
+        db.session.execute(table.delete().where(or_(*conditions)))
+        if rows:
+            db.session.execute(table.insert(), rows)
         db.session.commit()
-        app.logger.info(f"Updated persistent lock for {slot_id}: {lock_info}")
+        app.logger.info(
+            f"Applied {len(changes)} lock changes ({len(rows)} locks written, "
+            f"cleared types: {clear_lock_types})"
+        )
     except Exception as e:
         db.session.rollback()
-        app.logger.error(
-            f"Error updating persistent lock for {slot_id}: {str(e)}", exc_info=True
-        )
+        app.logger.error(f"Error applying lock changes: {str(e)}", exc_info=True)
         raise
 
 
+class LockChangeSet:
+    """
+    Pending LockedMeal writes for one plan operation. Helpers record slot
+    changes here instead of committing per slot; apply() writes them all
+    through apply_lock_changes in one transaction.
+    """
+
+    def __init__(self) -> None:
+        self.slots: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.cleared_lock_types: Set[str] = set()
+
+    def set(self, slot_id: str, lock_info: Optional[Dict[str, Any]]) -> None:
+        """Records the new lock for a slot (None unlocks it)."""
+        self.slots[slot_id] = lock_info
+
+    def clear_lock_type(self, lock_type: str) -> None:
+        """Removes every lock of this type, including ones recorded so far."""
+        self.cleared_lock_types.add(lock_type)
+        self.slots = {
+            slot_id: lock_info
+            for slot_id, lock_info in self.slots.items()
+            if not (lock_info and lock_info.get("lock_type") == lock_type)
+        }
+
+    def apply(self) -> None:
+        """Writes the recorded changes in one transaction and resets the set."""
+        apply_lock_changes(self.slots, self.cleared_lock_types)
+        self.slots = {}
+        self.cleared_lock_types = set()
+
+
+def shopping_list_room(account_id: int) -> str:
+    """Socket.IO room shared by every open shopping list tab of an account."""
+    return f"shopping_list_{account_id}"
+
+
+def bump_shopping_list_version(account_id: int) -> int:
+    """
+    Increments the account's shopping list version inside the current
+    transaction and returns the new value. Call before committing any
+    shopping list write so readers can detect changes with a primary-key read.
+    """
+    db.session.query(Account).filter_by(id=account_id).update(
+        {"shopping_list_version": Account.shopping_list_version + 1},
+        synchronize_session=False,
+    )
+    return (
+        db.session.query(Account.shopping_list_version)
+        .filter_by(id=account_id)
+        .scalar()
+    )
+
+
+def record_shopping_list_changes(
+    account_id: int,
+    upserted_ids: Iterable[int] = (),
+    deleted_ids: Iterable[int] = (),
+) -> int:
+    """
+    Bumps the account's shopping list version and stamps the given item IDs
+    in the change log (replacing their previous entries), all inside the
+    current transaction. Returns the new version.
+    """
+    version = bump_shopping_list_version(account_id)
+    # Upserts win: SQLite may hand a deleted row's ID to a new row
+    changes = {item_id: True for item_id in deleted_ids}
+    changes.update({item_id: False for item_id in upserted_ids})
+
+    change_table = ShoppingListChange.__table__
+    if changes:
+        db.session.execute(
+            change_table.delete().where(
+                change_table.c.account_id == account_id,
+                change_table.c.item_id.in_(list(changes)),
+            )
+        )
+        db.session.execute(
+            change_table.insert(),
+            [
+                {
+                    "account_id": account_id,
+                    "item_id": item_id,
+                    "version": version,
+                    "is_deleted": is_deleted,
+                }
+                for item_id, is_deleted in changes.items()
+            ],
+        )
+    # Drop entries no client can ask for any more (they get a full reload)
+    db.session.execute(
+        change_table.delete().where(
+            change_table.c.account_id == account_id,
+            change_table.c.version <= version - SHOPPING_LIST_CHANGE_RETENTION,
+        )
+    )
+    return version
+
+
+def get_shopping_list_changes(account_id: int, since: int) -> Dict[str, Any]:
+    """
+    Returns the items changed or deleted after version `since`. Sets
+    "reset" when the change log can no longer answer and the client must
+    reload the whole list.
+    """
+    version = get_shopping_list_version(account_id)
+    result: Dict[str, Any] = {
+        "version": version,
+        "reset": False,
+        "upserts": [],
+        "deletes": [],
+    }
+    if since > version or since < version - SHOPPING_LIST_CHANGE_RETENTION:
+        result["reset"] = True
+        return result
+    if since == version:
+        return result
+
+    changes = (
+        db.session.query(ShoppingListChange.item_id, ShoppingListChange.is_deleted)
+        .filter(
+            ShoppingListChange.account_id == account_id,
+            ShoppingListChange.version > since,
+        )
+        .all()
+    )
+    result["deletes"] = [item_id for item_id, is_deleted in changes if is_deleted]
+    upserted_ids = [item_id for item_id, is_deleted in changes if not is_deleted]
+    if upserted_ids:
+        result["upserts"] = [
+            item.to_dict()
+            for item in ShoppingListItem.query.filter(
+                ShoppingListItem.account_id == account_id,
+                ShoppingListItem.id.in_(upserted_ids),
+            )
+        ]
+    return result
+
+
+def get_shopping_list_version(account_id: int) -> int:
+    """Returns the account's current shopping list version (primary-key read)."""
+    return (
+        db.session.query(Account.shopping_list_version)
+        .filter_by(id=account_id)
+        .scalar()
+        or 0
+    )
+
+
+def shopping_list_etag(account_id: int, version: int, *parts: Any) -> str:
+    """Builds the ETag for a rendering of the account's shopping list."""
+    return "-".join(str(p) for p in ("sl", account_id, version) + parts)
+
+
+def shopping_list_not_modified(etag: str, version: int):
+    """Returns a 304 response if the client already holds this version, else None."""
+    if not request.if_none_match.contains(etag):
+        return None
+    response = make_response("", 304)
+    return with_shopping_list_cache_headers(response, etag, version)
+
+
+def with_shopping_list_cache_headers(response, etag: str, version: int):
+    """Marks a shopping list response as revalidate-always and tags its version."""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.headers["X-Shopping-List-Version"] = str(version)
+    return response
+
+
+def emit_shopping_list_delta(
+    account_id: int, delta_type: str, version: int, **payload: Any
+) -> None:
+    """
+    Broadcast a small typed change to every client viewing the account's list.
+    Every delta carries the shopping list version it produced as "version",
+    so clients spot a missed delta and catch up from /shopping-list/changes.
+
+    Delta types:
+        item_added       -> {"item": ShoppingListItem.to_dict()}
+        item_deleted     -> {"item_id": int}
+        item_checked     -> {"item_id": int, "is_checked": bool}
+        items_changed    -> {"upserts": [item dicts], "deletes": [item IDs]}
+        list_regenerated -> {} (clients fetch /shopping-list/changes once)
+    """
+    payload["type"] = delta_type
+    payload["version"] = version
+    room = shopping_list_room(account_id)
+    app.logger.debug(f"[WEBSOCKET] Emitting {delta_type} delta to room {room}")
+    socketio.emit("shopping_list_delta", payload, room=room)
+
+
 def sync_session_locks_with_db() -> None:
     """Sync session locks with database locks."""
     db_locks = get_persistent_locks()
@@ -522,76 +1533,234 @@ PlanIdsDict = Dict[
 ]  # day -> meal_type -> recipe_id or manual text
 
 
-def generate_shopping_list_data(plan_ids: PlanIdsDict) -> ShoppingListDict:
+def get_plan_recipe_ids(plan_ids: PlanIdsDict) -> Set[int]:
+    """Unique recipe IDs the plan cooks (manual entries and leftovers excluded)."""
+    return cooked_recipe_ids(plan_ids)
+
+
+def shopping_list_entry(
+    name: str,
+    base_unit: str,
+    units: Set[str],
+    needed_base: float,
+    pantry_base: float,
+    recipes: Iterable[str],
+) -> Dict[str, Any]:
+    """
+    Builds one shopping-list row from quantities already in base units.
+    Shows the recipes' own unit when they all agree (e.g. "kg"), otherwise
+    the dimension's base unit (e.g. 500 g + 1 kg -> 1500 g).
+    """
+    display_unit = next(iter(units)) if len(units) == 1 else base_unit
+    factor = unit_base(display_unit)[1]
+    return {
+        "name": name,
+        "quantity": round((needed_base - pantry_base) / factor, 6),
+        "unit": display_unit,
+        "recipes": sorted(set(recipes)),
+        "in_pantry": pantry_base > 0,
+        "pantry_deducted": (
+            round(min(needed_base, pantry_base) / factor, 6) if pantry_base else 0
+        ),
+    }
+
+
+def aggregate_ingredients_reference(recipe_ids: Set[int]) -> ShoppingListDict:
+    """
+    Reference (pure Python) aggregation: loads each recipe's ingredients,
+    converts them to base units, sums per (name, base unit) and deducts
+    pantry stock in Python. Kept to validate aggregate_ingredients_sql;
+    not used on the hot path.
+    """
+    shopping_list_by_aisle: ShoppingListDict = defaultdict(list)
+    ingredient_map = defaultdict(
+        lambda: {"quantity": 0.0, "aisle": None, "units": set(), "recipes": set()}
+    )
+    if recipe_ids:
+        recipes = Recipe.query.filter(Recipe.id.in_(recipe_ids)).all()
+        for recipe in recipes:
+            for ing in recipe.ingredients:
+                base_unit, factor = unit_base(ing.unit_canonical or "")
+                key = (ing.name.strip().lower(), base_unit)
+                ingredient_map[key]["quantity"] += (ing.quantity_value or 0) * factor
+                ingredient_map[key]["aisle"] = catalog_aisle(ing) or "Other"
+                ingredient_map[key]["units"].add(ing.unit_canonical or "")
+                ingredient_map[key]["recipes"].add(recipe.name)
+    pantry_stock: Dict[Tuple[str, str], float] = defaultdict(float)
+    for pantry_item in PantryItem.query.all():
+        base_unit, factor = unit_base(pantry_item.unit_canonical or "")
+        key = (pantry_item.name.strip().lower(), base_unit)
+        pantry_stock[key] += (pantry_item.quantity_value or 0) * factor
+    for (name, base_unit), data in ingredient_map.items():
+        pantry_qty = pantry_stock.get((name, base_unit), 0)
+        if data["quantity"] - pantry_qty > 0:
+            shopping_list_by_aisle[data["aisle"]].append(
+                shopping_list_entry(
+                    name,
+                    base_unit,
+                    data["units"],
+                    data["quantity"],
+                    pantry_qty,
+                    data["recipes"],
+                )
+            )
+    return shopping_list_by_aisle
+
+
+# Separator for recipe names packed by group_concat (ASCII unit separator)
+_RECIPE_NAME_SEP = "\x1f"
+
+
+def unit_base_columns(unit_column) -> Tuple[Any, Any]:
+    """SQL expressions mapping a canonical unit column to (base unit, factor)."""
+    base_unit = case(
+        {unit: base for unit, (base, _) in UNIT_REGISTRY.items()},
+        value=unit_column,
+        else_=unit_column,
+    )
+    factor = case(
+        {unit: factor for unit, (_, factor) in UNIT_REGISTRY.items()},
+        value=unit_column,
+        else_=1.0,
+    )
+    return base_unit, factor
+
+
+def aggregate_ingredients_sql(
+    recipe_ids: Set[int], names: Optional[Set[str]] = None
+) -> ShoppingListDict:
+    """
+    Aggregates the plan's ingredients in one grouped query: ingredients of
+    the given recipes are converted to base units and summed per
+    normalized (name, base unit), joined to pantry stock on the same key,
+    and only rows still needed after the pantry deduction come back to
+    Python. With names, only those normalized ingredient names are
+    aggregated.
+    """
+    shopping_list_by_aisle: ShoppingListDict = defaultdict(list)
+    if not recipe_ids:
+        return shopping_list_by_aisle
+
+    ing = Ingredient.__table__
+    rec = Recipe.__table__
+    pan = PantryItem.__table__
+    cat = IngredientCatalog.__table__
+
+    ing_name = func.lower(func.trim(ing.c.name))
+    ing_base, ing_factor = unit_base_columns(ing.c.unit_canonical)
+    conditions = [ing.c.recipe_id.in_(recipe_ids)]
+    if names is not None:
+        conditions.append(ing_name.in_(names))
+    needed = (
+        select(
+            ing_name.label("name"),
+            ing_base.label("base_unit"),
+            func.min(ing.c.unit_canonical).label("unit_min"),
+            func.max(ing.c.unit_canonical).label("unit_max"),
+            func.sum(func.coalesce(ing.c.quantity_value, 0) * ing_factor).label(
+                "quantity"
+            ),
+            func.max(
+                func.coalesce(func.nullif(cat.c.aisle, ""), "Other")
+            ).label("aisle"),
+            func.group_concat(rec.c.name, _RECIPE_NAME_SEP).label("recipes"),
+        )
+        .select_from(
+            ing.join(rec, rec.c.id == ing.c.recipe_id).outerjoin(
+                cat, cat.c.id == ing.c.catalog_id
+            )
+        )
+        .where(*conditions)
+        .group_by(ing_name, ing_base)
+        .subquery()
+    )
+
+    pantry_name = func.lower(func.trim(pan.c.name))
+    pan_base, pan_factor = unit_base_columns(pan.c.unit_canonical)
+    stock = (
+        select(
+            pantry_name.label("name"),
+            pan_base.label("base_unit"),
+            func.sum(func.coalesce(pan.c.quantity_value, 0) * pan_factor).label(
+                "quantity"
+            ),
+        )
+        # Only the pantry rows for these ingredients (normalized-name index)
+        .where(pantry_name.in_(select(needed.c.name)))
+        .group_by(pantry_name, pan_base)
+        .subquery()
+    )
+
+    pantry_qty = func.coalesce(stock.c.quantity, 0)
+    rows = db.session.execute(
+        select(
+            needed.c.name,
+            needed.c.base_unit,
+            needed.c.unit_min,
+            needed.c.unit_max,
+            needed.c.aisle,
+            needed.c.recipes,
+            needed.c.quantity,
+            pantry_qty.label("pantry_qty"),
+        )
+        .select_from(
+            needed.outerjoin(
+                stock,
+                and_(
+                    stock.c.name == needed.c.name,
+                    stock.c.base_unit == needed.c.base_unit,
+                ),
+            )
+        )
+        .where(needed.c.quantity - pantry_qty > 0)
+    )
+    for row in rows:
+        shopping_list_by_aisle[row.aisle].append(
+            shopping_list_entry(
+                row.name,
+                row.base_unit,
+                {row.unit_min, row.unit_max},
+                row.quantity,
+                row.pantry_qty or 0,
+                row.recipes.split(_RECIPE_NAME_SEP),
+            )
+        )
+    return shopping_list_by_aisle
+
+
+def generate_shopping_list_data(
+    plan_ids: PlanIdsDict, use_sql: bool = True
+) -> ShoppingListDict:
     """
     Generates shopping list data based on the meal plan IDs.
     Aggregates ingredients across unique recipes in the plan,
     deducts available pantry items, and structures the list by aisle.
+    Each aggregated item carries its projected "cost" from the price
+    table (None when the ingredient has no price).
     Uses DB to persist checked state, with session as fallback.
-    """
-    from collections import defaultdict
 
-    shopping_list_by_aisle: ShoppingListDict = defaultdict(list)
+    The aggregation runs as a single SQL query by default; pass
+    use_sql=False to use the Python reference implementation.
+    """
     app.logger.debug(
         f"[SHOPLIST] Called generate_shopping_list_data with plan_ids: {plan_ids}"
     )
     # --- 1. Gather unique recipe IDs ---
-    unique_recipe_ids = set()
-    for day, meals in plan_ids.items():
-        for meal_type, meal_info in meals.items():
-            if (
-                meal_info
-                and meal_info.get("recipe_id") not in (None, -1)
-                and meal_info.get("status") != "leftover"
-            ):
-                unique_recipe_ids.add(meal_info["recipe_id"])
+    unique_recipe_ids = get_plan_recipe_ids(plan_ids)
     app.logger.debug(
         f"[SHOPLIST] Unique recipe IDs for aggregation: {unique_recipe_ids}"
     )
-    # --- 2. Aggregate ingredients ---
-    ingredient_map = defaultdict(
-        lambda: {"quantity": 0, "unit": None, "aisle": None, "recipes": set()}
+    # --- 2. Aggregate ingredients and deduct pantry items ---
+    aggregate = (
+        aggregate_ingredients_sql if use_sql else aggregate_ingredients_reference
     )
-    if unique_recipe_ids:
-        recipes = Recipe.query.filter(Recipe.id.in_(unique_recipe_ids)).all()
-        for recipe in recipes:
-            for ing in recipe.ingredients:
-                key = (ing.name.strip().lower(), (ing.unit or "").strip().lower())
-                ingredient_map[key]["quantity"] += float(ing.quantity or 0)
-                ingredient_map[key]["unit"] = ing.unit
-                ingredient_map[key]["aisle"] = ing.aisle or "Other"
-                ingredient_map[key]["recipes"].add(recipe.name)
-    app.logger.debug(f"[SHOPLIST] Aggregated ingredient map: {ingredient_map}")
-    # --- 3. Deduct pantry items ---
-    pantry_items = {i.name.strip().lower(): i for i in PantryItem.query.all()}
-    for (name, unit), data in ingredient_map.items():
-        pantry_item = pantry_items.get(name)
-        pantry_qty = 0
-        if (
-            pantry_item
-            and (pantry_item.unit or "").strip().lower() == (unit or "").strip().lower()
-        ):
-            try:
-                pantry_qty = float(pantry_item.quantity or 0)
-            except Exception:
-                pantry_qty = 0
-        remaining_qty = max(0, data["quantity"] - pantry_qty)
-        if remaining_qty > 0:
-            shopping_list_by_aisle[data["aisle"]].append(
-                {
-                    "name": name,
-                    "quantity": remaining_qty,
-                    "unit": data["unit"],
-                    "recipes": list(data["recipes"]),
-                    "in_pantry": pantry_qty > 0,
-                    "pantry_deducted": (
-                        min(data["quantity"], pantry_qty) if pantry_qty else 0
-                    ),
-                }
-            )
-            app.logger.debug(
-                f"[SHOPLIST] Added item: {name}, qty: {remaining_qty}, aisle: {data['aisle']}, unit: {data['unit']}"
-            )
+    shopping_list_by_aisle = aggregate(unique_recipe_ids)
+    # --- 3. Price what has to be bought (None where there is no price) ---
+    prices = get_price_table()
+    for items in shopping_list_by_aisle.values():
+        for item in items:
+            cost = prices.cost(item["name"], item["quantity"], item["unit"])
+            item["cost"] = round(cost, 2) if cost is not None else None
     # --- 4. Add custom items from session (fallback) ---
     custom_items = session.get("shopping_list_state", {}).get("custom_items", [])
     for item in custom_items:
@@ -614,6 +1783,243 @@ def generate_shopping_list_data(plan_ids: PlanIdsDict) -> ShoppingListDict:
     return shopping_list_by_aisle
 
 
+def shopping_list_key(name: Optional[str], unit: Optional[str]) -> Tuple[str, str]:
+    """
+    Identity of a shopping list row: normalized name and base unit, so a
+    row shown in another unit of the same kind (g and kg) is the same row.
+    """
+    return ((name or "").strip().lower(), unit_base(canonical_unit(unit))[0])
+
+
+def shopping_list_row_dict(row: Any) -> Dict[str, Any]:
+    """Serializes a shopping_list_item row (ORM object or Core row) like to_dict()."""
+    return {
+        "id": row.id,
+        "name": row.name,
+        "quantity": row.quantity,
+        "unit": row.unit,
+        "aisle": row.aisle,
+        "is_checked": row.is_checked,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+    }
+
+
+def write_shopping_list_rows(
+    inserts: List[Dict[str, Any]],
+    updates: List[Dict[str, Any]],
+    deleted_ids: List[int],
+) -> None:
+    """
+    Set-based writer for shopping list rows: one executemany INSERT, one
+    executemany UPDATE keyed by ID and a single DELETE ... WHERE id IN (...).
+    Bypasses the ORM unit of work so large lists cost a few statements
+    rather than one flush per object. Runs in the current transaction.
+    """
+    table = ShoppingListItem.__table__
+    if deleted_ids:
+        db.session.execute(table.delete().where(table.c.id.in_(deleted_ids)))
+    if updates:
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                quantity=bindparam("b_quantity"),
+                unit=bindparam("b_unit"),
+                aisle=bindparam("b_aisle"),
+            ),
+            updates,
+        )
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+
+
+def sync_shopping_list(
+    account_id: int,
+    shopping_list_data: ShoppingListDict,
+    names: Optional[Set[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Brings the account's stored shopping list in line with freshly generated
+    shopping list data by diffing on (normalized name, base unit). Matching
+    rows keep their ID and checked state and are only written when their
+    quantity, display unit or aisle changed; rows no longer needed are deleted and
+    new ones inserted. Everything happens in one transaction, followed by a
+    single coalesced "items_changed" socket delta.
+
+    With names (normalized ingredient names) only the stored rows with
+    those names are compared and the rest of the list is left alone, for
+    updates that can only affect a few ingredients.
+
+    Returns a dict with the new "version" (None if nothing changed) and the
+    "upserts"/"deletes" that were applied.
+    """
+    table = ShoppingListItem.__table__
+    existing_by_key: Dict[Tuple[str, str], Any] = {}
+    duplicate_ids: List[int] = []
+    existing = select(
+        table.c.id, table.c.name, table.c.unit, table.c.quantity, table.c.aisle
+    ).where(table.c.account_id == account_id)
+    if names is not None:
+        existing = existing.where(func.lower(func.trim(table.c.name)).in_(names))
+    for row in db.session.execute(existing.order_by(table.c.id)):
+        key = shopping_list_key(row.name, row.unit)
+        if key in existing_by_key:
+            duplicate_ids.append(row.id)
+        else:
+            existing_by_key[key] = row
+
+    inserts: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    changed_keys: Set[Tuple[str, str]] = set()
+    seen_keys: Set[Tuple[str, str]] = set()
+    now = datetime.utcnow()
+    for aisle, items in shopping_list_data.items():
+        for item in items:
+            key = shopping_list_key(item["name"], item.get("unit"))
+            if key in seen_keys or (names is not None and key[0] not in names):
+                continue
+            seen_keys.add(key)
+            quantity = item.get("quantity", 1)
+            unit = item.get("unit") or ""
+            row = existing_by_key.get(key)
+            if row is None:
+                inserts.append(
+                    {
+                        "account_id": account_id,
+                        "name": item["name"],
+                        "quantity": quantity,
+                        "unit": unit,
+                        "aisle": aisle,
+                        "is_checked": False,
+                        "updated_at": now,
+                    }
+                )
+                changed_keys.add(key)
+            elif (row.quantity, row.unit or "", row.aisle) != (quantity, unit, aisle):
+                updates.append(
+                    {
+                        "b_id": row.id,
+                        "b_quantity": quantity,
+                        "b_unit": unit,
+                        "b_aisle": aisle,
+                    }
+                )
+                changed_keys.add(key)
+
+    deleted_ids = duplicate_ids + [
+        row.id for key, row in existing_by_key.items() if key not in seen_keys
+    ]
+    if not changed_keys and not deleted_ids:
+        return {"version": None, "upserts": [], "deletes": []}
+    # Core inserts skip the flush hook, so link new rows to the catalog here
+    catalog_ids = get_catalog_ids(row["name"] for row in inserts)
+    for row in inserts:
+        row["catalog_id"] = catalog_ids.get(normalize_ingredient_name(row["name"]))
+
+    try:
+        write_shopping_list_rows(inserts, updates, deleted_ids)
+        # Read back the changed rows once to learn the IDs of the inserted ones
+        upserts = []
+        if changed_keys:
+            changed = select(table).where(table.c.account_id == account_id)
+            if names is not None:
+                changed = changed.where(func.lower(func.trim(table.c.name)).in_(names))
+            upserts = [
+                shopping_list_row_dict(row)
+                for row in db.session.execute(changed)
+                if shopping_list_key(row.name, row.unit) in changed_keys
+            ]
+        version = record_shopping_list_changes(
+            account_id,
+            upserted_ids=[item["id"] for item in upserts],
+            deleted_ids=deleted_ids,
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    emit_shopping_list_delta(
+        account_id,
+        "items_changed",
+        version=version,
+        upserts=upserts,
+        deletes=deleted_ids,
+    )
+    app.logger.debug(
+        f"[SHOPLIST] Synced list for account {account_id}: "
+        f"{len(upserts)} upserts, {len(deleted_ids)} deletes (version {version})"
+    )
+    return {"version": version, "upserts": upserts, "deletes": deleted_ids}
+
+
+def recipe_ingredient_names(recipe_ids: Iterable[int]) -> Set[str]:
+    """Normalized names of the ingredients the given recipes use."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return set()
+    name = func.lower(func.trim(Ingredient.name))
+    return set(
+        db.session.execute(
+            select(name).where(Ingredient.recipe_id.in_(recipe_ids)).distinct()
+        ).scalars()
+    )
+
+
+def remember_shopping_list_plan(account_id: int, plan_ids: PlanIdsDict) -> None:
+    """
+    Notes in the session which plan the account's shopping list was just
+    synced from, so the next re-plan can update the list incrementally.
+    """
+    key = get_candidate_snapshot().key
+    session["shopping_list_plan"] = {
+        "recipe_ids": sorted(get_plan_recipe_ids(plan_ids)),
+        "catalog": list(key) if key else None,
+        "version": get_shopping_list_version(account_id),
+    }
+
+
+def sync_shopping_list_for_plan(
+    account_id: int, plan_ids: PlanIdsDict, diff: Optional[PlanDiff] = None
+) -> Dict[str, Any]:
+    """
+    Syncs the account's stored shopping list with plan_ids (see
+    sync_shopping_list). Given the diff from the plan the list was last
+    synced from, only the ingredients of the recipes the plan started or
+    stopped cooking are aggregated and synced, so re-rolling one dinner
+    touches one recipe's rows. The whole list is rebuilt when there is no
+    diff, or when the list, the recipe catalog or the synced plan changed
+    since (pantry edits are picked up by the next full rebuild).
+    """
+    synced = session.get("shopping_list_plan")
+    key = get_candidate_snapshot().key
+    recipe_ids = get_plan_recipe_ids(plan_ids)
+    incremental = (
+        diff is not None
+        and synced is not None
+        and key is not None
+        and synced["catalog"] == list(key)
+        and set(synced["recipe_ids"])
+        == (recipe_ids - diff.added_recipe_ids) | diff.removed_recipe_ids
+        and synced["version"] == get_shopping_list_version(account_id)
+    )
+    if incremental:
+        names = recipe_ingredient_names(diff.changed_recipe_ids)
+        shopping_list_data = (
+            aggregate_ingredients_sql(recipe_ids, names) if names else {}
+        )
+        result = sync_shopping_list(account_id, shopping_list_data, names=names)
+    else:
+        result = sync_shopping_list(account_id, generate_shopping_list_data(plan_ids))
+    remember_shopping_list_plan(account_id, plan_ids)
+    app.logger.debug(
+        f"[SHOPLIST] {'Delta' if incremental else 'Full'} sync for account "
+        f"{account_id}: {len(result['upserts'])} upserts, "
+        f"{len(result['deletes'])} deletes"
+    )
+    return result
+
+
 # --- Meal Plan Generation ---
 # Type Aliases for Meal Plan structure
 MealInfoDict = Dict[str, Any]  # Holds recipe_id, status, locks etc.
@@ -650,6 +2056,7 @@ def toggle_meal_lock():
     except Exception as e:
         app.logger.warning(f"[TOGGLE_LOCK] Could not find recipe_id for {slot_id}: {e}")
 
+    lock_info = None
     if locked and recipe_id:
         lock_info = {
             "recipe_id": recipe_id,
@@ -657,9 +2064,7 @@ def toggle_meal_lock():
             "default": False,
             "lock_type": "user",
         }
-        update_persistent_lock(slot_id, lock_info)
-    else:
-        update_persistent_lock(slot_id, None)
+    apply_lock_changes({slot_id: lock_info})
     # Update session lock state for this slot
     session_locks = session.get("locked_meals", {})
     if locked and recipe_id:
@@ -679,19 +2084,12 @@ def toggle_meal_lock():
     return jsonify({"success": True})
 
 
-def get_next_day(current_day: str, days: List[str]) -> Optional[str]:
-    """Helper to get the next day name in the week list."""
-    try:
-        idx = days.index(current_day)
-    except ValueError:
-        return None
-    if idx + 1 < len(days):
-        return days[idx + 1]
-    return None
-
-
-def clear_leftover_locks() -> None:
-    """Remove leftover locks from the database and session."""
+def clear_leftover_locks(lock_changes: Optional[LockChangeSet] = None) -> None:
+    """
+    Remove leftover locks from the session and the database. With
+    lock_changes the database delete is recorded there instead of
+    committed immediately.
+    """
     session_locks = session.get("locked_meals", {})
     leftover_keys = [
         k for k, v in session_locks.items() if v.get("lock_type") == "leftover"
@@ -700,301 +2098,407 @@ def clear_leftover_locks() -> None:
         session_locks.pop(key, None)
     session["locked_meals"] = session_locks
     session.modified = True
-    LockedMeal.query.filter_by(lock_type="leftover").delete()
-    db.session.commit()
+    changes = lock_changes if lock_changes is not None else LockChangeSet()
+    changes.clear_lock_type("leftover")
+    if lock_changes is None:
+        changes.apply()
 
 
-def apply_manual_leftovers(
-    plan_ids: PlanIdsDict,
-    locked_meals: LockedMealsDict,
-    num_people: int,
-    days: List[str],
+def record_leftover_locks(
+    locks: Dict[str, Dict[str, Any]], lock_changes: LockChangeSet
 ) -> None:
-    """Apply leftover logic for manually added recipes."""
-    for slot_id, lock_info in locked_meals.items():
-        recipe_id = lock_info.get("recipe_id")
-        if not lock_info.get("manual") or not recipe_id or recipe_id <= 0:
-            continue
-        day, meal_type = slot_id.split("_")
-        recipe = db.session.get(Recipe, recipe_id)
-        if not recipe:
-            continue
-        plan_ids.setdefault(day, {})[meal_type] = {
-            "recipe_id": recipe_id,
-            "status": "locked",
-            "locked_by_main": True,
-            "manual_text": lock_info.get("text"),
-        }
-        leftovers = (recipe.servings or 0) - num_people
-        if leftovers >= num_people:
-            assign_leftovers(
-                plan_ids, day, meal_type, leftovers, num_people, recipe_id, days
-            )
+    """Records leftover locks from the planner in lock_changes and the session."""
+    if not locks:
+        return
+    session_locks = session.get("locked_meals", {})
+    for slot_id, lock_info in locks.items():
+        lock_changes.set(slot_id, lock_info)
+        session_locks[slot_id] = lock_info
+    session["locked_meals"] = session_locks
+    session.modified = True
 
 
-def assign_leftovers(
-    plan_ids: PlanIdsDict,
-    current_day: str,
-    meal_type: str,
-    leftovers: int,
-    num_people: int,
-    current_recipe_id: int,
-    days: List[str],
-) -> None:
-    """Assign leftover servings to subsequent meal slots."""
-    next_day = get_next_day(current_day, days)
-    while leftovers >= num_people and next_day:
-        slot_info = plan_ids.get(next_day, {}).get(meal_type)
+# Seeded plans, shared by the requests this process serves
+plan_cache = PlanCache(int(os.environ.get("PLAN_CACHE_SIZE", 256)))
 
-        # Skip if slot exists and is locked (user or default)
-        if slot_info is not None:
-            if (
-                slot_info.get("locked_by_main", False)
-                or slot_info.get("locked_by_user", False)
-                or slot_info.get("default_lock", False)
-            ):
-                next_day = get_next_day(next_day, days)
-                continue
+# Most time the variety planning mode may spend searching, in milliseconds;
+# a safety limit only, the search draws a fixed number of plans per seed
+PLAN_SEARCH_BUDGET_MS = float(
+    os.environ.get("PLAN_SEARCH_BUDGET_MS", DEFAULT_TIME_BUDGET_MS)
+)
 
-        leftover_label = f"Leftover from {current_day}'s {meal_type.lower()}"
-        plan_ids[next_day][meal_type] = {
-            "recipe_id": current_recipe_id,
-            "status": "leftover",
-            "manual_text": leftover_label,
-            "locked_by_main": False,
-            "locked_by_user": False,
-        }
 
-        slot_id = f"{next_day}_{meal_type}"
+def new_plan_seed() -> int:
+    return random.getrandbits(32)
 
-        # Persist leftover lock in DB and update session state
-        lock_info = {
-            "recipe_id": current_recipe_id,
-            "manual": False,
-            "default": False,
-            "lock_type": "leftover",
-            "text": leftover_label,
-        }
-        update_persistent_lock(slot_id, lock_info)
 
-        session_locks = session.get("locked_meals", {})
-        session_locks[slot_id] = lock_info
-        session["locked_meals"] = session_locks
-        session.modified = True
+# Longest dashboard plan, in days (the plan is keyed by date)
+MAX_PLAN_DURATION = 31
 
-        leftovers -= num_people
-        next_day = get_next_day(next_day, days)
 
-    return None
+def plan_week_start(start_day: Optional[str], today: Optional[date] = None) -> date:
+    """The date the current plan week began: the last start_day on or before today."""
+    today = today or date.today()
+    start_idx = ALL_DAYS.index(start_day) if start_day in ALL_DAYS else 0
+    return today - timedelta(days=(today.weekday() - start_idx) % 7)
 
 
-def generate_meal_plan(
-    num_people: int, locked_meals: LockedMealsDict, days: Optional[List[str]] = None
-) -> PlanIdsDict:
-    """
-    Generates a meal plan for the specified days, considering locked meals and user default settings for each meal type.
-    If days is None, defaults to all 7 days (Monday-Sunday).
-    """
-    if days is None:
-        days = [
-            "Monday",
-            "Tuesday",
-            "Wednesday",
-            "Thursday",
-            "Friday",
-            "Saturday",
-            "Sunday",
-        ]
-    plan_ids: PlanIdsDict = {
-        day: {meal_type: None for meal_type in meal_types} for day in days
-    }
+def next_plan_week_start(
+    start_day: Optional[str], today: Optional[date] = None
+) -> date:
+    """The next start_day after today: the week `flask plan-accounts` plans."""
+    return plan_week_start(start_day, today) + timedelta(weeks=1)
 
-    # Fetch user default meal settings
-    account = current_user.accounts.first()
-    settings = getattr(account, "settings", None)
-    default_breakfast_id = getattr(settings, "default_breakfast_id", None)
-    default_lunch_id = getattr(settings, "default_lunch_id", None)
-    default_dinner_id = getattr(settings, "default_dinner_id", None)
 
-    # Apply defaults for each meal type if not locked
-    for day in days:
-        for meal_type in meal_types:
-            slot_id = f"{day}_{meal_type}"
-            if slot_id not in locked_meals:
-                if meal_type == "Breakfast" and default_breakfast_id:
-                    plan_ids[day][meal_type] = {
-                        "recipe_id": int(default_breakfast_id),
-                        "status": "locked",
-                        "locked_by_main": False,
-                        "default_lock": True,
-                    }
-                elif meal_type == "Lunch" and default_lunch_id:
-                    plan_ids[day][meal_type] = {
-                        "recipe_id": int(default_lunch_id),
-                        "status": "locked",
-                        "locked_by_main": False,
-                        "default_lock": True,
-                    }
-                elif meal_type == "Dinner" and default_dinner_id:
-                    plan_ids[day][meal_type] = {
-                        "recipe_id": int(default_dinner_id),
-                        "status": "locked",
-                        "locked_by_main": False,
-                        "default_lock": True,
-                    }
-    # (rest of the original function logic for locked meals and random assignments follows...)
+def plan_period_days(
+    start_day: Optional[str], duration: Any, today: Optional[date] = None
+) -> List[date]:
+    """
+    Dates of an account's dashboard plan: meal_plan_duration days (7 if
+    invalid) from the start of the current plan week. The plan, its locks
+    and its history are keyed by these dates (date_slot_id), so plans
+    longer than a week do not repeat weekday keys.
+    """
+    try:
+        duration = int(duration)
+    except (TypeError, ValueError):
+        duration = 7
+    if duration < 1 or duration > MAX_PLAN_DURATION:
+        duration = 7
+    start = plan_week_start(start_day, today)
+    return [start + timedelta(days=offset) for offset in range(duration)]
 
-    # Handle locked meals from session
-    active_locks = {}  # (Coords) -> recipe_id
-    for slot_id, lock_info in locked_meals.items():
-        try:
-            day, meal_type = slot_id.split("_", 1)
-            if day not in days or meal_type not in meal_types:
-                app.logger.warning(f"Invalid slot_id format in locked_meals: {slot_id}")
-                continue  # Skip malformed slot_id
-            current_coords = (days.index(day), meal_type)
-        except Exception:
-            app.logger.warning(f"Invalid slot_id format in locked_meals: {slot_id}")
-            continue  # Skip malformed slot_id
-
-        if isinstance(lock_info, dict) and "recipe_id" in lock_info:
-            recipe_id = lock_info["recipe_id"]
-            # Handle manual entry lock (-1)
-            if recipe_id == -1:
-                active_locks[current_coords] = -1
-                plan_ids[day][meal_type] = {
-                    "recipe_id": -1,
-                    "manual_text": lock_info.get("text", "Manual Entry"),
-                    "status": "locked",
-                    "locked_by_main": True,  # User explicitly set this
-                }
-            elif recipe_id is not None:
-                # Check if the locked recipe actually exists in the DB
-                if db.session.get(Recipe, recipe_id):
-                    if lock_info.get("lock_type") == "leftover":
-                        # Leftover slots are not treated as locked
-                        plan_ids[day][meal_type] = {
-                            "recipe_id": recipe_id,
-                            "status": "leftover",
-                            "manual_text": lock_info.get("text"),
-                            "locked_by_main": False,
-                            "locked_by_user": False,
-                        }
-                    else:
-                        active_locks[current_coords] = recipe_id
-                        plan_ids[day][meal_type] = {
-                            "recipe_id": recipe_id,
-                            "status": "locked",
-                            "locked_by_main": True,  # User explicitly locked this
-                            "default_lock": False,  # Overrides default if applicable
-                        }
-                        # If this lock replaced a default breakfast lock, update plan_ids status
-                        if (
-                            meal_type == "Breakfast"
-                            and plan_ids[day][meal_type]
-                            and plan_ids[day][meal_type].get("default_lock")
-                        ):
-                            plan_ids[day][meal_type]["default_lock"] = False
-                else:
-                    # Locked recipe doesn't exist (maybe deleted)
-                    flash(
-                        f"Locked recipe ID {recipe_id} for {slot_id} not found in database. Lock ignored.",
-                        "warning",
-                    )
-                    # Ensure this invalid lock is not active and plan slot is cleared if it held the bad ID
-                    if (
-                        current_coords in active_locks
-                        and active_locks[current_coords] == recipe_id
-                    ):
-                        del active_locks[current_coords]
-                    if (
-                        plan_ids[day][meal_type]
-                        and plan_ids[day][meal_type].get("recipe_id") == recipe_id
-                    ):
-                        plan_ids[day][meal_type] = None
 
-    # --- Fetch Recipes ---
-    # Fetch all recipes once for efficiency
-    all_recipes = Recipe.query.all()
-    recipes_by_type: Dict[str, List[Recipe]] = {
-        "Breakfast": [r for r in all_recipes if r.is_breakfast],
-        "Lunch": [r for r in all_recipes if r.is_lunch],
-        "Dinner": [r for r in all_recipes if r.is_dinner],
-    }
+def plan_span(days: List[str]) -> str:
+    """PregeneratedPlan.days for a plan of these ISO dates: its first and last day."""
+    return f"{days[0]}/{days[-1]}"
+
 
-    # --- Main Generation Loop ---
-    for day_index, day in enumerate(days):
-        for meal_type in meal_types:
-            current_slot_coords: Coords = (day_index, meal_type)
+def take_pregenerated_plan(account_id: int, days: List[str]) -> Optional[PlanIdsDict]:
+    """
+    Removes and returns the account's pregenerated plan if it covers these
+    days (ISO dates), recording its leftover locks in the session and the
+    database and saving it as the plan of the week it starts. A plan for a
+    later week is kept for then; one for an earlier week is dropped.
+    """
+    stored = PregeneratedPlan.query.filter_by(account_id=account_id).first()
+    if stored is None:
+        return None
+    first_day = stored.days.partition("/")[0]
+    if first_day > days[0]:
+        return None
+    plan_ids = json.loads(stored.plan) if stored.days == plan_span(days) else None
+    changes = LockChangeSet()
+    if plan_ids is not None:
+        record_leftover_locks(json.loads(stored.locks), changes)
+    db.session.delete(stored)
+    db.session.commit()
+    changes.apply()
+    if plan_ids is not None:
+        remember_plan(
+            account_id, None, plan_ids, week_start=date.fromisoformat(first_day)
+        )
+    return plan_ids
 
-            # Skip if slot is already filled (by locks or previous leftover assignment)
-            if plan_ids[day][meal_type] is not None:
-                continue
 
-            # --- 2. Assign New Random Recipe if No Leftover ---
-            available_recipes = recipes_by_type.get(meal_type, [])
-            if not available_recipes:
-                # No recipes available for this meal type
-                plan_ids[day][meal_type] = {
-                    "recipe_id": None,
-                    "status": "empty",
-                    "locked_by_main": False,
-                }
-                continue
+# Days of earlier plans read back as planner history: the longest repeat
+# interval the settings page allows
+PLAN_HISTORY_DAYS = 31
 
-            recipes_to_choose = available_recipes
-            # Avoid choosing default breakfast if other breakfast options exist
-            if meal_type == "Breakfast" and default_breakfast_id:
-                non_default_breakfasts = [
-                    r for r in available_recipes if r.id != default_breakfast_id
-                ]
-                if non_default_breakfasts:
-                    recipes_to_choose = non_default_breakfasts
-                # If only default breakfast exists, recipes_to_choose remains [default_breakfast_recipe]
-
-            if not recipes_to_choose:
-                # This case should be rare (only default breakfast exists, but was filtered out?)
-                plan_ids[day][meal_type] = {
-                    "recipe_id": None,
-                    "status": "empty",
-                    "locked_by_main": False,
-                }
-                continue
 
-            # Choose a random recipe from the suitable list
-            chosen_recipe = random.choice(recipes_to_choose)
-            plan_ids[day][meal_type] = {
-                "recipe_id": chosen_recipe.id,
-                "status": "new",
-                "locked_by_main": False,
+def plan_history_days(
+    weeks: Dict[date, PlanIdsDict], week_start: date, num_days: int
+) -> List[Dict[str, Optional[int]]]:
+    """
+    Planner history for the num_days days before week_start, oldest first,
+    from the date-keyed plans of earlier weeks keyed by the date each week
+    started. A day planned twice is read from the later plan; days without
+    a saved plan are served nothing, so the days that follow keep their
+    distance from the plan.
+    """
+    served: PlanIdsDict = {}
+    for started in sorted(weeks):
+        if started < week_start:
+            served.update(weeks[started])
+    history: List[Dict[str, Optional[int]]] = []
+    for days_back in range(num_days, 0, -1):
+        meals = served.get((week_start - timedelta(days=days_back)).isoformat(), {})
+        history.append(
+            {
+                meal_type: (meal_info or {}).get("recipe_id")
+                for meal_type, meal_info in meals.items()
             }
+        )
+    return history
 
-            # --- 3. Calculate and Assign Leftovers ---
-            try:
-                servings = chosen_recipe.servings
-                if (
-                    servings is not None
-                    and isinstance(num_people, int)
-                    and num_people > 0
-                ):
-                    leftovers = servings - num_people
-                    if leftovers >= num_people:
-                        assign_leftovers(
-                            plan_ids,
-                            day,
-                            meal_type,
-                            leftovers,
-                            num_people,
-                            chosen_recipe.id,
-                            days,
-                        )
-            except (TypeError, ValueError, ZeroDivisionError) as e:
-                app.logger.error(
-                    f"Error calculating leftovers for recipe {chosen_recipe.id} (servings: {chosen_recipe.servings}, num_people: {num_people}): {e}"
-                )
-                # Continue without generating leftovers for this meal
 
-    return plan_ids
+def load_plan_history(
+    account_id: int,
+    start_day: Optional[str],
+    repeat_interval: Optional[int],
+    today: Optional[date] = None,
+) -> List[Dict[str, Optional[int]]]:
+    """
+    The last repeat_interval days of the account's earlier plans, as
+    planner history; empty when no repeat interval is set.
+    """
+    num_days = min(repeat_interval or 0, PLAN_HISTORY_DAYS)
+    if num_days <= 0:
+        return []
+    week_start = plan_week_start(start_day, today)
+    rows = db.session.execute(
+        select(PlanHistory.week_start, PlanHistory.plan).where(
+            PlanHistory.account_id == account_id,
+            PlanHistory.week_start < week_start,
+            # Plans that began earlier end before the history does
+            PlanHistory.week_start
+            > week_start - timedelta(days=num_days + MAX_PLAN_DURATION),
+        )
+    ).all()
+    weeks = {row.week_start: json.loads(row.plan) for row in rows}
+    return plan_history_days(weeks, week_start, num_days)
+
+
+def remember_plan(
+    account_id: int,
+    start_day: Optional[str],
+    plan_ids: PlanIdsDict,
+    today: Optional[date] = None,
+    week_start: Optional[date] = None,
+) -> None:
+    """
+    Saves plan_ids as the account's plan for the week beginning on
+    week_start (default the current week), replacing any earlier one for
+    it, and drops plans too old to reach the PLAN_HISTORY_DAYS before it.
+    """
+    week_start = week_start or plan_week_start(start_day, today)
+    stored = PlanHistory.query.filter_by(
+        account_id=account_id, week_start=week_start
+    ).first()
+    if stored is None:
+        stored = PlanHistory(account_id=account_id, week_start=week_start)
+        db.session.add(stored)
+    stored.plan = json.dumps(plan_ids)
+    stored.updated_at = datetime.utcnow()
+    PlanHistory.query.filter(
+        PlanHistory.account_id == account_id,
+        PlanHistory.week_start
+        <= week_start - timedelta(days=PLAN_HISTORY_DAYS + MAX_PLAN_DURATION),
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def apply_manual_leftovers(
+    plan_ids: PlanIdsDict,
+    locked_meals: LockedMealsDict,
+    num_people: int,
+    days: List[str],
+    lock_changes: Optional[LockChangeSet] = None,
+) -> None:
+    """
+    Apply leftover logic for manually added recipes (see
+    planner.plan_manual_leftovers). Leftover locks are recorded in
+    lock_changes, or written in one batch at the end if none is given.
+    """
+    changes = lock_changes if lock_changes is not None else LockChangeSet()
+    locks = plan_manual_leftovers(
+        get_candidate_snapshot(), plan_ids, locked_meals, num_people, days
+    )
+    record_leftover_locks(locks, changes)
+    if lock_changes is None:
+        changes.apply()
+
+
+def generate_meal_plan(
+    num_people: int,
+    locked_meals: LockedMealsDict,
+    dates: Optional[List[date]] = None,
+    lock_changes: Optional[LockChangeSet] = None,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+    seed: Optional[int] = None,
+    previous: Optional[PlanIdsDict] = None,
+) -> PlanIdsDict:
+    """
+    Generates a meal plan for the current user over dates (consecutive,
+    default the account's plan_period_days) with planner.plan_dated_meals,
+    keyed by ISO date, and applies the result: warnings are flashed and
+    leftover locks are added to the session and recorded in lock_changes
+    when given, otherwise written in one transaction before returning. Accounts using the
+    overlap planning mode get the plan improved by minimize_shopping_list;
+    the pantry mode ranks recipes by how much of them is in stock, the
+    variety mode keeps the best of a fixed number of plans
+    (variety.best_of_plans, capped by PLAN_SEARCH_BUDGET_MS), and the
+    expiring mode fills the earliest slots with recipes that use up dated
+    pantry stock before it goes off (expiry.use_expiring_first). Nutrient
+    targets are then met where the recipes allow
+    (nutrition.meet_nutrient_targets), and with a weekly budget set the
+    plan is fitted to its share of it (budget.fit_budget), which has the
+    last word.
+
+    With a seed the plan is reproducible and kept in plan_cache, keyed by
+    the account, its settings, the locks, the recipe catalog version, the
+    price table and nutrient data in use and the seed, so an identical
+    request skips planning.
+
+    history defaults to the account's plans of the weeks before
+    (load_plan_history), so the repeat interval holds across weeks.
+
+    previous is the plan being replaced: its leftover locks are kept while
+    the slot they come from keeps its recipe, and the stale ones are
+    unlocked so their slots are planned again (planner.carry_over_locks).
+    """
+    changes = lock_changes if lock_changes is not None else LockChangeSet()
+    if previous is not None:
+        locked_meals, stale = carry_over_locks(previous, locked_meals)
+        session_locks = session.get("locked_meals", {})
+        for slot_id in stale:
+            changes.set(slot_id, None)
+            session_locks.pop(slot_id, None)
+        session["locked_meals"] = session_locks
+        session.modified = True
+    candidates = get_candidate_snapshot()
+    account = current_user.accounts.first()
+    settings = getattr(account, "settings", None)
+    plan_settings = PlanSettings.from_settings(settings)
+    if dates is None:
+        dates = plan_period_days(
+            getattr(settings, "meal_plan_start_day", None),
+            getattr(settings, "meal_plan_duration", None),
+        )
+    days = [day.isoformat() for day in dates]
+    if history is None and account is not None:
+        history = load_plan_history(
+            account.id,
+            getattr(settings, "meal_plan_start_day", None),
+            plan_settings.meal_repeat_interval,
+        )
+    stock = (
+        get_pantry_stock_keys()
+        if plan_settings.planning_mode == PLANNING_MODE_PANTRY
+        else None
+    )
+    expiring = (
+        get_expiring_stock(candidates, start=dates[0])
+        if plan_settings.planning_mode == PLANNING_MODE_EXPIRING
+        else None
+    )
+
+    result = cache_key = None
+    if seed is not None and account is not None and candidates.key is not None:
+        cache_key = plan_cache_key(
+            account.id,
+            plan_settings,
+            locked_meals,
+            candidates.key,
+            seed,
+            days,
+            num_people,
+            history=history,
+            stock=(
+                [
+                    expiring.today,
+                    expiring.plan_start,
+                    *expiring.at_risk(len(days)),
+                ]
+                if expiring is not None
+                else stock
+            ),
+            data_versions=[
+                get_price_table().key if plan_settings.weekly_budget else None,
+                (
+                    get_recipe_nutrients(candidates).key
+                    if plan_settings.nutrient_targets
+                    else None
+                ),
+            ],
+        )
+        result = plan_cache.get(cache_key)
+        app.logger.debug(
+            f"Plan cache {'hit' if result else 'miss'}: {plan_cache.stats()}"
+        )
+    if result is None:
+        rng = random.Random(seed)
+        scores = (
+            get_ingredient_index(candidates).pantry_coverage(stock)
+            if stock is not None
+            else None
+        )
+        if expiring is not None:
+            scores = expiry_scores(expiring, len(days))
+        if plan_settings.planning_mode == PLANNING_MODE_VARIETY:
+            result = best_of_plans(
+                candidates,
+                plan_settings,
+                locked_meals,
+                num_people,
+                get_ingredient_matrix(candidates),
+                days=days,
+                rng=rng,
+                history=history,
+                time_budget_ms=PLAN_SEARCH_BUDGET_MS,
+            )
+        else:
+            result = plan_dated_meals(
+                candidates,
+                plan_settings,
+                locked_meals,
+                num_people,
+                dates[0],
+                len(dates),
+                rng=rng,
+                history=history,
+                scores=scores,
+                scores_from=expiring.today if expiring is not None else None,
+            )
+        if plan_settings.planning_mode == PLANNING_MODE_OVERLAP:
+            result = minimize_shopping_list(
+                result,
+                candidates,
+                get_ingredient_matrix(candidates),
+                plan_settings,
+                num_people,
+                history=history,
+                rng=rng,
+            )
+        if expiring is not None:
+            result = use_expiring_first(
+                result,
+                candidates,
+                expiring,
+                plan_settings,
+                num_people,
+                history=history,
+            )
+        if plan_settings.nutrient_targets:
+            result = meet_nutrient_targets(
+                result,
+                candidates,
+                get_recipe_nutrients(candidates),
+                plan_settings,
+                num_people,
+                history=history,
+                rng=rng,
+            )
+        budget = plan_budget(plan_settings.weekly_budget, len(days))
+        if budget is not None:
+            result = fit_budget(
+                result,
+                candidates,
+                get_recipe_costs(candidates),
+                plan_settings,
+                num_people,
+                budget,
+                history=history,
+                rng=rng,
+            )
+        if cache_key is not None:
+            plan_cache.put(cache_key, result)
+    for message in result.warnings:
+        flash(message, "warning")
+    record_leftover_locks(result.lock_changes, changes)
+    if lock_changes is None:
+        changes.apply()
+    return result.plan_ids
 
 
 # --- Routes (MUST come after app, db, models, helpers are defined) ---
@@ -1037,6 +2541,7 @@ def update_shopping_item_checked():
         # Update the item
         item.is_checked = is_checked
         item.updated_at = datetime.utcnow()
+        version = record_shopping_list_changes(account.id, upserted_ids=[item.id])
         db.session.commit()
 
         # Verify the update
@@ -1045,16 +2550,13 @@ def update_shopping_item_checked():
             return jsonify({"success": False, "error": "Failed to update item"}), 500
 
         # Emit update to all users in the same account
-        room = f"shopping_list_{account.id}"
-        app.logger.debug(f"[WEBSOCKET] Emitting item_updated to room {room}")
-        socketio.emit(
-            "item_updated",
-            {
-                "item_id": item_id,
-                "is_checked": item.is_checked,
-                "updated_at": item.updated_at.isoformat(),
-            },
-            room=room,
+        emit_shopping_list_delta(
+            account.id,
+            "item_checked",
+            version=version,
+            item_id=item_id,
+            is_checked=item.is_checked,
+            updated_at=item.updated_at.isoformat(),
         )
 
         return jsonify(
@@ -1137,12 +2639,6 @@ def dashboard():
     )
     meal_plan_duration = getattr(settings, "meal_plan_duration", 7) if settings else 7
     num_people = getattr(settings, "num_people", 2) if settings else 2
-    try:
-        meal_plan_duration = int(meal_plan_duration)
-    except Exception:
-        meal_plan_duration = 7
-    if meal_plan_duration < 1 or meal_plan_duration > 31:
-        meal_plan_duration = 7
     try:
         num_people = int(num_people)
     except Exception:
@@ -1150,17 +2646,27 @@ def dashboard():
     if num_people < 1:
         num_people = 2
 
-    # Compute the days for the plan, starting from meal_plan_start_day
-    start_idx = (
-        ALL_DAYS.index(meal_plan_start_day) if meal_plan_start_day in ALL_DAYS else 0
-    )
-    days = [ALL_DAYS[(start_idx + i) % 7] for i in range(meal_plan_duration)]
+    # The plan's dates, from the start of the current plan week; the plan
+    # and its locks are keyed by ISO date (date_slot_id)
+    plan_days = plan_period_days(meal_plan_start_day, meal_plan_duration)
+    days = [day.isoformat() for day in plan_days]
 
     # Handle POST request (form submission)
     if request.method == "POST":
         # No longer handle num_people from dashboard form; it is now only set via settings page
         pass
 
+        # The planning mode picked next to the Generate button is kept as
+        # the account setting
+        planning_mode = request.form.get("planning_mode")
+        if (
+            settings is not None
+            and planning_mode in PLANNING_MODES
+            and planning_mode != settings.planning_mode
+        ):
+            settings.planning_mode = planning_mode
+            db.session.commit()
+
         # Check if this is a "Lock All" request
         lock_all = request.form.get("lock_all_flag") == "true"
         app.logger.info(f"Lock all flag: {lock_all}")
@@ -1169,13 +2675,31 @@ def dashboard():
         new_locked_meals: Dict[str, Dict[str, Any]] = {}
         plan_ids_before_update: PlanIdsDict = session.get("current_plan_ids", {})
 
-        # Remove leftover locks before regenerating the plan
-        clear_leftover_locks()
+        # All lock writes for this submission are applied in one transaction
+        lock_changes = LockChangeSet()
+
+        # Remove leftover locks before regenerating the plan; the ones still
+        # ticked come back below and stay while their source slot does
+        previous_locks: LockedMealsDict = dict(session.get("locked_meals", {}))
+        clear_leftover_locks(lock_changes)
+
+        # Validate every recipe ID the form refers to with one query
+        recipes = get_recipe_prefetcher()
+        recipes.prefetch(
+            value
+            for key, value in request.form.items()
+            if key.startswith(("manual_select_", "recipeid_"))
+        )
+        recipes.prefetch(
+            (meal_info or {}).get("recipe_id")
+            for day_plan in plan_ids_before_update.values()
+            for meal_info in day_plan.values()
+        )
 
         # --- Loop through all possible slots and determine lock state based on form data ---
-        for day in days:
+        for day in plan_days:
             for meal_type in meal_types:
-                slot_id = f"{day}_{meal_type}"
+                slot_id = date_slot_id(day, meal_type)
                 # Get relevant form inputs for this slot
                 manual_select = request.form.get(f"manual_select_{slot_id}")
                 manual_text = request.form.get(f"manual_text_{slot_id}", "").strip()
@@ -1205,7 +2729,7 @@ def dashboard():
                 elif manual_select and manual_select != "0" and manual_select != "-1":
                     try:
                         recipe_id = int(manual_select)
-                        if db.session.get(Recipe, recipe_id):
+                        if recipes.exists(recipe_id):
                             lock_info_to_set = {
                                 "recipe_id": recipe_id,
                                 "manual": True,
@@ -1249,9 +2773,9 @@ def dashboard():
                             ):
                                 current_recipe_id = int(recipe_id_in_slot_str)
                             elif lock_all:
-                                slot_info = plan_ids_before_update.get(day, {}).get(
-                                    meal_type, {}
-                                )
+                                slot_info = plan_ids_before_update.get(
+                                    day.isoformat(), {}
+                                ).get(meal_type, {})
                                 plan_recipe_id = slot_info.get("recipe_id")
                                 if plan_recipe_id and plan_recipe_id != -1:
                                     current_recipe_id = plan_recipe_id
@@ -1262,8 +2786,14 @@ def dashboard():
                             )
                             current_recipe_id = None
 
-                        if current_recipe_id and current_recipe_id > 0:
-                            if db.session.get(Recipe, current_recipe_id):
+                        previous_lock = previous_locks.get(slot_id) or {}
+                        if (
+                            previous_lock.get("lock_type") == "leftover"
+                            and previous_lock.get("recipe_id") == current_recipe_id
+                        ):
+                            lock_info_to_set = previous_lock
+                        elif current_recipe_id and current_recipe_id > 0:
+                            if recipes.exists(current_recipe_id):
                                 # FIXED: Ensure manual flag is set to False for user locks
                                 lock_info_to_set = {
                                     "recipe_id": current_recipe_id,
@@ -1288,14 +2818,46 @@ def dashboard():
                     # If lock_info_to_set is None and there was a previous lock, remove it
                     del session["locked_meals"][slot_id]
 
-        # Update session with new locked meals
-        session["locked_meals"] = new_locked_meals
-        app.logger.info(f"Updated session locked_meals: {new_locked_meals}")
+        # Every slot on the dashboard gets its submitted state (None unlocks)
+        for day in plan_days:
+            for meal_type in meal_types:
+                slot_id = date_slot_id(day, meal_type)
+                lock_changes.set(slot_id, new_locked_meals.get(slot_id))
+
+        # Locks outside the displayed window are kept as stored
+        stored_locks = get_persistent_locks()
+        session["locked_meals"] = {
+            slot_id: lock_info
+            for slot_id, lock_info in stored_locks.items()
+            if slot_id not in lock_changes.slots
+            and lock_info.get("lock_type") != "leftover"
+        }
+        session["locked_meals"].update(new_locked_meals)
+        app.logger.info(f"Updated session locked_meals: {session['locked_meals']}")
+
+        # Re-plan with a fresh seed: locked slots keep their meal and only
+        # the rest (and leftovers of re-rolled slots) is picked again;
+        # leftover locks are recorded in lock_changes
+        session["plan_seed"] = new_plan_seed()
+        plan_ids = generate_meal_plan(
+            session["num_people"],
+            session["locked_meals"],
+            dates=plan_days,
+            lock_changes=lock_changes,
+            seed=session["plan_seed"],
+            previous=plan_ids_before_update,
+        )
+        apply_manual_leftovers(
+            plan_ids,
+            session["locked_meals"],
+            session["num_people"],
+            days,
+            lock_changes=lock_changes,
+        )
 
         # Update persistent locks in database
         try:
-            for slot_id, lock_info in new_locked_meals.items():
-                update_persistent_lock(slot_id, lock_info)
+            lock_changes.apply()
         except Exception as e:
             app.logger.error(f"Error updating persistent locks: {e}")
 
@@ -1305,30 +2867,58 @@ def dashboard():
         # Log the final state of locked_meals for debugging
         app.logger.info(f"Final locked_meals state: {session.get('locked_meals')}")
 
-        # Regenerate the meal plan
-        plan_ids = generate_meal_plan(session["num_people"], session["locked_meals"])
-        apply_manual_leftovers(
-            plan_ids, session["locked_meals"], session["num_people"], days
-        )
         session["current_plan_ids"] = plan_ids
         session.modified = True
+        if account:
+            remember_plan(account.id, meal_plan_start_day, plan_ids)
 
         # Clear shopping list state as the plan has changed
         session.pop("shopping_list_state", None)
 
-        # Regenerate the shopping list
-        generate_shopping_list()
+        # Update the shopping list for the slots that changed
+        plan_diff = diff_plans(plan_ids_before_update, plan_ids)
+        app.logger.info(
+            f"Re-plan changed {len(plan_diff.changes)} slots, "
+            f"{len(plan_diff.changed_recipe_ids)} recipes"
+        )
+        account = current_user.accounts.first()
+        if account:
+            try:
+                sync_shopping_list_for_plan(account.id, plan_ids, plan_diff)
+                flash(
+                    "Shopping list generated successfully from your meal plan.",
+                    "success",
+                )
+            except Exception as e:
+                db.session.rollback()
+                flash(f"Error generating shopping list: {str(e)}", "error")
+                app.logger.error(f"Error generating shopping list: {str(e)}")
 
         return redirect(url_for("dashboard"))
 
     # --- GET Request Rendering ---
-    # Ensure a plan exists in the session
+    # A plan of other dates (an earlier week, another duration) is replaced
+    if not set(days) <= set(session.get("current_plan_ids") or {}):
+        session.pop("current_plan_ids", None)
+    # Ensure a plan exists in the session, preferring one generated overnight
+    if "current_plan_ids" not in session and account:
+        pregenerated = take_pregenerated_plan(account.id, days)
+        if pregenerated is not None:
+            session["current_plan_ids"] = pregenerated
     if "current_plan_ids" not in session:
-        # Generate plan with correct days and duration
+        # Generate plan with correct days and duration; the session's seed
+        # makes a reload give the same plan (served from plan_cache)
+        if "plan_seed" not in session:
+            session["plan_seed"] = new_plan_seed()
         session["current_plan_ids"] = generate_meal_plan(
-            num_people, session.get("locked_meals", {}), days=days
+            num_people,
+            session.get("locked_meals", {}),
+            dates=plan_days,
+            seed=session["plan_seed"],
         )
         session.modified = True
+        if account:
+            remember_plan(account.id, meal_plan_start_day, session["current_plan_ids"])
 
     plan_ids_from_session: PlanIdsDict = session["current_plan_ids"]
 
@@ -1341,14 +2931,13 @@ def dashboard():
         and mi.get("recipe_id")
         and mi["recipe_id"] != -1  # Check existence and valid ID
     }
-    recipes_in_plan_dict: Dict[int, Recipe] = (
-        {
-            r.id: r
-            for r in Recipe.query.filter(Recipe.id.in_(all_recipe_ids_in_plan)).all()
-        }
-        if all_recipe_ids_in_plan
-        else {}
-    )
+    recipes = get_recipe_prefetcher()
+    recipes.prefetch(all_recipe_ids_in_plan)
+    recipes_in_plan_dict: Dict[int, Recipe] = {
+        recipe_id: recipes.get(recipe_id)
+        for recipe_id in all_recipe_ids_in_plan
+        if recipes.exists(recipe_id)
+    }
 
     # Prepare the plan data structure for the template
     plan_for_template = {
@@ -1364,7 +2953,7 @@ def dashboard():
     for day in days:
         for meal_type in meal_types:
             meal_info_ids = plan_ids_from_session.get(day, {}).get(meal_type)
-            slot_id = f"{day}_{meal_type}"  # Used for referencing locks in template
+            slot_id = f"{day}_{meal_type}"  # date_slot_id, as the template builds it
 
             # Default display info for an empty slot
             display_info = {
@@ -1415,6 +3004,39 @@ def dashboard():
 
             plan_for_template[day][meal_type] = display_info
 
+    # Only the days on screen count towards the cost and nutrient totals
+    shown_plan_ids: PlanIdsDict = {
+        day: plan_ids_from_session[day] for day in days if day in plan_ids_from_session
+    }
+
+    # Projected cost of the plan, when ingredient prices are available
+    candidates = get_candidate_snapshot()
+    projected_cost = budget = None
+    if len(get_price_table()):
+        projected_cost = get_recipe_costs(candidates).plan_cost(shown_plan_ids)
+        budget = plan_budget(getattr(settings, "weekly_budget", None), len(days))
+
+    # Nutrients per person over the plan, when nutrient data was imported
+    nutrition = None
+    recipe_nutrients = get_recipe_nutrients(candidates)
+    if recipe_nutrients.has_data:
+        totals = recipe_nutrients.plan_totals(shown_plan_ids, num_people)
+        targets = dict(PlanSettings.from_settings(settings).nutrient_targets)
+        nutrition = {
+            "complete": totals.complete,
+            "nutrients": [
+                {
+                    "label": NUTRIENT_LABELS[nutrient][0],
+                    "unit": NUTRIENT_LABELS[nutrient][1],
+                    "amount": amount,
+                    "target": (
+                        targets[nutrient] * len(days) if nutrient in targets else None
+                    ),
+                }
+                for nutrient, amount in totals.as_dict().items()
+            ],
+        }
+
     # Fetch all recipes for the dropdown menu
     recipes_for_dropdown = Recipe.query.order_by(Recipe.name).all()
     # Get distinct aisles for the shopping list
@@ -1424,12 +3046,18 @@ def dashboard():
         "dashboard.html",
         plan=plan_for_template,
         num_people=num_people,
+        planning_mode=getattr(settings, "planning_mode", None) or PLANNING_MODE_RANDOM,
         locked_meals=active_locked_meals_state,  # Pass the raw lock state for form defaults
         days=days,
+        day_labels={day: day_label(day) for day in days},
         meal_types=meal_types,
         all_recipes=recipes_for_dropdown,  # For dropdowns
-        distinct_aisles=distinct_aisles,
-    )  # For shopping list add form
+        distinct_aisles=distinct_aisles,  # For shopping list add form
+        projected_cost=projected_cost,
+        budget=budget,
+        format_cost=format_cost,
+        nutrition=nutrition,
+    )
 
 
 @app.route("/add", methods=["GET", "POST"])
@@ -1506,18 +3134,6 @@ def add_recipe():
             # --- Process Ingredients ---
             ingredients_to_add = []
             has_valid_ingredient = False
-            # Pre-fetch known aisles for efficiency if there are many ingredients
-            all_ingredient_aisles = (
-                db.session.query(Ingredient.name, Ingredient.aisle)
-                .filter(Ingredient.aisle.isnot(None), Ingredient.aisle != "")
-                .distinct()
-                .all()
-            )
-            known_aisles_cache = {
-                ing_name.strip().lower(): aisle
-                for ing_name, aisle in all_ingredient_aisles
-                if aisle
-            }
 
             for (
                 line
@@ -1538,16 +3154,12 @@ def add_recipe():
                 ing_qty = parts[1] if len(parts) > 1 and parts[1] else None
                 ing_unit = parts[2] if len(parts) > 2 and parts[2] else None
 
-                # Attempt to find existing aisle for this ingredient name (case-insensitive)
-                ing_name_lower = ing_name.lower()
-                aisle = known_aisles_cache.get(ing_name_lower)  # Use cache
-
+                # The aisle comes from the ingredient catalog entry for the name
                 ingredients_to_add.append(
                     Ingredient(
                         name=ing_name,
                         quantity=ing_qty,
                         unit=ing_unit,
-                        aisle=aisle,
                         recipe_id=new_recipe.id,  # Link to the flushed recipe ID
                     )
                 )
@@ -1567,6 +3179,7 @@ def add_recipe():
             # Commit the recipe and its ingredients together
             db.session.commit()
             flash(f"Recipe '{new_recipe.name}' added successfully.", "success")
+            flash_unparsed_quantities(ingredients_to_add)
             return redirect(url_for("dashboard"))
 
         except Exception as e:
@@ -1703,6 +3316,12 @@ def edit_recipe(recipe_id: int):
             submitted_ingredient_ids: Set[int] = set()
             ingredients_to_add: List[Ingredient] = []
             ingredients_to_update: Dict[int, Dict[str, Any]] = {}  # {ing_id: {data}}
+            # Aisles belong to the catalog; the form shows each row's catalog aisle
+            shown_aisles = {
+                ing.id: (normalize_ingredient_name(ing.name), catalog_aisle(ing))
+                for ing in recipe.ingredients
+            }
+            new_aisles: Dict[str, Optional[str]] = {}
 
             # Iterate through submitted ingredient data
             max_len = max(
@@ -1753,9 +3372,14 @@ def edit_recipe(recipe_id: int):
                     "name": name_val,
                     "quantity": qty_val,
                     "unit": unit_val,
-                    "aisle": aisle_val,
                     "recipe_id": recipe.id,  # Link to parent recipe
                 }
+                shown_name, shown_aisle = shown_aisles.get(current_id, (None, None))
+                if aisle_val:
+                    new_aisles[name_val] = aisle_val
+                elif shown_aisle and shown_name == normalize_ingredient_name(name_val):
+                    # Clearing the aisle of an unrenamed row clears the catalog's
+                    new_aisles[name_val] = None
 
                 # Check if it's an existing ingredient being updated
                 if current_id and current_id in existing_ingredient_ids:
@@ -1770,14 +3394,15 @@ def edit_recipe(recipe_id: int):
             # --- Process Deletions ---
             ids_to_delete = existing_ingredient_ids - submitted_ingredient_ids
             if ids_to_delete:
-                # Delete ingredients that were present before but not submitted now
-                # Using synchronize_session='fetch' might be okay for smaller deletes
-                # For large deletes, 'fetch' can be slow; 'evaluate' might be faster but requires caution.
-                Ingredient.query.filter(Ingredient.id.in_(ids_to_delete)).delete(
-                    synchronize_session="fetch"
-                )
+                # Delete ingredients that were present before but not submitted
+                # now, through the session so bump_recipe_catalog_on_write sees
+                # them (a bulk query delete never reaches session.deleted)
+                for ing in recipe.ingredients:
+                    if ing.id in ids_to_delete:
+                        db.session.delete(ing)
 
             # --- Process Updates ---
+            updated_ingredients = []
             for ing_id, data in ingredients_to_update.items():
                 # Fetch the specific ingredient to update
                 ing = db.session.get(Ingredient, ing_id)
@@ -1785,7 +3410,7 @@ def edit_recipe(recipe_id: int):
                     ing.name = data["name"]
                     ing.quantity = data["quantity"]
                     ing.unit = data["unit"]
-                    ing.aisle = data["aisle"]
+                    updated_ingredients.append(ing)
                 else:
                     app.logger.warning(
                         f"Ingredient ID {ing_id} marked for update but not found in session/DB."
@@ -1794,10 +3419,16 @@ def edit_recipe(recipe_id: int):
             # --- Process Additions ---
             if ingredients_to_add:
                 db.session.add_all(ingredients_to_add)
+            new_versions = set_catalog_aisles(new_aisles)
 
             # --- Commit Changes ---
             db.session.commit()
+            for affected_account_id, version in new_versions.items():
+                emit_shopping_list_delta(
+                    affected_account_id, "list_regenerated", version=version
+                )
             flash(f"Recipe '{recipe.name}' updated successfully.", "success")
+            flash_unparsed_quantities(updated_ingredients + ingredients_to_add)
             # Clear potentially stale shopping list
             session.pop("shopping_list_state", None)
             return redirect(url_for("dashboard"))
@@ -1825,7 +3456,7 @@ def edit_recipe(recipe_id: int):
                 "name": ing.name,
                 "quantity": ing.quantity or "",
                 "unit": ing.unit or "",
-                "aisle": ing.aisle,
+                "aisle": catalog_aisle(ing),
             }
             for ing in recipe.ingredients
         ]
@@ -1944,8 +3575,18 @@ def shopping_list():
         # Update the item
         item.is_checked = is_checked
         item.updated_at = datetime.utcnow()  # Force update of timestamp
+        version = record_shopping_list_changes(account.id, upserted_ids=[item.id])
         db.session.commit()
 
+        emit_shopping_list_delta(
+            account.id,
+            "item_checked",
+            version=version,
+            item_id=item.id,
+            is_checked=item.is_checked,
+            updated_at=item.updated_at.isoformat(),
+        )
+
         return jsonify({"success": True})
 
     # GET request - display shopping list
@@ -1954,6 +3595,17 @@ def shopping_list():
         flash("No account found. Please create an account first.", "error")
         return redirect(url_for("dashboard"))
 
+    # Conditional GET: the page only changes with the list version. The tag
+    # also carries the user (nav bar) and a half-life bucket of the embedded
+    # CSRF token so a revalidated page never serves an expired token.
+    version = get_shopping_list_version(account.id)
+    csrf_half_life = (app.config.get("WTF_CSRF_TIME_LIMIT") or 3600) / 2
+    csrf_bucket = int(time.time() // csrf_half_life)
+    etag = shopping_list_etag(account.id, version, current_user.id, csrf_bucket)
+    not_modified = shopping_list_not_modified(etag, version)
+    if not_modified is not None:
+        return not_modified
+
     # Get all shopping list items for the account
     items = (
         ShoppingListItem.query.filter_by(account_id=account.id)
@@ -1974,9 +3626,15 @@ def shopping_list():
     # Get list of unique aisles for the dropdown
     aisles = sorted(set(item.aisle for item in items if item.aisle))
 
-    return render_template(
-        "shopping_list.html", items_by_aisle=items_by_aisle, aisles=aisles
+    response = make_response(
+        render_template(
+            "shopping_list.html",
+            items_by_aisle=items_by_aisle,
+            aisles=aisles,
+            shopping_list_version=version,
+        )
     )
+    return with_shopping_list_cache_headers(response, etag, version)
 
 
 @app.route("/add-shopping-item", methods=["POST"])
@@ -2006,8 +3664,14 @@ def add_shopping_item():
     )
 
     db.session.add(item)
+    db.session.flush()  # Assign item.id for the change log
+    version = record_shopping_list_changes(account.id, upserted_ids=[item.id])
     db.session.commit()
 
+    emit_shopping_list_delta(
+        account.id, "item_added", version=version, item=item.to_dict()
+    )
+
     flash("Item added to shopping list.", "success")
     return redirect(url_for("shopping_list"))
 
@@ -2031,9 +3695,15 @@ def delete_shopping_item():
     if not item or item.account_id != account.id:
         return jsonify({"success": False, "error": "Item not found"}), 404
 
+    deleted_id = item.id
     db.session.delete(item)
+    version = record_shopping_list_changes(account.id, deleted_ids=[deleted_id])
     db.session.commit()
 
+    emit_shopping_list_delta(
+        account.id, "item_deleted", version=version, item_id=deleted_id
+    )
+
     return jsonify({"success": True})
 
 
@@ -2163,29 +3833,17 @@ def manage_aisles():
                 flash("No changes were made to aisle assignments.", "info")
                 return redirect(url_for("manage_aisles"))
 
-            # Perform bulk updates
-            for update in updates:
-                # Update Ingredients table
-                Ingredient.query.filter(Ingredient.name.ilike(update["name"])).update(
-                    {"aisle": update["new_aisle"], "updated_at": datetime.utcnow()},
-                    synchronize_session=False,
-                )
-
-                # Update PantryItems table
-                PantryItem.query.filter(PantryItem.name.ilike(update["name"])).update(
-                    {"aisle": update["new_aisle"]}, synchronize_session=False
-                )
-
-                # Update ShoppingListItem table
-                ShoppingListItem.query.filter(
-                    func.lower(ShoppingListItem.name) == func.lower(update["name"])
-                ).update(
-                    {"aisle": update["new_aisle"], "updated_at": datetime.utcnow()},
-                    synchronize_session=False,
-                )
+            # One catalog row per changed ingredient name
+            new_versions = set_catalog_aisles(
+                {update["name"]: update["new_aisle"] for update in updates}
+            )
 
             # Commit the transaction
             db.session.commit()
+            for affected_account_id, version in new_versions.items():
+                emit_shopping_list_delta(
+                    affected_account_id, "list_regenerated", version=version
+                )
 
             # Flash success message with count
             flash(
@@ -2200,16 +3858,15 @@ def manage_aisles():
 
     # GET request - display the form
     try:
-        # Get distinct ingredients with their latest aisle
-        ingredients = (
-            db.session.query(Ingredient.name, func.max(Ingredient.aisle).label("aisle"))
-            .group_by(Ingredient.name)
-            .order_by(Ingredient.name)
-            .all()
-        )
+        # Every known ingredient name with its aisle
+        ingredients = IngredientCatalog.query.order_by(
+            IngredientCatalog.normalized_name
+        ).all()
 
         # Convert to list of dicts for template
-        ingredients = [{"name": i.name, "aisle": i.aisle} for i in ingredients]
+        ingredients = [
+            {"name": i.normalized_name, "aisle": i.aisle} for i in ingredients
+        ]
 
         return render_template(
             "manage_aisles.html",
@@ -2235,6 +3892,12 @@ def cupboard():
         # Get aisle, treat empty or 'None' as None
         add_aisle_raw = request.form.get("add_aisle", "").strip()
         add_aisle = add_aisle_raw if add_aisle_raw and add_aisle_raw != "None" else None
+        add_expires = None
+        if request.form.get("add_expires"):
+            try:
+                add_expires = date.fromisoformat(request.form["add_expires"].strip())
+            except ValueError:
+                flash("Couldn't read the expiry date; it was not saved.", "warning")
 
         if delete_id_str:
             # --- Handle Deletion ---
@@ -2248,11 +3911,12 @@ def cupboard():
             # If aisle is not provided, try to inherit from Ingredient table
             if not add_aisle:
                 existing_ing = (
-                    db.session.query(Ingredient.aisle)
+                    db.session.query(IngredientCatalog.aisle)
                     .filter(
-                        func.lower(Ingredient.name) == add_name.lower(),
-                        Ingredient.aisle.isnot(None),
-                        Ingredient.aisle != "",
+                        IngredientCatalog.normalized_name
+                        == normalize_ingredient_name(add_name),
+                        IngredientCatalog.aisle.isnot(None),
+                        IngredientCatalog.aisle != "",
                     )
                     .first()
                 )
@@ -2264,7 +3928,7 @@ def cupboard():
                     )
 
             # Use helper function to add or update the pantry item
-            update_pantry(add_name, add_qty, add_unit, add_aisle)
+            update_pantry(add_name, add_qty, add_unit, add_aisle, add_expires)
             # Clear shopping list state as pantry changes affect it
             session.pop("shopping_list_state", None)
         # Allow updating existing items via the add form (update_pantry handles this)
@@ -2279,9 +3943,11 @@ def cupboard():
 
     # --- GET Request ---
     # Fetch all pantry items, ordered for predictable display (Aisle, then Name)
-    pantry_items_list = PantryItem.query.order_by(
-        PantryItem.aisle.asc().nullslast(), func.lower(PantryItem.name)
-    ).all()
+    pantry_items_list = (
+        PantryItem.query.options(joinedload(PantryItem.catalog))
+        .order_by(func.lower(PantryItem.name))
+        .all()
+    )
 
     # Group items by aisle for template rendering
     pantry_by_aisle: Dict[str, List[PantryItem]] = defaultdict(list)
@@ -2303,7 +3969,7 @@ def cupboard():
 
     for item in pantry_items_list:
         # Group by aisle, treating None aisle as "Unknown"
-        aisle_key = item.aisle or "Unknown"
+        aisle_key = catalog_aisle(item) or "Unknown"
         pantry_by_aisle[aisle_key].append(item)
 
     # Sort the aisles based on the preferred order, then alphabetically
@@ -2321,10 +3987,19 @@ def cupboard():
         aisle: pantry_by_aisle[aisle] for aisle in sorted_aisle_keys
     }
 
+    # Stock that has expired or expires within USE_SOON_DAYS, soonest first
+    today = date.today()
+    use_soon = [
+        (batch, days_left(batch, today))
+        for batch in get_expiry_queue().due(today + timedelta(days=USE_SOON_DAYS))
+    ]
+
     return render_template(
         "cupboard.html",
         pantry_items=sorted_pantry,
         distinct_aisles=distinct_aisles_options,
+        use_soon=use_soon,
+        use_soon_ids={batch.item_id for batch, _ in use_soon},
     )
 
 
@@ -2448,6 +4123,133 @@ def debug_users():
     return jsonify(output)
 
 
+# Longest plan the export streams, in days
+MAX_EXPORT_DAYS = 366
+
+
+def streamed_plan_settings_unsupported(plan_settings: PlanSettings) -> List[str]:
+    """
+    The account's plan settings that need the whole plan at once and so
+    cannot be applied to a plan streamed a day at a time.
+    """
+    unsupported = []
+    if plan_settings.planning_mode in (PLANNING_MODE_OVERLAP, PLANNING_MODE_VARIETY):
+        unsupported.append(f"{plan_settings.planning_mode} planning mode")
+    if plan_settings.weekly_budget:
+        unsupported.append("weekly budget")
+    if plan_settings.nutrient_targets:
+        unsupported.append("nutrient targets")
+    return unsupported
+
+
+@app.route("/meal-plan/export.csv")
+@login_required
+def export_meal_plan():
+    """
+    Streams a dated plan as CSV, planned a day at a time by
+    planner.iter_plan_days so long plans are never held in memory. Query
+    args: start (YYYY-MM-DD, default today), days (default the account's
+    meal_plan_duration) and seed for a reproducible plan.
+
+    The account's locks (keyed by date) and default meals are applied, and
+    the pantry and expiring modes rank recipes as the dashboard does.
+    Settings that need the whole plan at once (overlap and variety modes,
+    weekly budget, nutrient targets) cannot be streamed: the export is
+    refused with a 400 naming them, unless ignore_unsupported=1 is given,
+    in which case they are listed in the X-Plan-Settings-Ignored header.
+    """
+    account = current_user.accounts.first()
+    settings = getattr(account, "settings", None)
+    try:
+        start = date.fromisoformat(request.args.get("start") or date.today().isoformat())
+        num_days = int(
+            request.args.get("days") or getattr(settings, "meal_plan_duration", 7) or 7
+        )
+        seed = int(request.args["seed"]) if request.args.get("seed") else None
+    except ValueError:
+        return jsonify({"error": "Invalid start, days or seed"}), 400
+    if not 1 <= num_days <= MAX_EXPORT_DAYS:
+        return jsonify({"error": f"days must be between 1 and {MAX_EXPORT_DAYS}"}), 400
+
+    candidates = get_candidate_snapshot()
+    plan_settings = PlanSettings.from_settings(settings)
+    unsupported = streamed_plan_settings_unsupported(plan_settings)
+    if unsupported and request.args.get("ignore_unsupported") != "1":
+        return (
+            jsonify(
+                {
+                    "error": "The export cannot apply: " + ", ".join(unsupported),
+                    "unsupported": unsupported,
+                }
+            ),
+            400,
+        )
+    scores = scores_from = None
+    if plan_settings.planning_mode == PLANNING_MODE_PANTRY:
+        scores = get_ingredient_index(candidates).pantry_coverage(get_pantry_stock_keys())
+    elif plan_settings.planning_mode == PLANNING_MODE_EXPIRING:
+        expiring = get_expiring_stock(candidates, start=start)
+        scores = expiry_scores(expiring, num_days)
+        scores_from = expiring.today
+    # Leftover locks belong to the dashboard plan's own picks
+    locked_meals = {
+        slot_id: lock_info
+        for slot_id, lock_info in get_persistent_locks().items()
+        if lock_info.get("lock_type") != "leftover"
+    }
+    recipe_names = dict(db.session.execute(select(Recipe.id, Recipe.name)).all())
+    plan_days = iter_plan_days(
+        candidates,
+        plan_settings,
+        getattr(settings, "num_people", None) or 2,
+        start,
+        num_days,
+        locked_meals=locked_meals,
+        rng=random.Random(seed),
+        scores=scores,
+        scores_from=scores_from,
+    )
+
+    def rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["date", "meal_type", "recipe", "status", "note"])
+        for plan_day in plan_days:
+            for meal_type, slot in plan_day.meals.items():
+                writer.writerow(
+                    [
+                        plan_day.date.isoformat(),
+                        meal_type,
+                        recipe_names.get(slot["recipe_id"], ""),
+                        slot["status"],
+                        slot.get("manual_text") or "",
+                    ]
+                )
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    return Response(
+        stream_with_context(rows()),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": f"attachment; filename=meal-plan-{start}.csv",
+            **(
+                {"X-Plan-Settings-Ignored": ", ".join(unsupported)}
+                if unsupported
+                else {}
+            ),
+        },
+    )
+
+
+@app.route("/debug/plan-cache")
+@login_required
+def debug_plan_cache():
+    """Hit rate and size of this process's plan cache."""
+    return jsonify(plan_cache.stats())
+
+
 @app.route("/debug/db")
 def debug_db():
 
@@ -2857,10 +4659,33 @@ def settings():
             settings.meal_plan_start_day = request.form.get(
                 "meal_plan_start_day", "Monday"
             )
-            settings.meal_plan_duration = int(request.form.get("meal_plan_duration", 7))
+            meal_plan_duration = int(request.form.get("meal_plan_duration", 7))
+            if not 1 <= meal_plan_duration <= MAX_PLAN_DURATION:
+                meal_plan_duration = min(max(meal_plan_duration, 1), MAX_PLAN_DURATION)
+                flash(
+                    f"Meal plans cover 1 to {MAX_PLAN_DURATION} days, so the duration "
+                    f"was set to {meal_plan_duration}.",
+                    "warning",
+                )
+            settings.meal_plan_duration = meal_plan_duration
             settings.meal_repeat_interval = int(
                 request.form.get("meal_repeat_interval", 0)
             )
+            planning_mode = request.form.get("planning_mode", PLANNING_MODE_RANDOM)
+            if planning_mode not in PLANNING_MODES:
+                planning_mode = PLANNING_MODE_RANDOM
+            settings.planning_mode = planning_mode
+            weekly_budget = request.form.get("weekly_budget", "").strip()
+            weekly_budget = float(weekly_budget) if weekly_budget else 0
+            settings.weekly_budget = weekly_budget if weekly_budget > 0 else None
+            nutrient_targets = {}
+            for nutrient in NUTRIENTS:
+                amount = request.form.get(f"target_{nutrient}", "").strip()
+                if amount and float(amount) > 0:
+                    nutrient_targets[nutrient] = float(amount)
+            settings.nutrient_targets = (
+                json.dumps(nutrient_targets) if nutrient_targets else None
+            )
 
             # Update default meals
             settings.default_breakfast_id = (
@@ -2885,6 +4710,9 @@ def settings():
     return render_template(
         "settings.html",
         settings=settings,
+        nutrient_targets=dict(PlanSettings.from_settings(settings).nutrient_targets),
+        nutrient_labels=NUTRIENT_LABELS,
+        max_plan_duration=MAX_PLAN_DURATION,
         breakfast_recipes=breakfast_recipes,
         lunch_recipes=lunch_recipes,
         dinner_recipes=dinner_recipes,
@@ -3112,26 +4940,8 @@ def generate_meal_plan_post():
 
         # Regenerate shopping list based on new meal plan
         try:
-            # Get the shopping list data
-            shopping_list_data = generate_shopping_list_data(plan_ids)
-
-            # Clear existing shopping list items
-            ShoppingListItem.query.filter_by(account_id=account.id).delete()
-
-            # Add new items to the shopping list
-            for aisle, items in shopping_list_data.items():
-                for item in items:
-                    shopping_item = ShoppingListItem(
-                        account_id=account.id,
-                        name=item["name"],
-                        quantity=item.get("quantity", 1),
-                        unit=item.get("unit", ""),
-                        aisle=aisle,
-                        is_checked=False,
-                    )
-                    db.session.add(shopping_item)
-
-            db.session.commit()
+            # Get the shopping list data and apply only the differences
+            sync_shopping_list_for_plan(account_id, plan_ids)
             app.logger.debug(f"[DEBUG-gmpost] Successfully regenerated shopping list")
             flash("Meal plan and shopping list generated successfully!", "success")
         except Exception as e:
@@ -3211,29 +5021,9 @@ def generate_shopping_list():
         app.logger.debug("[DEBUG-gsl] No plan_ids found in session, aborting.")
         return redirect(url_for("dashboard"))
 
-    # Generate shopping list data
-    shopping_list_data = generate_shopping_list_data(plan_ids)
-    app.logger.debug(f"[DEBUG-gsl] shopping_list_data: {shopping_list_data}")
-
-    # Clear existing shopping list items for this account
-    ShoppingListItem.query.filter_by(account_id=account.id).delete()
-
-    # Add new items to the shopping list
-    for aisle, items in shopping_list_data.items():
-        for item in items:
-            shopping_item = ShoppingListItem(
-                account_id=account.id,
-                name=item["name"],
-                quantity=item["quantity"],
-                unit=item["unit"],
-                aisle=aisle,
-                is_checked=False,  # Reset checked status
-                updated_at=datetime.utcnow(),
-            )
-            db.session.add(shopping_item)
-
+    # Apply only the differences to the stored list (keeps checked state)
     try:
-        db.session.commit()
+        sync_shopping_list_for_plan(account.id, plan_ids)
         flash("Shopping list generated successfully from your meal plan.", "success")
     except Exception as e:
         db.session.rollback()
@@ -3246,31 +5036,33 @@ def generate_shopping_list():
 @app.route("/check-shopping-list-updates")
 @login_required
 def check_shopping_list_updates():
-
+    """Compares the client's list version (?version=N) with the stored one."""
     account = current_user.accounts.first()
     if not account:
         return jsonify({"needs_update": False})
 
-    # Get the last update timestamp from the session
-    last_update = session.get("shopping_list_last_update", 0)
-    current_time = time.time()
+    version = get_shopping_list_version(account.id)
+    client_version = request.args.get("version", type=int)
+    return jsonify({"needs_update": client_version != version, "version": version})
 
-    # Check if any items have been modified since the last update
-    latest_item = (
-        ShoppingListItem.query.filter_by(account_id=account.id)
-        .order_by(ShoppingListItem.updated_at.desc())
-        .first()
-    )
 
-    if (
-        latest_item
-        and latest_item.updated_at
-        and latest_item.updated_at.timestamp() > last_update
-    ):
-        session["shopping_list_last_update"] = current_time
-        return jsonify({"needs_update": True})
+@app.route("/shopping-list/changes")
+@login_required
+def shopping_list_changes():
+    """
+    Returns only the shopping list rows added, changed or deleted after the
+    client-supplied version (?since=N) so reconnecting clients can catch up
+    without re-downloading the rendered list.
+    """
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify({"success": False, "error": "Missing 'since' version"}), 400
+
+    account = current_user.accounts.first()
+    if not account:
+        return jsonify({"success": False, "error": "No account found"}), 404
 
-    return jsonify({"needs_update": False})
+    return jsonify(get_shopping_list_changes(account.id, since))
 
 
 @app.route("/get-shopping-list-content")
@@ -3281,19 +5073,33 @@ def get_shopping_list_content():
     if not account:
         return render_template("shopping_list_empty.html")
 
+    version = get_shopping_list_version(account.id)
+    etag = shopping_list_etag(account.id, version)
+    not_modified = shopping_list_not_modified(etag, version)
+    if not_modified is not None:
+        return not_modified
+
     items = (
         ShoppingListItem.query.filter_by(account_id=account.id)
         .order_by(ShoppingListItem.aisle, ShoppingListItem.name)
         .all()
     )
+    if not items:
+        response = make_response(render_template("shopping_list_empty.html"))
+        return with_shopping_list_cache_headers(response, etag, version)
+
     items_by_aisle = {}
 
     for item in items:
-        if item.aisle not in items_by_aisle:
-            items_by_aisle[item.aisle] = []
-        items_by_aisle[item.aisle].append(item)
+        aisle = item.aisle or "Other"
+        if aisle not in items_by_aisle:
+            items_by_aisle[aisle] = []
+        items_by_aisle[aisle].append(item)
 
-    return render_template("shopping_list_content.html", items_by_aisle=items_by_aisle)
+    response = make_response(
+        render_template("shopping_list_content.html", items_by_aisle=items_by_aisle)
+    )
+    return with_shopping_list_cache_headers(response, etag, version)
 
 
 @app.route("/regenerate-shopping-list", methods=["POST"])
@@ -3312,27 +5118,9 @@ def regenerate_shopping_list():
         flash("No meal plan found. Please generate a meal plan first.", "error")
         return redirect(url_for("shopping_list"))
 
-    # Generate shopping list data
-    shopping_list_data = generate_shopping_list_data(plan_ids)
-
-    # Clear existing shopping list items for this account
-    ShoppingListItem.query.filter_by(account_id=account.id).delete()
-
-    # Add new items to the shopping list
-    for aisle, items in shopping_list_data.items():
-        for item in items:
-            shopping_item = ShoppingListItem(
-                account_id=account.id,
-                name=item["name"],
-                quantity=item["quantity"],
-                unit=item["unit"],
-                aisle=aisle,
-                is_checked=False,
-            )
-            db.session.add(shopping_item)
-
+    # Apply only the differences to the stored list (keeps checked state)
     try:
-        db.session.commit()
+        sync_shopping_list_for_plan(account.id, plan_ids)
         flash(
             "Shopping list regenerated successfully with updated aisle assignments.",
             "success",
@@ -3376,6 +5164,184 @@ def on_leave_shopping_list():
         app.logger.debug(f"[WEBSOCKET] Client {request.sid} left room {room}")
 
 
+@app.cli.command("plan-accounts")
+@click.option("--workers", type=int, help="Worker processes (default: CPU count).")
+@click.option("--chunk-size", default=DEFAULT_CHUNK_SIZE, help="Accounts per task.")
+@click.option("--seed", type=int, help="Base seed for reproducible plans.")
+def plan_accounts_command(
+    workers: Optional[int], chunk_size: int, seed: Optional[int]
+) -> None:
+    """
+    Pre-generate every account's plan for its next plan week, with the
+    weeks up to and including the current one as history.
+    """
+    started = time.perf_counter()
+    candidates = get_candidate_snapshot()
+    locked_meals = {
+        slot_id: lock_info
+        for slot_id, lock_info in get_persistent_locks().items()
+        if lock_info.get("lock_type") != "leftover"
+    }
+    settings_table = AccountSettings.__table__
+    rows = db.session.execute(
+        select(
+            Account.id.label("account_id"),
+            settings_table.c.num_people,
+            settings_table.c.meal_plan_start_day,
+            settings_table.c.meal_plan_duration,
+            settings_table.c.meal_repeat_interval,
+            settings_table.c.planning_mode,
+            settings_table.c.weekly_budget,
+            settings_table.c.nutrient_targets,
+            settings_table.c.default_breakfast_id,
+            settings_table.c.default_lunch_id,
+            settings_table.c.default_dinner_id,
+        )
+        .select_from(Account)
+        .outerjoin(settings_table, settings_table.c.account_id == Account.id)
+        .order_by(Account.id)
+    ).all()
+    # Earlier weeks of every account in one query (remember_plan prunes it)
+    weeks: Dict[int, Dict[date, PlanIdsDict]] = defaultdict(dict)
+    for history_row in db.session.execute(
+        select(PlanHistory.account_id, PlanHistory.week_start, PlanHistory.plan)
+    ):
+        weeks[history_row.account_id][history_row.week_start] = json.loads(
+            history_row.plan
+        )
+    today = date.today()
+    seeds = random.Random(seed)
+    jobs = []
+    for row in rows:
+        plan_settings = PlanSettings.from_settings(row)
+        week_start = next_plan_week_start(row.meal_plan_start_day, today)
+        jobs.append(
+            AccountPlanJob(
+                row.account_id,
+                plan_settings,
+                row.num_people if (row.num_people or 0) >= 1 else 2,
+                tuple(
+                    day.isoformat()
+                    for day in plan_period_days(
+                        row.meal_plan_start_day, row.meal_plan_duration, week_start
+                    )
+                ),
+                seeds.getrandbits(32),
+                history=plan_history_days(
+                    weeks.get(row.account_id, {}),
+                    week_start,
+                    min(plan_settings.meal_repeat_interval, PLAN_HISTORY_DAYS),
+                ),
+            )
+        )
+    modes = {job.settings.planning_mode for job in jobs}
+    shared = SharedInputs(
+        candidates,
+        locked_meals,
+        matrix=(
+            get_ingredient_matrix(candidates)
+            if modes & {PLANNING_MODE_OVERLAP, PLANNING_MODE_VARIETY}
+            else None
+        ),
+        pantry_scores=(
+            get_ingredient_index(candidates).pantry_coverage(get_pantry_stock_keys())
+            if PLANNING_MODE_PANTRY in modes
+            else None
+        ),
+        costs=(
+            get_recipe_costs(candidates)
+            if any(job.settings.weekly_budget for job in jobs)
+            else None
+        ),
+        nutrients=(
+            get_recipe_nutrients(candidates)
+            if any(job.settings.nutrient_targets for job in jobs)
+            else None
+        ),
+        expiring=(
+            get_expiring_stock(candidates)
+            if PLANNING_MODE_EXPIRING in modes
+            else None
+        ),
+    )
+    loaded = time.perf_counter()
+
+    table = PregeneratedPlan.__table__
+    planned = 0
+    for plans in plan_accounts(jobs, shared, workers=workers, chunk_size=chunk_size):
+        # One DELETE and one executemany INSERT per chunk
+        db.session.execute(
+            table.delete().where(table.c.account_id.in_([p.account_id for p in plans]))
+        )
+        now = datetime.utcnow()
+        db.session.execute(
+            table.insert(),
+            [
+                {
+                    "account_id": p.account_id,
+                    "days": plan_span(p.days),
+                    "seed": p.seed,
+                    "plan": json.dumps(p.plan_ids),
+                    "locks": json.dumps(p.lock_changes),
+                    "created_at": now,
+                }
+                for p in plans
+            ],
+        )
+        db.session.commit()
+        planned += len(plans)
+
+    elapsed = time.perf_counter() - started
+    planning = time.perf_counter() - loaded
+    click.echo(
+        f"Planned {planned} accounts in {elapsed:.2f}s "
+        f"(inputs {loaded - started:.2f}s, planning and writes {planning:.2f}s, "
+        f"{planned / planning if planning else 0:.0f} accounts/s, "
+        f"{workers or os.cpu_count()} workers)"
+    )
+
+
+@app.cli.command("import-nutrients")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_nutrients_command(path: str) -> None:
+    """
+    Import a nutrient dataset CSV (see nutrition.read_nutrient_csv). Each
+    ingredient's nutrient rows are replaced by the file's, keyed by its
+    catalog entry, which is created for names not seen before.
+    """
+    rows, skipped = read_nutrient_csv(path)
+    catalog_ids = get_catalog_ids(row.name for row in rows)
+    for name in {row.name for row in rows} - set(catalog_ids):
+        db.session.add(IngredientCatalog(normalized_name=name))
+    db.session.flush()
+    catalog_ids = get_catalog_ids(row.name for row in rows)
+
+    table = IngredientNutrients.__table__
+    values = {(catalog_ids[row.name], row.base_unit): row.values for row in rows}
+    db.session.execute(
+        table.delete().where(table.c.catalog_id.in_({key[0] for key in values}))
+    )
+    if values:
+        db.session.execute(
+            table.insert(),
+            [
+                {
+                    "catalog_id": catalog_id,
+                    "base_unit": base_unit,
+                    **dict(zip(NUTRIENTS, nutrients)),
+                }
+                for (catalog_id, base_unit), nutrients in values.items()
+            ],
+        )
+    # Recipe nutrient vectors are cached per catalog version
+    bump_recipe_catalog_version(db.session)
+    db.session.commit()
+    click.echo(
+        f"Imported nutrients for {len({key[0] for key in values})} ingredients"
+        + (f" (skipped lines {', '.join(map(str, skipped))})" if skipped else "")
+    )
+
+
 # --- Main Execution ---
 if __name__ == "__main__":
     # Create database tables if they don't exist.
@@ -0,0 +1,209 @@
+# meal_planner/batch_planner.py
+"""
+Planning for many accounts at once, outside any request.
+
+The `flask plan-accounts` command loads every account's planning inputs
+and the shared recipe snapshot once, then hands accounts to worker
+processes in chunks. Workers receive the shared inputs a single time (as
+pool initializer arguments) and only see plain job tuples afterwards, so
+throughput grows with the number of cores. Nothing here touches Flask or
+the database; the command writes the returned plans back in bulk.
+"""
+
+import datetime
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from budget import RecipeCosts, fit_budget, plan_budget
+from expiry import ExpiringStock, expiry_scores, use_expiring_first
+from nutrition import RecipeNutrients, meet_nutrient_targets
+from overlap import IngredientMatrix, minimize_shopping_list
+from planner import (
+    PLANNING_MODE_EXPIRING,
+    PLANNING_MODE_OVERLAP,
+    PLANNING_MODE_PANTRY,
+    PLANNING_MODE_VARIETY,
+    CandidateSnapshot,
+    LockInfo,
+    LockedMealsDict,
+    PlanIdsDict,
+    PlanSettings,
+    plan_dated_meals,
+)
+from variety import best_of_plans
+
+# Accounts handed to a worker at a time
+DEFAULT_CHUNK_SIZE = 500
+
+
+class AccountPlanJob(NamedTuple):
+    account_id: int
+    settings: PlanSettings
+    num_people: int
+    days: Tuple[str, ...]  # consecutive ISO dates
+    seed: int
+    # Recipes served on the days before the plan (see planner.plan_meals)
+    history: Optional[List[Dict[str, Optional[int]]]] = None
+
+
+class AccountPlan(NamedTuple):
+    account_id: int
+    seed: int
+    days: Tuple[str, ...]
+    plan_ids: PlanIdsDict
+    lock_changes: Dict[str, LockInfo]
+    warnings: List[str]
+
+
+class SharedInputs(NamedTuple):
+    """Inputs every account is planned from, sent to each worker once."""
+
+    candidates: CandidateSnapshot
+    locked_meals: LockedMealsDict
+    # IngredientMatrix for the overlap and variety modes, if any account uses them
+    matrix: Optional[IngredientMatrix] = None
+    # Pantry coverage per recipe for the pantry mode
+    pantry_scores: Optional[Mapping[int, float]] = None
+    # Recipe costs, if any account has a weekly budget
+    costs: Optional[RecipeCosts] = None
+    # Recipe nutrient vectors, if any account has nutrient targets
+    nutrients: Optional[RecipeNutrients] = None
+    # Dated pantry stock, if any account uses the expiring mode
+    expiring: Optional[ExpiringStock] = None
+
+
+_shared: Optional[SharedInputs] = None
+
+
+def _init_worker(shared: SharedInputs) -> None:
+    global _shared
+    _shared = shared
+
+
+def plan_account(job: AccountPlanJob, shared: SharedInputs) -> AccountPlan:
+    """Plans one account the way generate_meal_plan does for a request."""
+    rng = random.Random(job.seed)
+    mode = job.settings.planning_mode
+    days = list(job.days)
+    start = datetime.date.fromisoformat(days[0])
+    scores = shared.pantry_scores if mode == PLANNING_MODE_PANTRY else None
+    expiring = (
+        shared.expiring._replace(start=start)
+        if mode == PLANNING_MODE_EXPIRING and shared.expiring is not None
+        else None
+    )
+    if expiring is not None:
+        scores = expiry_scores(expiring, len(days))
+    if mode == PLANNING_MODE_VARIETY and shared.matrix is not None:
+        result = best_of_plans(
+            shared.candidates,
+            job.settings,
+            shared.locked_meals,
+            job.num_people,
+            shared.matrix,
+            days=days,
+            history=job.history,
+            rng=rng,
+        )
+    else:
+        result = plan_dated_meals(
+            shared.candidates,
+            job.settings,
+            shared.locked_meals,
+            job.num_people,
+            start,
+            len(days),
+            rng=rng,
+            history=job.history,
+            scores=scores,
+            scores_from=expiring.today if expiring is not None else None,
+        )
+    if mode == PLANNING_MODE_OVERLAP and shared.matrix is not None:
+        result = minimize_shopping_list(
+            result,
+            shared.candidates,
+            shared.matrix,
+            job.settings,
+            job.num_people,
+            history=job.history,
+            rng=rng,
+        )
+    if expiring is not None:
+        result = use_expiring_first(
+            result,
+            shared.candidates,
+            expiring,
+            job.settings,
+            job.num_people,
+            history=job.history,
+        )
+    if job.settings.nutrient_targets and shared.nutrients is not None:
+        result = meet_nutrient_targets(
+            result,
+            shared.candidates,
+            shared.nutrients,
+            job.settings,
+            job.num_people,
+            history=job.history,
+            rng=rng,
+        )
+    budget = plan_budget(job.settings.weekly_budget, len(days))
+    if budget is not None and shared.costs is not None:
+        result = fit_budget(
+            result,
+            shared.candidates,
+            shared.costs,
+            job.settings,
+            job.num_people,
+            budget,
+            history=job.history,
+            rng=rng,
+        )
+    return AccountPlan(
+        job.account_id,
+        job.seed,
+        job.days,
+        result.plan_ids,
+        result.lock_changes,
+        result.warnings,
+    )
+
+
+def _plan_chunk(jobs: Sequence[AccountPlanJob]) -> List[AccountPlan]:
+    return [plan_account(job, _shared) for job in jobs]
+
+
+def plan_accounts(
+    jobs: Sequence[AccountPlanJob],
+    shared: SharedInputs,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[List[AccountPlan]]:
+    """
+    Plans every job and yields the results a chunk at a time, in job
+    order. workers defaults to the CPU count; with one worker everything
+    runs in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = [jobs[i : i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield [plan_account(job, shared) for job in chunk]
+        return
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(chunks)),
+        initializer=_init_worker,
+        initargs=(shared,),
+    ) as pool:
+        yield from pool.map(_plan_chunk, chunks)
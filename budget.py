@@ -0,0 +1,261 @@
+# meal_planner/budget.py
+"""
+Plan costs and the weekly budget.
+
+Ingredient prices come from a local CSV (one row per ingredient: name,
+price, and the quantity and unit that price buys). RecipeCosts turns the
+recipe catalog into a per-serving cost vector once per catalog version,
+so costing a plan is a few array lookups. fit_budget brings a plan's
+cost under a budget by swapping randomly chosen ("new") slots for
+cheaper recipes: greedily take the largest saving until the plan fits,
+then repair the variety those cheapest picks cost by trading each one
+back up to a random recipe that still keeps the plan within budget.
+"""
+
+import csv
+import logging
+import os
+import random
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from planner import (
+    CandidateSnapshot,
+    PlanIdsDict,
+    PlanResult,
+    PlanSettings,
+    Slot,
+    SlotSwaps,
+)
+from units import canonical_unit, parse_quantity, unit_base
+
+logger = logging.getLogger(__name__)
+
+CURRENCY_SYMBOL = "£"
+
+
+class PriceTable:
+    """
+    Price per base unit (g, ml or item) keyed by (normalized ingredient
+    name, base unit). key identifies the loaded file version.
+    """
+
+    def __init__(
+        self,
+        prices: Mapping[Tuple[str, str], float],
+        key: Optional[Tuple[str, float]] = None,
+    ) -> None:
+        self.prices = dict(prices)
+        self.key = key
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def unit_price(self, name: Optional[str], unit: Optional[str]) -> Optional[float]:
+        """Price of one base unit of the ingredient, None if not priced."""
+        base_unit = unit_base(canonical_unit(unit))[0]
+        return self.prices.get(((name or "").strip().lower(), base_unit))
+
+    def cost(
+        self, name: Optional[str], quantity: Optional[float], unit: Optional[str]
+    ) -> Optional[float]:
+        """
+        Cost of a quantity in a (canonical) unit; None if the ingredient
+        has no price in that unit's dimension. No quantity costs nothing.
+        """
+        price = self.unit_price(name, unit)
+        if price is None:
+            return None
+        return (quantity or 0) * unit_base(canonical_unit(unit))[1] * price
+
+
+def load_price_table(path: str) -> PriceTable:
+    """
+    Reads a price CSV with a name,price,quantity,unit header, e.g.
+    "rice,1.50,1,kg". quantity defaults to 1 and unit to a count. Rows
+    that do not parse are logged and skipped; a missing file gives an
+    empty table.
+    """
+    prices: Dict[Tuple[str, str], float] = {}
+    try:
+        mtime = os.path.getmtime(path)
+        with open(path, newline="", encoding="utf-8") as handle:
+            for line, row in enumerate(csv.DictReader(handle), start=2):
+                name = (row.get("name") or "").strip().lower()
+                price = parse_quantity(row.get("price"))
+                quantity = parse_quantity(row.get("quantity")) or 1.0
+                base_unit, factor = unit_base(canonical_unit(row.get("unit")))
+                if not name or price is None or price < 0:
+                    logger.warning(f"Skipping price row {line} in {path}: {row}")
+                    continue
+                prices[(name, base_unit)] = price / (quantity * factor)
+    except FileNotFoundError:
+        return PriceTable({}, None)
+    return PriceTable(prices, (path, mtime))
+
+
+class IngredientCostRow(NamedTuple):
+    recipe_id: int
+    servings: Optional[int]
+    name: str
+    quantity: Optional[float]
+    unit: str
+
+
+class RecipeCosts:
+    """
+    Per-serving cost of every recipe as a vector (row 0 stands in for
+    unknown recipes and costs nothing). A recipe with an ingredient the
+    price table does not know is costed without it and is not "priced",
+    so it is never picked to save money.
+    """
+
+    def __init__(
+        self,
+        ingredients: Iterable[IngredientCostRow],
+        prices: PriceTable,
+        key: Optional[Tuple] = None,
+    ) -> None:
+        self.key = key
+        self.rows: Dict[int, int] = {}
+        totals: List[float] = [0.0]
+        servings: List[int] = [1]
+        priced: List[bool] = [False]
+        for ingredient in ingredients:
+            row = self.rows.get(ingredient.recipe_id)
+            if row is None:
+                row = self.rows[ingredient.recipe_id] = len(totals)
+                totals.append(0.0)
+                servings.append(max(ingredient.servings or 1, 1))
+                priced.append(True)
+            cost = prices.cost(ingredient.name, ingredient.quantity, ingredient.unit)
+            if cost is None:
+                priced[row] = False
+            else:
+                totals[row] += cost
+        self.servings = np.array(servings, dtype=np.int64)
+        self.per_serving = np.array(totals) / self.servings
+        self.priced = np.array(priced, dtype=bool)
+
+    def row(self, recipe_id: int) -> int:
+        return self.rows.get(recipe_id, 0)
+
+    def recipe_cost(self, recipe_id: int) -> float:
+        """What cooking the recipe once costs (all its servings)."""
+        row = self.row(recipe_id)
+        return float(self.per_serving[row] * self.servings[row])
+
+    def is_priced(self, recipe_id: int) -> bool:
+        return bool(self.priced[self.row(recipe_id)])
+
+    def plan_cost(self, plan_ids: PlanIdsDict) -> "PlanCost":
+        """
+        Cost of the recipes a plan cooks. Every cooked slot buys its recipe
+        once; leftover and manual slots cost nothing.
+        """
+        rows = [
+            self.row(slot["recipe_id"])
+            for meals in plan_ids.values()
+            for slot in meals.values()
+            if slot
+            and (slot.get("recipe_id") or 0) > 0
+            and slot.get("status") != "leftover"
+        ]
+        if not rows:
+            return PlanCost(0.0, True)
+        rows = np.array(rows)
+        return PlanCost(
+            float((self.per_serving[rows] * self.servings[rows]).sum()),
+            bool(self.priced[rows].all()),
+        )
+
+
+class PlanCost(NamedTuple):
+    """A plan's cost; complete is False when some ingredients had no price."""
+
+    total: float
+    complete: bool
+
+
+def plan_budget(weekly_budget: Optional[float], num_days: int) -> Optional[float]:
+    """The share of a weekly budget a plan of num_days days may spend."""
+    if not weekly_budget or weekly_budget <= 0:
+        return None
+    return weekly_budget * num_days / 7
+
+
+def format_cost(amount: float) -> str:
+    return f"{CURRENCY_SYMBOL}{amount:,.2f}"
+
+
+def fit_budget(
+    result: PlanResult,
+    candidates: CandidateSnapshot,
+    costs: RecipeCosts,
+    settings: PlanSettings,
+    num_people: int,
+    budget: float,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+    rng: Optional[random.Random] = None,
+) -> PlanResult:
+    """
+    Returns a copy of the plan that costs at most budget, when swapping
+    its randomly chosen ("new") slots can get it there, and otherwise the
+    cheapest plan found with a warning. Slots are only swapped for priced
+    recipes, under the rules of planner.SlotSwaps (locks, leftovers and
+    the repeat interval hold).
+    """
+    rng = rng if rng is not None else random.Random()
+    swaps = SlotSwaps(
+        result,
+        candidates,
+        settings,
+        num_people,
+        history=history,
+        eligible=lambda candidate: costs.is_priced(candidate.id),
+    )
+    total = costs.plan_cost(swaps.plan_ids).total
+    if total <= budget:
+        return swaps.result()
+
+    # Greedy: the largest saving first, until the plan fits
+    swapped: Set[Slot] = set()
+    while total > budget:
+        best: Optional[Tuple[float, Slot, int]] = None
+        for slot in swaps.free:
+            options = swaps.options(slot)
+            if not options:
+                continue
+            cheapest = min(options, key=costs.recipe_cost)
+            saving = costs.recipe_cost(swaps.picks[slot]) - costs.recipe_cost(cheapest)
+            if saving > 1e-9 and (best is None or saving > best[0]):
+                best = (saving, slot, cheapest)
+        if best is None:
+            break
+        saving, slot, recipe_id = best
+        swaps.swap(slot, recipe_id)
+        swapped.add(slot)
+        total -= saving
+
+    # Repair: trade each cheapest pick up to a random recipe that still fits
+    if total <= budget:
+        order = sorted(swapped)
+        rng.shuffle(order)
+        for slot in order:
+            current = costs.recipe_cost(swaps.picks[slot])
+            affordable = [
+                recipe_id
+                for recipe_id in swaps.options(slot)
+                if total - current + costs.recipe_cost(recipe_id) <= budget
+            ]
+            if affordable:
+                swaps.swap(slot, rng.choice(affordable))
+                total += costs.recipe_cost(swaps.picks[slot]) - current
+    else:
+        swaps.warnings.append(
+            f"This plan costs about {format_cost(total)}, over its "
+            f"{format_cost(budget)} budget; there are no cheaper recipes for "
+            "the remaining meals."
+        )
+    return swaps.result()
@@ -0,0 +1,284 @@
+# meal_planner/expiry.py
+"""
+Pantry expiry dates and the "expiring" planning mode.
+
+ExpiryQueue is a min-heap of dated pantry stock, so the soonest-expiring
+batches come off the top without sorting the whole pantry. The expiring
+mode ranks plan_meals picks by expiry_scores, then walks the plan from
+its first slot still to come (a plan week can start before today) to its
+last and re-picks each randomly chosen ("new") slot
+for the recipe that uses up the most stock still at risk of expiring
+before it is cooked, weighted by how soon it goes off. Candidates are
+found through the IngredientIndex postings of the at-risk ingredients
+only, so a slot never scores the whole catalog.
+"""
+
+import datetime
+import heapq
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from planner import (
+    MEAL_TYPES,
+    CandidateSnapshot,
+    IngredientIndex,
+    PlanResult,
+    PlanSettings,
+    Slot,
+    SlotSwaps,
+)
+from units import unit_base
+
+# Stock expiring within this many days is flagged "use soon" in the cupboard
+USE_SOON_DAYS = 3
+
+
+class PantryBatch(NamedTuple):
+    """One dated pantry item, its quantity in base units (None if unparsed)."""
+
+    expires_on: datetime.date
+    item_id: int
+    name: str
+    key: Hashable  # canonical ingredient key (catalog id, else normalized name)
+    amount: Optional[float]
+    base_unit: str
+
+
+class ExpiryQueue:
+    """Pantry batches ordered soonest-expiring first (ties by item id)."""
+
+    def __init__(self, batches: Iterable[PantryBatch] = ()) -> None:
+        self._heap: List[Tuple[datetime.date, int, PantryBatch]] = [
+            (batch.expires_on, batch.item_id, batch) for batch in batches
+        ]
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, batch: PantryBatch) -> None:
+        heapq.heappush(self._heap, (batch.expires_on, batch.item_id, batch))
+
+    def peek(self) -> Optional[PantryBatch]:
+        return self._heap[0][2] if self._heap else None
+
+    def pop(self) -> PantryBatch:
+        return heapq.heappop(self._heap)[2]
+
+    def due(self, until: datetime.date) -> List[PantryBatch]:
+        """
+        Batches expiring on or before until, soonest first. The queue is
+        left as it is; this costs O(k log n) for k batches due.
+        """
+        heap = list(self._heap)
+        due: List[PantryBatch] = []
+        while heap and heap[0][0] <= until:
+            due.append(heapq.heappop(heap)[2])
+        return due
+
+
+def days_left(batch: PantryBatch, today: datetime.date) -> int:
+    """Days until the batch expires; negative once it has."""
+    return (batch.expires_on - today).days
+
+
+class RecipeAmountRow(NamedTuple):
+    recipe_id: int
+    key: Hashable  # canonical ingredient key
+    quantity: Optional[float]
+    unit: str
+
+
+class RecipeAmounts:
+    """
+    How much of each ingredient cooking a recipe once uses, in base units
+    per (recipe, ingredient key). An ingredient without a parsed quantity
+    is stored with amount None ("some").
+    """
+
+    def __init__(
+        self,
+        ingredients: Iterable[RecipeAmountRow],
+        key: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        self.key = key
+        self.amounts: Dict[Tuple[int, Hashable], Dict[str, Optional[float]]] = (
+            defaultdict(dict)
+        )
+        for ingredient in ingredients:
+            base_unit, factor = unit_base(ingredient.unit or "")
+            units = self.amounts[(ingredient.recipe_id, ingredient.key)]
+            if ingredient.quantity is None or units.get(base_unit, 0) is None:
+                units[base_unit] = None
+            else:
+                units[base_unit] = (
+                    units.get(base_unit, 0) + ingredient.quantity * factor
+                )
+
+    def uses(self, recipe_id: int, batch: PantryBatch) -> Optional[float]:
+        """
+        Base units of the batch the recipe uses; None when the recipe uses
+        the ingredient but the amount cannot be compared with the batch.
+        """
+        units = self.amounts.get((recipe_id, batch.key), {})
+        return units.get(batch.base_unit) if batch.amount is not None else None
+
+
+class ExpiringStock(NamedTuple):
+    """
+    Everything the expiring planning mode plans from. start is the plan's
+    first day (default today); a plan week can begin before today.
+    """
+
+    queue: ExpiryQueue
+    index: IngredientIndex
+    amounts: RecipeAmounts
+    today: datetime.date
+    start: Optional[datetime.date] = None
+
+    @property
+    def plan_start(self) -> datetime.date:
+        return self.start or self.today
+
+    def slot_date(self, day_index: int) -> datetime.date:
+        """Date of the plan's day_index-th day."""
+        return self.plan_start + datetime.timedelta(days=day_index)
+
+    def at_risk(self, num_days: int) -> List[PantryBatch]:
+        """
+        Batches unexpired today and not empty that go off before a plan of
+        num_days from plan_start ends.
+        """
+        return [
+            batch
+            for batch in self.queue.due(self.slot_date(num_days - 1))
+            if days_left(batch, self.today) >= 0
+            and (batch.amount is None or batch.amount > 0)
+        ]
+
+
+def expiry_scores(stock: ExpiringStock, num_days: int) -> Dict[int, float]:
+    """
+    recipe_id -> urgency-weighted share of the at-risk stock the recipe
+    would use up on its own, to rank plan_meals picks (scores=) so recipes
+    using the soonest-expiring stock land in the earliest slots. Only the
+    recipes in the postings of at-risk ingredients are scored.
+    """
+    scores: Dict[int, float] = defaultdict(float)
+    for batch in stock.at_risk(num_days):
+        weight = 1 / (1 + days_left(batch, stock.today))
+        for recipe_id in stock.index.postings.get(batch.key, ()):
+            wanted = stock.amounts.uses(recipe_id, batch)
+            share = 1.0 if wanted is None else min(wanted / batch.amount, 1.0)
+            scores[recipe_id] += share * weight
+    return dict(scores)
+
+
+def use_expiring_first(
+    result: PlanResult,
+    candidates: CandidateSnapshot,
+    stock: ExpiringStock,
+    settings: PlanSettings,
+    num_people: int,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+) -> PlanResult:
+    """
+    Re-picks randomly chosen ("new") slots, earliest first, so the plan
+    cooks the pantry stock that is about to expire. The plan's first day
+    is stock.plan_start; slots dated before stock.today are already past
+    and left alone, and a batch can only be used by slots on or before
+    the day it expires.
+
+    A recipe scores the share of each live batch it would use up, weighted
+    by 1 / (1 + days left); a batch whose quantity cannot be compared
+    with the recipe's counts as used up. Each slot takes the best-scoring
+    recipe when it beats the current pick, trading places with a later
+    slot if that one has it, and what the slot's recipe uses is taken off
+    the batches before the next slot, so two slots do not count on the
+    same milk. Locked and default slots use stock too but are never
+    changed; slots follow the rules of planner.SlotSwaps.
+    """
+    swaps = SlotSwaps(result, candidates, settings, num_people, history=history)
+    at_risk = stock.at_risk(len(swaps.days))
+    if not at_risk:
+        return swaps.result()
+    # Share of each batch still unused, and the batches per ingredient key
+    left: Dict[int, float] = {batch.item_id: 1.0 for batch in at_risk}
+    by_key: Dict[Hashable, List[PantryBatch]] = defaultdict(list)
+    for batch in at_risk:
+        by_key[batch.key].append(batch)
+
+    def usage(recipe_id: int, live: Set[int]) -> List[Tuple[PantryBatch, float]]:
+        """(batch, share of it used) for the live batches the recipe uses."""
+        used = []
+        for key, batches in by_key.items():
+            if (recipe_id, key) not in stock.amounts.amounts:
+                continue
+            need: Dict[str, Optional[float]] = {}
+            for batch in batches:
+                if batch.item_id not in live or left[batch.item_id] <= 0:
+                    continue
+                if batch.base_unit not in need:
+                    need[batch.base_unit] = stock.amounts.uses(recipe_id, batch)
+                wanted = need[batch.base_unit]
+                if wanted is None:
+                    used.append((batch, left[batch.item_id]))
+                    continue
+                share = min(wanted / batch.amount, left[batch.item_id])
+                if share > 0:
+                    used.append((batch, share))
+                    need[batch.base_unit] = wanted - share * batch.amount
+        return used
+
+    def score(used: List[Tuple[PantryBatch, float]]) -> float:
+        return sum(
+            share / (1 + days_left(batch, stock.today)) for batch, share in used
+        )
+
+    order = sorted(
+        swaps.picks, key=lambda slot: (slot[0], MEAL_TYPES.index(slot[1]))
+    )
+    past = [slot for slot in order if stock.slot_date(slot[0]) < stock.today]
+    for position, slot in enumerate(order):
+        slot_date = stock.slot_date(slot[0])
+        if slot_date < stock.today:
+            continue
+        live = {
+            batch.item_id
+            for batch in at_risk
+            if left[batch.item_id] > 0 and days_left(batch, slot_date) >= 0
+        }
+        if not live:
+            break
+        current = swaps.picks[slot]
+        best: Tuple[float, int] = (score(usage(current, live)), current)
+        if slot in swaps.free:
+            allowed = set(swaps.options(slot))
+            # A recipe picked for a later or past slot may trade places with
+            # this one, so a past pick does not strand the stock it would use
+            later: Dict[int, List[Slot]] = defaultdict(list)
+            for other in past + order[position + 1 :]:
+                if other in swaps.free and other[1] == slot[1]:
+                    later[swaps.picks[other]].append(other)
+            touched = {
+                recipe_id
+                for key in {batch.key for batch in at_risk if batch.item_id in live}
+                for recipe_id in stock.index.postings.get(key, ())
+                if recipe_id in allowed or recipe_id in later
+            }
+            scored = sorted(
+                ((score(usage(recipe_id, live)), recipe_id) for recipe_id in touched),
+                key=lambda pair: (-pair[0], pair[1]),
+            )
+            for value, recipe_id in scored:
+                if value <= best[0] + 1e-9:
+                    break
+                if recipe_id in allowed:
+                    swaps.swap(slot, recipe_id)
+                elif not any(swaps.trade(slot, other) for other in later[recipe_id]):
+                    continue
+                best = (value, recipe_id)
+                break
+        for batch, share in usage(best[1], live):
+            left[batch.item_id] -= share
+    return swaps.result()
@@ -0,0 +1,42 @@
+"""add indexes for hot lookup paths
+
+Revision ID: 20261017_add_hot_path_indexes
+Revises: 20261017_add_ingredient_catalog
+Create Date: 2026-10-17 13:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_hot_path_indexes'
+down_revision = '20261017_add_ingredient_catalog'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_recipe_is_breakfast', 'recipe', ['is_breakfast'])
+    op.create_index('ix_recipe_is_lunch', 'recipe', ['is_lunch'])
+    op.create_index('ix_recipe_is_dinner', 'recipe', ['is_dinner'])
+    op.create_index('ix_recipe_account_id', 'recipe', ['account_id'])
+    op.create_index(op.f('ix_ingredient_recipe_id'), 'ingredient', ['recipe_id'])
+    op.create_index(
+        'ix_pantry_item_normalized_name', 'pantry_item', [sa.text('lower(trim(name))')]
+    )
+    op.create_index(
+        'ix_shopping_list_item_account_aisle_name',
+        'shopping_list_item',
+        ['account_id', 'aisle', 'name'],
+    )
+    op.create_index(op.f('ix_account_settings_account_id'), 'account_settings', ['account_id'])
+
+
+def downgrade():
+    op.drop_index(op.f('ix_account_settings_account_id'), table_name='account_settings')
+    op.drop_index('ix_shopping_list_item_account_aisle_name', table_name='shopping_list_item')
+    op.drop_index('ix_pantry_item_normalized_name', table_name='pantry_item')
+    op.drop_index(op.f('ix_ingredient_recipe_id'), table_name='ingredient')
+    op.drop_index('ix_recipe_account_id', table_name='recipe')
+    op.drop_index('ix_recipe_is_dinner', table_name='recipe')
+    op.drop_index('ix_recipe_is_lunch', table_name='recipe')
+    op.drop_index('ix_recipe_is_breakfast', table_name='recipe')
@@ -0,0 +1,76 @@
+"""add IngredientCatalog and catalog_id on ingredient, pantry and shopping rows
+
+Revision ID: 20261017_add_ingredient_catalog
+Revises: 20261017_add_parsed_quantity_columns
+Create Date: 2026-10-17 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_ingredient_catalog'
+down_revision = '20261017_add_parsed_quantity_columns'
+branch_labels = None
+depends_on = None
+
+TABLES = ('ingredient', 'pantry_item', 'shopping_list_item')
+
+
+def upgrade():
+    op.create_table('ingredient_catalog',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('normalized_name', sa.String(length=100), nullable=False),
+    sa.Column('aisle', sa.String(length=50), nullable=True),
+    sa.Column('default_unit', sa.String(length=50), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('normalized_name')
+    )
+    op.create_index(op.f('ix_ingredient_catalog_aisle'), 'ingredient_catalog', ['aisle'])
+
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.add_column(sa.Column('catalog_id', sa.Integer(), nullable=True))
+            batch_op.create_index(batch_op.f(f'ix_{table_name}_catalog_id'), ['catalog_id'])
+            batch_op.create_foreign_key(
+                f'fk_{table_name}_catalog_id', 'ingredient_catalog', ['catalog_id'], ['id']
+            )
+
+    # One catalog entry per distinct normalized name; recipe and pantry
+    # aisles win over shopping list ones only by being non-empty
+    op.execute(
+        """
+        INSERT INTO ingredient_catalog (normalized_name, aisle, default_unit)
+        SELECT name, MAX(aisle), MAX(unit) FROM (
+            SELECT lower(trim(name)) AS name, nullif(aisle, '') AS aisle,
+                   nullif(unit_canonical, '') AS unit
+            FROM ingredient
+            UNION ALL
+            SELECT lower(trim(name)), nullif(aisle, ''), nullif(unit_canonical, '')
+            FROM pantry_item
+            UNION ALL
+            SELECT lower(trim(name)), nullif(aisle, ''), NULL
+            FROM shopping_list_item
+        ) AS names
+        WHERE name <> ''
+        GROUP BY name
+        """
+    )
+    for table_name in TABLES:
+        op.execute(
+            f"""
+            UPDATE {table_name} SET catalog_id = (
+                SELECT c.id FROM ingredient_catalog AS c
+                WHERE c.normalized_name = lower(trim({table_name}.name))
+            )
+            """
+        )
+
+
+def downgrade():
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_constraint(f'fk_{table_name}_catalog_id', type_='foreignkey')
+            batch_op.drop_index(batch_op.f(f'ix_{table_name}_catalog_id'))
+            batch_op.drop_column('catalog_id')
+    op.drop_index(op.f('ix_ingredient_catalog_aisle'), table_name='ingredient_catalog')
+    op.drop_table('ingredient_catalog')
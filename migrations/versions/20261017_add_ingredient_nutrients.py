@@ -0,0 +1,40 @@
+"""Add IngredientNutrients model and nutrient_targets to account_settings
+
+Revision ID: 20261017_add_ingredient_nutrients
+Revises: 20261017_add_weekly_budget
+Create Date: 2026-10-17 20:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_ingredient_nutrients'
+down_revision = '20261017_add_weekly_budget'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingredient_nutrients',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('catalog_id', sa.Integer(), nullable=False),
+    sa.Column('base_unit', sa.String(length=10), nullable=False),
+    sa.Column('energy_kcal', sa.Float(), nullable=False),
+    sa.Column('protein_g', sa.Float(), nullable=False),
+    sa.Column('carbohydrate_g', sa.Float(), nullable=False),
+    sa.Column('fat_g', sa.Float(), nullable=False),
+    sa.Column('fibre_g', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['catalog_id'], ['ingredient_catalog.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('catalog_id', 'base_unit', name='unique_ingredient_nutrients_unit')
+    )
+    op.add_column(
+        'account_settings',
+        sa.Column('nutrient_targets', sa.Text(), nullable=True),
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('account_settings') as batch_op:
+        batch_op.drop_column('nutrient_targets')
+    op.drop_table('ingredient_nutrients')
@@ -0,0 +1,36 @@
+"""add expires_on to pantry_item
+
+Revision ID: 20261017_add_pantry_expiry
+Revises: 20261017_add_ingredient_nutrients
+Create Date: 2026-10-17 21:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_pantry_expiry'
+down_revision = '20261017_add_ingredient_nutrients'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'pantry_item',
+        sa.Column('expires_on', sa.Date(), nullable=True),
+    )
+    op.create_index(
+        op.f('ix_pantry_item_expires_on'), 'pantry_item', ['expires_on'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_pantry_item_expires_on'), table_name='pantry_item')
+    # SQLite rebuilds the table to drop a column, which loses expression
+    # indexes; put the normalized-name index back afterwards
+    op.drop_index('ix_pantry_item_normalized_name', table_name='pantry_item')
+    with op.batch_alter_table('pantry_item') as batch_op:
+        batch_op.drop_column('expires_on')
+    op.create_index(
+        'ix_pantry_item_normalized_name', 'pantry_item', [sa.text('lower(trim(name))')]
+    )
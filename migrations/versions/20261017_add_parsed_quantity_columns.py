@@ -0,0 +1,79 @@
+"""add parsed quantity columns to ingredient and pantry_item
+
+Revision ID: 20261017_add_parsed_quantity_columns
+Revises: 20261017_add_shoppinglistchange_model
+Create Date: 2026-10-17 11:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from units import parse_quantity, canonical_unit
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_parsed_quantity_columns'
+down_revision = '20261017_add_shoppinglistchange_model'
+branch_labels = None
+depends_on = None
+
+TABLES = ('ingredient', 'pantry_item')
+BATCH_SIZE = 1000
+
+
+def backfill(table_name):
+    """Parses existing quantity/unit text in keyset-paginated chunks."""
+    conn = op.get_bind()
+    table = sa.table(
+        table_name,
+        sa.column('id', sa.Integer),
+        sa.column('quantity', sa.String),
+        sa.column('unit', sa.String),
+        sa.column('quantity_value', sa.Float),
+        sa.column('unit_canonical', sa.String),
+    )
+    update = (
+        table.update()
+        .where(table.c.id == sa.bindparam('b_id'))
+        .values(
+            quantity_value=sa.bindparam('b_quantity_value'),
+            unit_canonical=sa.bindparam('b_unit_canonical'),
+        )
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(table.c.id, table.c.quantity, table.c.unit)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            update,
+            [
+                {
+                    'b_id': row.id,
+                    'b_quantity_value': parse_quantity(row.quantity),
+                    'b_unit_canonical': canonical_unit(row.unit),
+                }
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade():
+    for table_name in TABLES:
+        op.add_column(table_name, sa.Column('quantity_value', sa.Float(), nullable=True))
+        op.add_column(
+            table_name,
+            sa.Column('unit_canonical', sa.String(length=50), nullable=False, server_default=''),
+        )
+        backfill(table_name)
+
+
+def downgrade():
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column('unit_canonical')
+            batch_op.drop_column('quantity_value')
@@ -0,0 +1,31 @@
+"""Add PlanHistory model
+
+Revision ID: 20261017_add_plan_history
+Revises: 20261017_add_pantry_expiry
+Create Date: 2026-10-17 23:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_plan_history'
+down_revision = '20261017_add_pantry_expiry'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('plan_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('week_start', sa.Date(), nullable=False),
+    sa.Column('plan', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['account_id'], ['account.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account_id', 'week_start', name='uix_plan_history_week')
+    )
+
+
+def downgrade():
+    op.drop_table('plan_history')
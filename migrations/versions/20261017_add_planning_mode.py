@@ -0,0 +1,26 @@
+"""add planning_mode to account_settings
+
+Revision ID: 20261017_add_planning_mode
+Revises: 20261017_add_recipe_catalog_version
+Create Date: 2026-10-17 16:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_planning_mode'
+down_revision = '20261017_add_recipe_catalog_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'account_settings',
+        sa.Column('planning_mode', sa.String(length=20), nullable=True, server_default='random'),
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('account_settings') as batch_op:
+        batch_op.drop_column('planning_mode')
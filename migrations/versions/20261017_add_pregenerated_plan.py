@@ -0,0 +1,33 @@
+"""Add PregeneratedPlan model
+
+Revision ID: 20261017_add_pregenerated_plan
+Revises: 20261017_add_planning_mode
+Create Date: 2026-10-17 18:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_pregenerated_plan'
+down_revision = '20261017_add_planning_mode'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pregenerated_plan',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('days', sa.String(length=80), nullable=False),
+    sa.Column('seed', sa.BigInteger(), nullable=False),
+    sa.Column('plan', sa.Text(), nullable=False),
+    sa.Column('locks', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['account_id'], ['account.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account_id')
+    )
+
+
+def downgrade():
+    op.drop_table('pregenerated_plan')
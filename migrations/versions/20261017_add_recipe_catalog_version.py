@@ -0,0 +1,30 @@
+"""add recipe_catalog_version
+
+Revision ID: 20261017_add_recipe_catalog_version
+Revises: 20261017_add_hot_path_indexes
+Create Date: 2026-10-17 14:00:00
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_recipe_catalog_version'
+down_revision = '20261017_add_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table = op.create_table('recipe_catalog_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=32), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(table, [{'id': 1, 'version': 0, 'token': uuid.uuid4().hex}])
+
+
+def downgrade():
+    op.drop_table('recipe_catalog_version')
@@ -0,0 +1,24 @@
+"""add shopping_list_version to Account
+
+Revision ID: 20261017_add_shopping_list_version
+Revises: 20250418_add_account_id_to_lockedmeal
+Create Date: 2026-10-17 09:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_shopping_list_version'
+down_revision = '20250418_add_account_id_to_lockedmeal'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column(
+        'account',
+        sa.Column('shopping_list_version', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade():
+    op.drop_column('account', 'shopping_list_version')
@@ -0,0 +1,33 @@
+"""Add ShoppingListChange model
+
+Revision ID: 20261017_add_shoppinglistchange_model
+Revises: 20261017_add_shopping_list_version
+Create Date: 2026-10-17 10:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_shoppinglistchange_model'
+down_revision = '20261017_add_shopping_list_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('shopping_list_change',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('is_deleted', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['account.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account_id', 'item_id', name='uix_shopping_change_item')
+    )
+    op.create_index('ix_shopping_change_account_version', 'shopping_list_change', ['account_id', 'version'])
+
+
+def downgrade():
+    op.drop_index('ix_shopping_change_account_version', table_name='shopping_list_change')
+    op.drop_table('shopping_list_change')
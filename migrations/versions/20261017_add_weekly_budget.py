@@ -0,0 +1,26 @@
+"""add weekly_budget to account_settings
+
+Revision ID: 20261017_add_weekly_budget
+Revises: 20261017_add_pregenerated_plan
+Create Date: 2026-10-17 19:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_add_weekly_budget'
+down_revision = '20261017_add_pregenerated_plan'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'account_settings',
+        sa.Column('weekly_budget', sa.Float(), nullable=True),
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('account_settings') as batch_op:
+        batch_op.drop_column('weekly_budget')
@@ -0,0 +1,108 @@
+"""key locked meals and plan history by date instead of weekday
+
+Revision ID: 20261017_date_plan_keys
+Revises: 20261017_add_plan_history
+Create Date: 2026-10-17 23:30:00
+"""
+import datetime
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261017_date_plan_keys'
+down_revision = '20261017_add_plan_history'
+branch_labels = None
+depends_on = None
+
+WEEK_DAYS = [
+    'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'
+]
+
+
+def _weekday_date(week_start, day):
+    """The date of weekday name day in the week beginning on week_start."""
+    offset = (WEEK_DAYS.index(day) - week_start.weekday()) % 7
+    return week_start + datetime.timedelta(days=offset)
+
+
+def _current_week_start(conn):
+    # Locks are shared, so they follow the first account's start day
+    start_day = conn.execute(
+        sa.text('SELECT meal_plan_start_day FROM account_settings ORDER BY id LIMIT 1')
+    ).scalar()
+    start_idx = WEEK_DAYS.index(start_day) if start_day in WEEK_DAYS else 0
+    today = datetime.date.today()
+    return today - datetime.timedelta(days=(today.weekday() - start_idx) % 7)
+
+
+def _plan_history_rows(conn):
+    for row_id, week_start, plan in conn.execute(
+        sa.text('SELECT id, week_start, plan FROM plan_history')
+    ).fetchall():
+        if isinstance(week_start, str):
+            week_start = datetime.date.fromisoformat(week_start)
+        yield row_id, week_start, json.loads(plan)
+
+
+def upgrade():
+    conn = op.get_bind()
+    # Weekday locks belong to the current plan week
+    week_start = _current_week_start(conn)
+    for lock_id, day in conn.execute(
+        sa.text('SELECT id, day FROM locked_meal')
+    ).fetchall():
+        if day in WEEK_DAYS:
+            conn.execute(
+                sa.text('UPDATE locked_meal SET day = :day WHERE id = :id'),
+                {'day': _weekday_date(week_start, day).isoformat(), 'id': lock_id},
+            )
+    for row_id, started, plan in _plan_history_rows(conn):
+        dated = {
+            (_weekday_date(started, day).isoformat() if day in WEEK_DAYS else day): meals
+            for day, meals in plan.items()
+        }
+        conn.execute(
+            sa.text('UPDATE plan_history SET plan = :plan WHERE id = :id'),
+            {'plan': json.dumps(dated), 'id': row_id},
+        )
+    # Pregenerated plans are weekday-keyed; the next plan-accounts run replaces them
+    conn.execute(sa.text('DELETE FROM pregenerated_plan'))
+
+
+def downgrade():
+    conn = op.get_bind()
+    # Only the current plan week can be expressed with weekday names
+    week_start = _current_week_start(conn)
+    week = {
+        (week_start + datetime.timedelta(days=offset)).isoformat()
+        for offset in range(7)
+    }
+    for lock_id, day in conn.execute(
+        sa.text('SELECT id, day FROM locked_meal')
+    ).fetchall():
+        if day in WEEK_DAYS:
+            continue
+        if day in week:
+            conn.execute(
+                sa.text('UPDATE locked_meal SET day = :day WHERE id = :id'),
+                {'day': WEEK_DAYS[datetime.date.fromisoformat(day).weekday()], 'id': lock_id},
+            )
+        else:
+            conn.execute(sa.text('DELETE FROM locked_meal WHERE id = :id'), {'id': lock_id})
+    for row_id, started, plan in _plan_history_rows(conn):
+        first_week = {
+            (started + datetime.timedelta(days=offset)).isoformat()
+            for offset in range(7)
+        }
+        weekdays = {
+            WEEK_DAYS[datetime.date.fromisoformat(day).weekday()]: meals
+            for day, meals in plan.items()
+            if day in first_week
+        }
+        conn.execute(
+            sa.text('UPDATE plan_history SET plan = :plan WHERE id = :id'),
+            {'plan': json.dumps(weekdays), 'id': row_id},
+        )
+    conn.execute(sa.text('DELETE FROM pregenerated_plan'))
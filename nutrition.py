@@ -0,0 +1,269 @@
+# meal_planner/nutrition.py
+"""
+Nutrient totals of a plan and the "meet nutrient targets" constraint.
+
+Nutrients per base unit (g, ml or item) of each catalog ingredient are
+imported from a local CSV with `flask import-nutrients`. RecipeNutrients
+turns the recipe catalog into one compact float32 row of nutrients per
+serving for every recipe, built once per catalog version next to the
+candidate snapshot, so a plan's totals are a single vectorized sum over
+the rows of the recipes it serves.
+"""
+
+import csv
+import random
+from typing import (
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+from planner import (
+    CandidateSnapshot,
+    PlanIdsDict,
+    PlanResult,
+    PlanSettings,
+    Slot,
+    SlotSwaps,
+)
+from units import canonical_unit, parse_quantity, unit_base
+
+# Nutrient columns, in vector order, with their display names and units
+NUTRIENTS: Tuple[str, ...] = (
+    "energy_kcal",
+    "protein_g",
+    "carbohydrate_g",
+    "fat_g",
+    "fibre_g",
+)
+NUTRIENT_LABELS: Dict[str, Tuple[str, str]] = {
+    "energy_kcal": ("Energy", "kcal"),
+    "protein_g": ("Protein", "g"),
+    "carbohydrate_g": ("Carbohydrate", "g"),
+    "fat_g": ("Fat", "g"),
+    "fibre_g": ("Fibre", "g"),
+}
+
+
+class NutrientRow(NamedTuple):
+    """One parsed row of a nutrient CSV, per base unit of the ingredient."""
+
+    name: str
+    base_unit: str
+    values: Tuple[float, ...]  # in NUTRIENTS order
+
+
+def read_nutrient_csv(path: str) -> Tuple[List[NutrientRow], List[int]]:
+    """
+    Reads a nutrient dataset: a name,quantity,unit header followed by the
+    NUTRIENTS columns, giving the nutrients in that quantity of the
+    ingredient (e.g. "rice,100,g,130,2.7,28,0.3,0.4"). Missing nutrient
+    values count as 0. Returns the rows and the line numbers skipped
+    because their name is missing or their quantity is missing, does not
+    parse or is not positive.
+    """
+    rows: List[NutrientRow] = []
+    skipped: List[int] = []
+    with open(path, newline="", encoding="utf-8") as handle:
+        for line, row in enumerate(csv.DictReader(handle), start=2):
+            name = (row.get("name") or "").strip().lower()
+            quantity = parse_quantity(row.get("quantity"))
+            base_unit, factor = unit_base(canonical_unit(row.get("unit")))
+            if not name or quantity is None or quantity <= 0:
+                skipped.append(line)
+                continue
+            amount = quantity * factor
+            rows.append(
+                NutrientRow(
+                    name,
+                    base_unit,
+                    tuple(
+                        (parse_quantity(row.get(nutrient)) or 0.0) / amount
+                        for nutrient in NUTRIENTS
+                    ),
+                )
+            )
+    return rows, skipped
+
+
+class NutrientIngredientRow(NamedTuple):
+    recipe_id: int
+    servings: Optional[int]
+    key: Hashable  # canonical ingredient key (catalog id)
+    quantity: Optional[float]
+    unit: str
+
+
+class NutritionTotals(NamedTuple):
+    """
+    Nutrients one person gets from a plan (per_person) and the whole
+    household (household), in NUTRIENTS order. complete is False when
+    some served ingredients had no nutrient data.
+    """
+
+    per_person: np.ndarray
+    household: np.ndarray
+    complete: bool
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(zip(NUTRIENTS, map(float, self.per_person)))
+
+
+class RecipeNutrients:
+    """
+    Recipe x nutrient float32 matrix of nutrients per serving. Row 0 is all
+    zeros and stands in for unknown recipes. A recipe with an ingredient
+    missing from the nutrient table is summed without it and flagged as
+    not known.
+    """
+
+    def __init__(
+        self,
+        ingredients: Iterable[NutrientIngredientRow],
+        table: Mapping[Tuple[Hashable, str], Sequence[float]],
+        key: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        self.key = key
+        self.rows: Dict[int, int] = {}
+        servings: List[int] = [1]
+        known: List[bool] = [False]
+        recipe_rows: List[int] = []
+        amounts: List[float] = []
+        values: List[Sequence[float]] = []
+        for ingredient in ingredients:
+            row = self.rows.get(ingredient.recipe_id)
+            if row is None:
+                row = self.rows[ingredient.recipe_id] = len(servings)
+                servings.append(max(ingredient.servings or 1, 1))
+                known.append(True)
+            base_unit, factor = unit_base(ingredient.unit or "")
+            per_unit = table.get((ingredient.key, base_unit))
+            if per_unit is None:
+                known[row] = False
+                continue
+            recipe_rows.append(row)
+            amounts.append((ingredient.quantity or 0) * factor)
+            values.append(per_unit)
+        self.matrix = np.zeros((len(servings), len(NUTRIENTS)), dtype=np.float32)
+        if recipe_rows:
+            np.add.at(
+                self.matrix,
+                np.array(recipe_rows),
+                np.array(values, dtype=np.float32)
+                * np.array(amounts, dtype=np.float32)[:, None],
+            )
+        self.matrix /= np.array(servings, dtype=np.float32)[:, None]
+        self.known = np.array(known, dtype=bool)
+
+    def row(self, recipe_id: int) -> int:
+        return self.rows.get(recipe_id, 0)
+
+    @property
+    def has_data(self) -> bool:
+        return bool(self.matrix.any())
+
+    def plan_totals(self, plan_ids: PlanIdsDict, num_people: int) -> NutritionTotals:
+        """
+        Sums the per-serving rows of every slot that serves a recipe
+        (cooked or leftover): each person eats one serving per slot.
+        """
+        rows = np.array(
+            [
+                self.row(slot["recipe_id"])
+                for meals in plan_ids.values()
+                for slot in meals.values()
+                if slot and (slot.get("recipe_id") or 0) > 0
+            ],
+            dtype=np.int64,
+        )
+        per_person = self.matrix[rows].sum(axis=0, dtype=np.float64)
+        return NutritionTotals(
+            per_person,
+            per_person * max(num_people, 1),
+            bool(self.known[rows].all()),
+        )
+
+
+def meet_nutrient_targets(
+    result: PlanResult,
+    candidates: CandidateSnapshot,
+    nutrients: RecipeNutrients,
+    settings: PlanSettings,
+    num_people: int,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+    rng: Optional[random.Random] = None,
+) -> PlanResult:
+    """
+    Re-picks randomly chosen ("new") slots until every person gets the
+    daily minimums in settings.nutrient_targets over the plan's days, or
+    no swap brings the plan closer; then warns about the nutrients still
+    short. Each step takes the swap that most reduces the summed relative
+    shortfall. Slots only take recipes with full nutrient data, under the
+    rules of planner.SlotSwaps.
+    """
+    rng = rng if rng is not None else random.Random()
+    swaps = SlotSwaps(
+        result,
+        candidates,
+        settings,
+        num_people,
+        history=history,
+        eligible=lambda candidate: bool(nutrients.known[nutrients.row(candidate.id)]),
+    )
+    wanted = [
+        (nutrient, amount)
+        for nutrient, amount in settings.nutrient_targets
+        if nutrient in NUTRIENTS and amount > 0
+    ]
+    if not wanted:
+        return swaps.result()
+    columns = [NUTRIENTS.index(nutrient) for nutrient, _ in wanted]
+    targets = np.array([amount for _, amount in wanted]) * len(swaps.days)
+    totals = nutrients.plan_totals(swaps.plan_ids, num_people).per_person[columns]
+
+    def shortfall(values: np.ndarray) -> np.ndarray:
+        """Summed relative shortfall of each row of values."""
+        return (np.maximum(targets - values, 0) / targets).sum(axis=-1)
+
+    order = list(swaps.free)
+    rng.shuffle(order)
+    while shortfall(totals) > 0:
+        best: Optional[Tuple[float, Slot, int, np.ndarray]] = None
+        for slot in order:
+            options = swaps.options(slot)
+            if not options:
+                continue
+            servings = swaps.servings(slot)
+            current = nutrients.matrix[nutrients.row(swaps.picks[slot]), columns]
+            rows = [nutrients.row(recipe_id) for recipe_id in options]
+            swapped = totals + servings * (
+                nutrients.matrix[np.ix_(rows, columns)] - current
+            )
+            scores = shortfall(swapped)
+            index = int(np.argmin(scores))
+            if best is None or scores[index] < best[0]:
+                best = (scores[index], slot, options[index], swapped[index])
+        if best is None or best[0] >= shortfall(totals) - 1e-9:
+            break
+        _, slot, recipe_id, totals = best
+        swaps.swap(slot, recipe_id)
+
+    short = [
+        NUTRIENT_LABELS[nutrient][0].lower()
+        for (nutrient, _), total, target in zip(wanted, totals, targets)
+        if total < target - 1e-6
+    ]
+    if short:
+        swaps.warnings.append(
+            f"This plan falls short of the daily {', '.join(short)} target"
+            f"{'s' if len(short) > 1 else ''}; no other recipes get closer."
+        )
+    return swaps.result()
@@ -0,0 +1,234 @@
+# meal_planner/overlap.py
+"""
+Shopping-list-minimizing plan improvement.
+
+Every distinct ingredient in a plan is one more shopping list row, so the
+"overlap" planning mode prefers recipes that share ingredients with the
+rest of the plan. Recipes are rows of a boolean recipe x ingredient
+incidence matrix; a time-boxed local search re-picks the randomly chosen
+slots of a plan from planner.plan_meals, scoring every candidate for a
+slot at once with a vectorized overlap count.
+"""
+
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Mapping, Optional, Set, Tuple
+
+import numpy as np
+
+from planner import (
+    CandidateSnapshot,
+    PlanResult,
+    PlanSettings,
+    RecipeCandidate,
+    leftover_days,
+)
+
+logger = logging.getLogger(__name__)
+
+# Local search passes per plan, and the time a search may take at most, in
+# seconds (a safety limit, far above what the passes normally need)
+DEFAULT_MAX_PASSES = 10
+DEFAULT_TIME_BUDGET = 1.0
+
+
+class IngredientMatrix:
+    """
+    Boolean recipe x ingredient incidence matrix. Ingredient keys are
+    whatever identifies a canonical ingredient (catalog ids in the app).
+    Row 0 is all False and stands in for recipes without ingredients.
+    """
+
+    def __init__(
+        self,
+        recipe_ingredients: Mapping[int, Iterable[Hashable]],
+        key: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        self.key = key
+        self.columns: Dict[Hashable, int] = {}
+        self.rows: Dict[int, int] = {}
+        cells: List[Tuple[int, int]] = []
+        for recipe_id, ingredients in recipe_ingredients.items():
+            row = self.rows.setdefault(recipe_id, len(self.rows) + 1)
+            for ingredient in ingredients:
+                column = self.columns.setdefault(ingredient, len(self.columns))
+                cells.append((row, column))
+        self.matrix = np.zeros((len(self.rows) + 1, len(self.columns)), dtype=bool)
+        if cells:
+            rows, columns = zip(*cells)
+            self.matrix[list(rows), list(columns)] = True
+        self.row_sizes = self.matrix.sum(axis=1)
+
+    def row(self, recipe_id: int) -> int:
+        return self.rows.get(recipe_id, 0)
+
+    def distinct_ingredients(self, recipe_ids: Iterable[int]) -> int:
+        """Number of distinct ingredients needed to cook all recipe_ids."""
+        rows = [self.row(recipe_id) for recipe_id in set(recipe_ids)]
+        return int(self.matrix[rows].any(axis=0).sum()) if rows else 0
+
+
+class _CandidateGroup:
+    """Interchangeable candidates: same meal type and leftover count."""
+
+    def __init__(self, candidates: List[RecipeCandidate], matrix: IngredientMatrix):
+        self.ids = [c.id for c in candidates]
+        self.positions = {recipe_id: i for i, recipe_id in enumerate(self.ids)}
+        rows = [matrix.row(recipe_id) for recipe_id in self.ids]
+        self.matrix = matrix.matrix[rows]
+        self.sizes = matrix.row_sizes[rows]
+
+
+def minimize_shopping_list(
+    result: PlanResult,
+    candidates: CandidateSnapshot,
+    matrix: IngredientMatrix,
+    settings: PlanSettings,
+    num_people: int,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+    rng: Optional[random.Random] = None,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    max_passes: int = DEFAULT_MAX_PASSES,
+) -> PlanResult:
+    """
+    Re-picks the randomly chosen ("new") slots of a plan so the plan needs
+    fewer distinct ingredients, and returns the improved copy.
+
+    Locked, default, manual and leftover slots are never changed. A slot
+    is only swapped for a recipe of the same meal type that leaves the
+    same number of leftover slots, so generated leftovers stay where they
+    are and just follow their source recipe. Swaps never introduce a
+    repeat: recipes picked for the same meal type within
+    meal_repeat_interval days (anywhere in the plan or history when no
+    interval is set) are not candidates. Each pass visits the slots in
+    random order and takes the best swap for each; the search stops when
+    a pass finds nothing better or after max_passes passes, so the result
+    depends only on the plan and rng. time_budget is a safety limit: if a
+    search runs past it, it stops after the current pass with a warning
+    and the result is no longer reproducible.
+    """
+    rng = rng if rng is not None else random.Random()
+    deadline = time.perf_counter() + time_budget
+    plan_ids = {
+        day: {meal_type: dict(slot) if slot else slot for meal_type, slot in meals.items()}
+        for day, meals in result.plan_ids.items()
+    }
+    lock_changes = {slot_id: dict(info) for slot_id, info in result.lock_changes.items()}
+    followers: Dict[str, List[str]] = defaultdict(list)
+    for slot_id, source in result.leftover_sources.items():
+        followers[source].append(slot_id)
+
+    days = list(plan_ids)
+    history = history or []
+    window = settings.meal_repeat_interval or len(days) + len(history)
+
+    # Recipes bought for the plan, by (day_index, meal_type); history days
+    # only constrain repeats, they are already bought
+    picks: Dict[Tuple[int, str], int] = {}
+    for day_index, day in enumerate(days):
+        for meal_type, slot in plan_ids[day].items():
+            recipe_id = slot.get("recipe_id") if slot else None
+            if recipe_id and recipe_id > 0 and slot.get("status") != "leftover":
+                picks[(day_index, meal_type)] = recipe_id
+    served_before: Dict[Tuple[int, str], int] = {
+        (offset - len(history), meal_type): recipe_id
+        for offset, served in enumerate(history)
+        for meal_type, recipe_id in served.items()
+        if recipe_id and recipe_id > 0
+    }
+
+    default_breakfast_id = settings.default_breakfast_id
+    groups: Dict[Tuple[str, int], _CandidateGroup] = {}
+    free: Dict[Tuple[int, str], _CandidateGroup] = {}
+    for (day_index, meal_type), recipe_id in picks.items():
+        if plan_ids[days[day_index]][meal_type].get("status") != "new":
+            continue
+        group_key = (
+            meal_type,
+            leftover_days(candidates.by_id[recipe_id].servings, num_people),
+        )
+        if group_key not in groups:
+            pool = candidates.by_meal_type.get(meal_type, ())
+            groups[group_key] = _CandidateGroup(
+                [
+                    c
+                    for c in pool
+                    if leftover_days(c.servings, num_people) == group_key[1]
+                    # Same rule as plan_meals: skip the default breakfast
+                    and not (
+                        meal_type == "Breakfast"
+                        and default_breakfast_id
+                        and len(pool) > 1
+                        and c.id == int(default_breakfast_id)
+                    )
+                ],
+                matrix,
+            )
+        if len(groups[group_key].ids) > 1:
+            free[(day_index, meal_type)] = groups[group_key]
+
+    counts = np.zeros(matrix.matrix.shape[1], dtype=np.int32)
+    for recipe_id in picks.values():
+        counts += matrix.matrix[matrix.row(recipe_id)]
+
+    def blocked(day_index: int, meal_type: str) -> Set[int]:
+        nearby = range(day_index - window + 1, day_index + window)
+        return {
+            recipe_id
+            for other in nearby
+            if other != day_index
+            for recipe_id in [
+                picks.get((other, meal_type)) or served_before.get((other, meal_type))
+            ]
+            if recipe_id
+        }
+
+    def improve(day_index: int, meal_type: str) -> bool:
+        group = free[(day_index, meal_type)]
+        current_row = matrix.matrix[matrix.row(picks[(day_index, meal_type)])]
+        counts_without = counts - current_row
+        covered = counts_without > 0
+        # Ingredients each candidate would add to the rest of the plan
+        added = (group.sizes - group.matrix[:, covered].sum(axis=1)).astype(np.int64)
+        for recipe_id in blocked(day_index, meal_type):
+            position = group.positions.get(recipe_id)
+            if position is not None:
+                added[position] = np.iinfo(np.int64).max
+        best = int(np.argmin(added))
+        if added[best] >= current_row.sum() - current_row[covered].sum():
+            return False
+        chosen = group.ids[best]
+        counts[:] = counts_without + matrix.matrix[matrix.row(chosen)]
+        picks[(day_index, meal_type)] = chosen
+        return True
+
+    order = sorted(free)
+    improved = bool(order)
+    passes = 0
+    while improved and passes < max_passes:
+        if time.perf_counter() >= deadline:
+            logger.warning(
+                f"Shopping list search stopped after {passes} passes "
+                f"({time_budget:.2f} s limit)"
+            )
+            break
+        improved = False
+        passes += 1
+        rng.shuffle(order)
+        for day_index, meal_type in order:
+            improved = improve(day_index, meal_type) or improved
+
+    for day_index, meal_type in free:
+        day = days[day_index]
+        recipe_id = picks[(day_index, meal_type)]
+        plan_ids[day][meal_type]["recipe_id"] = recipe_id
+        for slot_id in followers.get(f"{day}_{meal_type}", ()):
+            follower_day, follower_meal_type = slot_id.split("_", 1)
+            plan_ids[follower_day][follower_meal_type]["recipe_id"] = recipe_id
+            lock_changes[slot_id]["recipe_id"] = recipe_id
+
+    return PlanResult(
+        plan_ids, lock_changes, list(result.warnings), dict(result.leftover_sources)
+    )
@@ -0,0 +1,1280 @@
+# meal_planner/planner.py
+"""
+Meal plan generation without Flask, the session or the database.
+
+The engine takes everything it needs as arguments (planning settings,
+locks, the recipe candidate snapshot and a random number generator) and
+returns the plan together with the lock changes it implies. app.py reads
+those inputs for the current user and applies the result, so the same
+engine can run inside a request, a worker or a benchmark loop.
+"""
+
+import copy
+import datetime
+import hashlib
+import json
+import logging
+import random
+import threading
+from collections import OrderedDict, defaultdict, deque
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+logger = logging.getLogger(__name__)
+
+MEAL_TYPES = ("Breakfast", "Lunch", "Dinner")
+WEEK_DAYS = (
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+)
+
+# AccountSettings.planning_mode values: uniform random picks, picks that
+# share ingredients to keep the shopping list short (see overlap.py),
+# recipes ranked by how much of them the pantry already covers, the most
+# varied of many random plans (see variety.py), or the earliest slots
+# filled with recipes that use up stock about to expire (see expiry.py)
+PLANNING_MODE_RANDOM = "random"
+PLANNING_MODE_OVERLAP = "overlap"
+PLANNING_MODE_PANTRY = "pantry"
+PLANNING_MODE_VARIETY = "variety"
+PLANNING_MODE_EXPIRING = "expiring"
+PLANNING_MODES = (
+    PLANNING_MODE_RANDOM,
+    PLANNING_MODE_OVERLAP,
+    PLANNING_MODE_PANTRY,
+    PLANNING_MODE_VARIETY,
+    PLANNING_MODE_EXPIRING,
+)
+
+# Meal-type bits of RecipeCandidate.meal_mask
+MEAL_TYPE_BITS = {"Breakfast": 1, "Lunch": 2, "Dinner": 4}
+
+LockInfo = Dict[str, Any]  # recipe_id, manual, default, lock_type, text
+LockedMealsDict = Dict[str, LockInfo]  # slot_id -> lock_info
+PlanIdsDict = Dict[str, Dict[str, Optional[Dict[str, Any]]]]  # day -> meal_type -> slot
+
+
+class RecipeCandidate(NamedTuple):
+    """What plan generation needs to know about a recipe."""
+
+    id: int
+    servings: int
+    meal_mask: int
+
+
+class CandidateSnapshot(NamedTuple):
+    """Immutable planning candidates for one recipe catalog version."""
+
+    key: Optional[Tuple[str, int]]
+    by_id: Mapping[int, RecipeCandidate]
+    by_meal_type: Mapping[str, Tuple[RecipeCandidate, ...]]
+
+    def __reduce__(self):
+        # Read-only mappings do not pickle; worker processes rebuild them
+        return build_candidate_snapshot, (tuple(self.by_id.values()), self.key)
+
+
+def build_candidate_snapshot(
+    candidates: Iterable[RecipeCandidate], key: Optional[Tuple[str, int]] = None
+) -> CandidateSnapshot:
+    """Indexes candidates by id and by meal type."""
+    candidates = list(candidates)
+    return CandidateSnapshot(
+        key=key,
+        by_id=MappingProxyType({c.id: c for c in candidates}),
+        by_meal_type=MappingProxyType(
+            {
+                meal_type: tuple(c for c in candidates if c.meal_mask & bit)
+                for meal_type, bit in MEAL_TYPE_BITS.items()
+            }
+        ),
+    )
+
+
+class IngredientIndex:
+    """
+    Inverted index from canonical ingredient key to the recipes using it,
+    so scoring against a pantry only touches the recipes that share an
+    ingredient with it.
+    """
+
+    def __init__(
+        self,
+        recipe_ingredients: Mapping[int, Iterable[Hashable]],
+        key: Optional[Tuple[str, int]] = None,
+    ) -> None:
+        self.key = key
+        self.postings: Dict[Hashable, List[int]] = defaultdict(list)
+        self.sizes: Dict[int, int] = {}
+        for recipe_id, ingredients in recipe_ingredients.items():
+            ingredients = set(ingredients)
+            self.sizes[recipe_id] = len(ingredients)
+            for ingredient in ingredients:
+                self.postings[ingredient].append(recipe_id)
+
+    def pantry_coverage(self, stock: Iterable[Hashable]) -> Dict[int, float]:
+        """
+        Fraction of each recipe's ingredients found in stock. Recipes
+        sharing nothing with the stock are left out.
+        """
+        hits: Dict[int, int] = defaultdict(int)
+        for ingredient in set(stock):
+            for recipe_id in self.postings.get(ingredient, ()):
+                hits[recipe_id] += 1
+        return {recipe_id: count / self.sizes[recipe_id] for recipe_id, count in hits.items()}
+
+
+def rank_by_score(
+    candidates: Iterable[RecipeCandidate], scores: Mapping[int, float], rng: random.Random
+) -> List[int]:
+    """Ids of the scored candidates, best first (ties in random order)."""
+    scored = [(-scores[c.id], rng.random(), c.id) for c in candidates if scores.get(c.id, 0) > 0]
+    return [recipe_id for _, _, recipe_id in sorted(scored)]
+
+
+def parse_nutrient_targets(value: Optional[str]) -> Tuple[Tuple[str, float], ...]:
+    """
+    Nutrient targets stored as JSON ({"protein_g": 50}) as sorted
+    (nutrient, amount) pairs; invalid JSON and non-positive or
+    non-numeric amounts are dropped.
+    """
+    try:
+        targets = json.loads(value) if value else {}
+    except (TypeError, ValueError):
+        return ()
+    if not isinstance(targets, dict):
+        return ()
+    pairs = []
+    for nutrient, amount in targets.items():
+        try:
+            amount = float(amount)
+        except (TypeError, ValueError):
+            continue
+        if amount > 0:
+            pairs.append((str(nutrient), amount))
+    return tuple(sorted(pairs))
+
+
+class PlanSettings(NamedTuple):
+    """The account settings plan generation depends on."""
+
+    default_breakfast_id: Optional[int] = None
+    default_lunch_id: Optional[int] = None
+    default_dinner_id: Optional[int] = None
+    meal_repeat_interval: int = 0
+    planning_mode: str = PLANNING_MODE_RANDOM
+    weekly_budget: Optional[float] = None
+    # Daily per-person minimums, as sorted (nutrient, amount) pairs
+    nutrient_targets: Tuple[Tuple[str, float], ...] = ()
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "PlanSettings":
+        """Copies the planning fields from an AccountSettings row (or None)."""
+        return cls(
+            default_breakfast_id=getattr(settings, "default_breakfast_id", None),
+            default_lunch_id=getattr(settings, "default_lunch_id", None),
+            default_dinner_id=getattr(settings, "default_dinner_id", None),
+            meal_repeat_interval=getattr(settings, "meal_repeat_interval", 0) or 0,
+            planning_mode=getattr(settings, "planning_mode", None)
+            or PLANNING_MODE_RANDOM,
+            weekly_budget=getattr(settings, "weekly_budget", None),
+            nutrient_targets=parse_nutrient_targets(
+                getattr(settings, "nutrient_targets", None)
+            ),
+        )
+
+    def default_for(self, meal_type: str) -> Optional[int]:
+        return {
+            "Breakfast": self.default_breakfast_id,
+            "Lunch": self.default_lunch_id,
+            "Dinner": self.default_dinner_id,
+        }.get(meal_type)
+
+
+class PlanResult(NamedTuple):
+    """
+    A generated plan. lock_changes holds the leftover locks to persist
+    (slot_id -> lock_info), warnings the messages to show the user and
+    leftover_sources the slot each generated leftover slot comes from.
+    """
+
+    plan_ids: PlanIdsDict
+    lock_changes: Dict[str, LockInfo]
+    warnings: List[str]
+    leftover_sources: Dict[str, str]
+
+
+class RecipePool:
+    """
+    Candidates for one meal type that can be picked at random, excluded
+    and restored in O(1): excluding swaps the candidate with the last one
+    and pops it, so the pickable list never has to be rebuilt.
+    """
+
+    def __init__(self, candidates: Iterable[RecipeCandidate]) -> None:
+        self._items: List[RecipeCandidate] = list(candidates)
+        self._positions: Dict[int, int] = {c.id: i for i, c in enumerate(self._items)}
+        self._excluded: Dict[int, RecipeCandidate] = {}
+        self._banned: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, recipe_id: int) -> bool:
+        return recipe_id in self._positions
+
+    def pick(self, rng: random.Random) -> Optional[RecipeCandidate]:
+        if not self._items:
+            return None
+        return self._items[rng.randrange(len(self._items))]
+
+    def pick_ranked(self, ranked: Sequence[int], used: Set[int]) -> Optional[RecipeCandidate]:
+        """The first ranked candidate that is pickable and not in used."""
+        for recipe_id in ranked:
+            if recipe_id not in used and recipe_id in self._positions:
+                return self._items[self._positions[recipe_id]]
+        return None
+
+    def exclude(self, recipe_id: int) -> None:
+        index = self._positions.pop(recipe_id, None)
+        if index is None:
+            return
+        candidate = self._items[index]
+        last = self._items.pop()
+        if last.id != recipe_id:
+            self._items[index] = last
+            self._positions[last.id] = index
+        self._excluded[recipe_id] = candidate
+
+    def restore(self, recipe_id: int) -> None:
+        candidate = self._excluded.pop(recipe_id, None)
+        if candidate is None or recipe_id in self._banned:
+            return
+        self._positions[recipe_id] = len(self._items)
+        self._items.append(candidate)
+
+    def ban(self, recipe_id: int) -> None:
+        """Excludes a candidate for good (restore() will not bring it back)."""
+        self._banned.add(recipe_id)
+        self.exclude(recipe_id)
+
+
+class RepeatWindow:
+    """
+    Enforces meal_repeat_interval for one meal type: a recipe served on
+    day d is excluded from the pool until day d + interval. Locked slots
+    are reserved ahead of time as well, so a recipe locked on day L is not
+    picked at random within interval days on either side of it. Every
+    entry is added and released once, so advancing a day is amortized O(1).
+    """
+
+    def __init__(self, pool: RecipePool, interval: int) -> None:
+        self.pool = pool
+        self.interval = max(interval or 0, 0)
+        self._served: deque = deque()  # (release_day, recipe_id)
+        self._held: deque = deque()  # (release_day, recipe_id) from locks
+        self._reserved: deque = deque()  # (activate_day, release_day, recipe_id)
+        self._counts: Dict[int, int] = defaultdict(int)
+
+    def reserve(self, locks: Iterable[Tuple[int, int]]) -> None:
+        """Registers (day_index, recipe_id) locks, in day order."""
+        if not self.interval:
+            return
+        for day_index, recipe_id in sorted(locks):
+            self._reserved.append(
+                (day_index - self.interval + 1, day_index + self.interval, recipe_id)
+            )
+
+    def advance(self, day_index: int) -> None:
+        """Moves the window to day_index, releasing and activating entries."""
+        for queue in (self._served, self._held):
+            while queue and queue[0][0] <= day_index:
+                self._release(queue.popleft()[1])
+        while self._reserved and self._reserved[0][0] <= day_index:
+            _, release_day, recipe_id = self._reserved.popleft()
+            self._held.append((release_day, recipe_id))
+            self._hold(recipe_id)
+
+    def serve(self, day_index: int, recipe_id: int) -> None:
+        """Records a recipe served on day_index (excluded for interval days)."""
+        if not self.interval:
+            return
+        self._served.append((day_index + self.interval, recipe_id))
+        self._hold(recipe_id)
+
+    def least_recent(self) -> Optional[int]:
+        """Oldest recipe still in the window; the fallback when the pool is empty."""
+        return self._served[0][1] if self._served else None
+
+    def _hold(self, recipe_id: int) -> None:
+        self._counts[recipe_id] += 1
+        if self._counts[recipe_id] == 1:
+            self.pool.exclude(recipe_id)
+
+    def _release(self, recipe_id: int) -> None:
+        self._counts[recipe_id] -= 1
+        if self._counts[recipe_id] == 0:
+            del self._counts[recipe_id]
+            self.pool.restore(recipe_id)
+
+
+def get_next_day(current_day: str, days: List[str]) -> Optional[str]:
+    """Helper to get the next day name in the week list."""
+    try:
+        idx = days.index(current_day)
+    except ValueError:
+        return None
+    if idx + 1 < len(days):
+        return days[idx + 1]
+    return None
+
+
+def day_label(day: str) -> str:
+    """How a plan day reads in leftover notes: 'Monday 19 October' for a date key."""
+    try:
+        day_date = datetime.date.fromisoformat(day)
+    except ValueError:
+        return day
+    return f"{day_date:%A} {day_date.day} {day_date:%B}"
+
+
+def plan_leftovers(
+    plan_ids: PlanIdsDict,
+    current_day: str,
+    meal_type: str,
+    leftovers: int,
+    num_people: int,
+    current_recipe_id: int,
+    days: List[str],
+) -> Dict[str, LockInfo]:
+    """
+    Assign leftover servings to subsequent meal slots of plan_ids and
+    return the leftover locks for those slots.
+    """
+    locks: Dict[str, LockInfo] = {}
+    next_day = get_next_day(current_day, days)
+    while leftovers >= num_people and next_day:
+        slot_info = plan_ids.get(next_day, {}).get(meal_type)
+
+        # Skip if slot exists and is locked (user or default)
+        if slot_info is not None:
+            if (
+                slot_info.get("locked_by_main", False)
+                or slot_info.get("locked_by_user", False)
+                or slot_info.get("default_lock", False)
+            ):
+                next_day = get_next_day(next_day, days)
+                continue
+
+        leftover_label = (
+            f"Leftover from {day_label(current_day)}'s {meal_type.lower()}"
+        )
+        plan_ids[next_day][meal_type] = {
+            "recipe_id": current_recipe_id,
+            "status": "leftover",
+            "manual_text": leftover_label,
+            "locked_by_main": False,
+            "locked_by_user": False,
+            "leftover_of": f"{current_day}_{meal_type}",
+        }
+        locks[f"{next_day}_{meal_type}"] = {
+            "recipe_id": current_recipe_id,
+            "manual": False,
+            "default": False,
+            "lock_type": "leftover",
+            "text": leftover_label,
+        }
+
+        leftovers -= num_people
+        next_day = get_next_day(next_day, days)
+
+    return locks
+
+
+def plan_manual_leftovers(
+    candidates: CandidateSnapshot,
+    plan_ids: PlanIdsDict,
+    locked_meals: LockedMealsDict,
+    num_people: int,
+    days: List[str],
+) -> Dict[str, LockInfo]:
+    """
+    Apply leftover logic for manually added recipes to plan_ids and return
+    the leftover locks it produced.
+    """
+    locks: Dict[str, LockInfo] = {}
+    for slot_id, lock_info in locked_meals.items():
+        recipe_id = lock_info.get("recipe_id")
+        if not lock_info.get("manual") or not recipe_id or recipe_id <= 0:
+            continue
+        day, meal_type = slot_id.split("_")
+        recipe = candidates.by_id.get(recipe_id)
+        if not recipe:
+            continue
+        plan_ids.setdefault(day, {})[meal_type] = {
+            "recipe_id": recipe_id,
+            "status": "locked",
+            "locked_by_main": True,
+            "manual_text": lock_info.get("text"),
+        }
+        leftovers = (recipe.servings or 0) - num_people
+        if leftovers >= num_people:
+            locks.update(
+                plan_leftovers(
+                    plan_ids, day, meal_type, leftovers, num_people, recipe_id, days
+                )
+            )
+    return locks
+
+
+def leftover_days(servings: Optional[int], num_people: int) -> int:
+    """How many leftover slots plan_leftovers fills after cooking a recipe."""
+    if not servings or not isinstance(num_people, int) or num_people <= 0:
+        return 0
+    leftovers = servings - num_people
+    return leftovers // num_people if leftovers >= num_people else 0
+
+
+def _repeat_windows(
+    candidates: CandidateSnapshot, settings: PlanSettings
+) -> Dict[str, RepeatWindow]:
+    """One repeat-interval window over a fresh candidate pool per meal type."""
+    windows: Dict[str, RepeatWindow] = {}
+    default_breakfast_id = settings.default_breakfast_id
+    for meal_type in MEAL_TYPES:
+        pool = RecipePool(candidates.by_meal_type.get(meal_type, ()))
+        # Avoid choosing default breakfast if other breakfast options exist
+        if meal_type == "Breakfast" and default_breakfast_id and len(pool) > 1:
+            pool.ban(int(default_breakfast_id))
+        windows[meal_type] = RepeatWindow(pool, settings.meal_repeat_interval)
+    return windows
+
+
+def _serve_history(
+    windows: Dict[str, RepeatWindow],
+    history: Optional[List[Dict[str, Optional[int]]]],
+) -> None:
+    for offset, served in enumerate(history or []):
+        for meal_type, recipe_id in served.items():
+            if meal_type in windows and recipe_id and recipe_id > 0:
+                windows[meal_type].serve(offset - len(history), recipe_id)
+
+
+def _choose_recipe(
+    candidates: CandidateSnapshot,
+    meal_type: str,
+    window: RepeatWindow,
+    ranked: Optional[List[int]],
+    used: Set[int],
+    rng: random.Random,
+) -> RecipeCandidate:
+    """
+    The best-ranked unused recipe or a random one outside the repeat
+    window; if every candidate is inside it, the least recently served one.
+    The meal type must have candidates.
+    """
+    chosen = window.pool.pick_ranked(ranked, used) if ranked else None
+    if chosen is None:
+        chosen = window.pool.pick(rng)
+    if chosen is None:
+        fallback_id = window.least_recent()
+        if fallback_id is not None:
+            chosen = candidates.by_id[fallback_id]
+        else:
+            chosen = rng.choice(candidates.by_meal_type[meal_type])
+    return chosen
+
+
+def plan_meals(
+    candidates: CandidateSnapshot,
+    settings: PlanSettings,
+    locked_meals: LockedMealsDict,
+    num_people: int,
+    days: Optional[List[str]] = None,
+    rng: Optional[random.Random] = None,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+    scores: Optional[Mapping[int, float]] = None,
+) -> PlanResult:
+    """
+    Generates a meal plan for the specified days, considering locked meals
+    and the account's default recipe for each meal type. If days is None,
+    defaults to all 7 days (Monday-Sunday).
+
+    Random picks come from rng and honour settings.meal_repeat_interval.
+    history lists the recipes served on the days just before the plan
+    (oldest first, as {meal_type: recipe_id}), so the interval also holds
+    across the boundary with a previous plan. Nothing outside the returned
+    PlanResult is modified.
+
+    scores (recipe_id -> preference, e.g. IngredientIndex.pantry_coverage)
+    switches random picks to ranked ones: each slot takes the best-scoring
+    recipe the repeat window allows that the plan has not used yet, and
+    falls back to a random pick once the scored recipes run out.
+    """
+    rng = rng if rng is not None else random.Random()
+    days = list(days) if days is not None else list(WEEK_DAYS)
+    plan_ids: PlanIdsDict = {
+        day: {meal_type: None for meal_type in MEAL_TYPES} for day in days
+    }
+    lock_changes: Dict[str, LockInfo] = {}
+    warnings: List[str] = []
+    leftover_sources: Dict[str, str] = {}
+
+    # Apply defaults for each meal type if not locked
+    for day in days:
+        for meal_type in MEAL_TYPES:
+            default_id = settings.default_for(meal_type)
+            if f"{day}_{meal_type}" not in locked_meals and default_id:
+                plan_ids[day][meal_type] = {
+                    "recipe_id": int(default_id),
+                    "status": "locked",
+                    "locked_by_main": False,
+                    "default_lock": True,
+                }
+
+    # Handle locked meals
+    for slot_id, lock_info in locked_meals.items():
+        try:
+            day, meal_type = slot_id.split("_", 1)
+        except ValueError:
+            day = meal_type = None
+        if day not in days or meal_type not in MEAL_TYPES:
+            logger.warning(f"Invalid slot_id format in locked_meals: {slot_id}")
+            continue  # Skip malformed slot_id
+
+        if isinstance(lock_info, dict) and "recipe_id" in lock_info:
+            recipe_id = lock_info["recipe_id"]
+            # Handle manual entry lock (-1)
+            if recipe_id == -1:
+                plan_ids[day][meal_type] = {
+                    "recipe_id": -1,
+                    "manual_text": lock_info.get("text", "Manual Entry"),
+                    "status": "locked",
+                    "locked_by_main": True,  # User explicitly set this
+                }
+            elif recipe_id is not None:
+                # Check if the locked recipe actually exists
+                if recipe_id in candidates.by_id:
+                    if lock_info.get("lock_type") == "leftover":
+                        # Leftover slots are not treated as locked
+                        plan_ids[day][meal_type] = {
+                            "recipe_id": recipe_id,
+                            "status": "leftover",
+                            "manual_text": lock_info.get("text"),
+                            "locked_by_main": False,
+                            "locked_by_user": False,
+                            "leftover_of": lock_info.get("source"),
+                        }
+                    else:
+                        plan_ids[day][meal_type] = {
+                            "recipe_id": recipe_id,
+                            "status": "locked",
+                            "locked_by_main": True,  # User explicitly locked this
+                            "default_lock": False,  # Overrides default if applicable
+                        }
+                else:
+                    # Locked recipe doesn't exist (maybe deleted)
+                    warnings.append(
+                        f"Locked recipe ID {recipe_id} for {slot_id} not found in database. Lock ignored."
+                    )
+                    if (
+                        plan_ids[day][meal_type]
+                        and plan_ids[day][meal_type].get("recipe_id") == recipe_id
+                    ):
+                        plan_ids[day][meal_type] = None
+
+    recipes_by_type = candidates.by_meal_type
+
+    # Ranked candidates per meal type when picking by score
+    ranked: Dict[str, List[int]] = {
+        meal_type: rank_by_score(recipes_by_type.get(meal_type, ()), scores, rng)
+        for meal_type in MEAL_TYPES
+    } if scores else {}
+    used: Dict[str, Set[int]] = defaultdict(set)
+
+    # --- Repeat-interval windows, one candidate pool per meal type ---
+    windows = _repeat_windows(candidates, settings)
+    for meal_type in MEAL_TYPES:
+        windows[meal_type].reserve(
+            (day_index, info["recipe_id"])
+            for day_index, day in enumerate(days)
+            for info in [plan_ids[day][meal_type]]
+            if info
+            and info.get("locked_by_main")
+            and (info.get("recipe_id") or 0) > 0
+        )
+    _serve_history(windows, history)
+
+    # --- Main Generation Loop ---
+    for day_index, day in enumerate(days):
+        for meal_type in MEAL_TYPES:
+            window = windows[meal_type]
+            window.advance(day_index)
+
+            # Skip if slot is already filled (by locks or previous leftover assignment)
+            if plan_ids[day][meal_type] is not None:
+                continue
+
+            available_recipes = recipes_by_type.get(meal_type, ())
+            if not available_recipes:
+                # No recipes available for this meal type
+                plan_ids[day][meal_type] = {
+                    "recipe_id": None,
+                    "status": "empty",
+                    "locked_by_main": False,
+                }
+                continue
+
+            chosen_recipe = _choose_recipe(
+                candidates,
+                meal_type,
+                window,
+                ranked.get(meal_type),
+                used[meal_type],
+                rng,
+            )
+            window.serve(day_index, chosen_recipe.id)
+            used[meal_type].add(chosen_recipe.id)
+            plan_ids[day][meal_type] = {
+                "recipe_id": chosen_recipe.id,
+                "status": "new",
+                "locked_by_main": False,
+            }
+
+            # Calculate and assign leftovers
+            servings = chosen_recipe.servings
+            if servings is not None and isinstance(num_people, int) and num_people > 0:
+                leftovers = servings - num_people
+                if leftovers >= num_people:
+                    locks = plan_leftovers(
+                        plan_ids,
+                        day,
+                        meal_type,
+                        leftovers,
+                        num_people,
+                        chosen_recipe.id,
+                        days,
+                    )
+                    lock_changes.update(locks)
+                    leftover_sources.update(
+                        (slot_id, f"{day}_{meal_type}") for slot_id in locks
+                    )
+
+    return PlanResult(plan_ids, lock_changes, warnings, leftover_sources)
+
+
+Slot = Tuple[int, str]  # (day index, meal type)
+
+
+class SlotSwaps:
+    """
+    The slots of a generated plan that a plan improver (a budget, nutrient
+    targets) may re-pick, on a copy of the plan.
+
+    Only randomly chosen ("new") slots are swappable; locked, default,
+    manual and leftover slots never change. A slot only takes a recipe of
+    the same meal type that leaves the same number of leftover slots, so
+    generated leftovers stay where they are and follow their source, and
+    options() leaves out recipes picked for the same meal type within
+    meal_repeat_interval days (anywhere in the plan or history when no
+    interval is set). eligible narrows the candidates further.
+    """
+
+    def __init__(
+        self,
+        result: PlanResult,
+        candidates: CandidateSnapshot,
+        settings: PlanSettings,
+        num_people: int,
+        history: Optional[List[Dict[str, Optional[int]]]] = None,
+        eligible: Optional[Callable[[RecipeCandidate], bool]] = None,
+    ) -> None:
+        self.plan_ids = {
+            day: {
+                meal_type: dict(slot) if slot else slot
+                for meal_type, slot in meals.items()
+            }
+            for day, meals in result.plan_ids.items()
+        }
+        self.lock_changes = {
+            slot_id: dict(info) for slot_id, info in result.lock_changes.items()
+        }
+        self.warnings = list(result.warnings)
+        self.leftover_sources = dict(result.leftover_sources)
+        self.followers: Dict[str, List[str]] = defaultdict(list)
+        for slot_id, source in self.leftover_sources.items():
+            self.followers[source].append(slot_id)
+        self.days = list(self.plan_ids)
+        history = history or []
+        self._window = settings.meal_repeat_interval or len(self.days) + len(history)
+
+        # Recipes cooked in the plan and served in the history days before it
+        self.picks: Dict[Slot, int] = {}
+        for day_index, day in enumerate(self.days):
+            for meal_type, slot in self.plan_ids[day].items():
+                recipe_id = slot.get("recipe_id") if slot else None
+                if recipe_id and recipe_id > 0 and slot.get("status") != "leftover":
+                    self.picks[(day_index, meal_type)] = recipe_id
+        self._served_before: Dict[Slot, int] = {
+            (offset - len(history), meal_type): recipe_id
+            for offset, served in enumerate(history)
+            for meal_type, recipe_id in served.items()
+            if recipe_id and recipe_id > 0
+        }
+
+        default_breakfast_id = settings.default_breakfast_id
+        groups: Dict[Tuple[str, int], List[int]] = {}
+        self.free: Dict[Slot, List[int]] = {}
+        for (day_index, meal_type), recipe_id in self.picks.items():
+            if self.plan_ids[self.days[day_index]][meal_type].get("status") != "new":
+                continue
+            group_key = (
+                meal_type,
+                leftover_days(candidates.by_id[recipe_id].servings, num_people),
+            )
+            if group_key not in groups:
+                pool = candidates.by_meal_type.get(meal_type, ())
+                groups[group_key] = [
+                    c.id
+                    for c in pool
+                    if leftover_days(c.servings, num_people) == group_key[1]
+                    and (eligible is None or eligible(c))
+                    # Same rule as plan_meals: skip the default breakfast
+                    and not (
+                        meal_type == "Breakfast"
+                        and default_breakfast_id
+                        and len(pool) > 1
+                        and c.id == int(default_breakfast_id)
+                    )
+                ]
+            self.free[(day_index, meal_type)] = groups[group_key]
+
+    def servings(self, slot: Slot) -> int:
+        """Meals a slot's recipe feeds each person: the slot and its leftovers."""
+        day_index, meal_type = slot
+        return 1 + len(self.followers.get(f"{self.days[day_index]}_{meal_type}", ()))
+
+    def options(self, slot: Slot) -> List[int]:
+        """Recipes the slot may take without breaking the repeat interval."""
+        day_index, meal_type = slot
+        nearby = range(day_index - self._window + 1, day_index + self._window)
+        taken = {
+            self.picks.get((other, meal_type))
+            or self._served_before.get((other, meal_type))
+            for other in nearby
+            if other != day_index
+        }
+        return [recipe_id for recipe_id in self.free[slot] if recipe_id not in taken]
+
+    def swap(self, slot: Slot, recipe_id: int) -> None:
+        self.picks[slot] = recipe_id
+
+    def trade(self, slot: Slot, other: Slot) -> bool:
+        """
+        Exchanges the recipes of two swappable slots when both may take
+        the other's recipe; returns whether they were exchanged.
+        """
+        mine, theirs = self.picks[slot], self.picks[other]
+        if theirs not in self.free[slot] or mine not in self.free[other]:
+            return False
+        self.picks[slot], self.picks[other] = theirs, mine
+        if theirs in self.options(slot) and mine in self.options(other):
+            return True
+        self.picks[slot], self.picks[other] = mine, theirs
+        return False
+
+    def result(self) -> PlanResult:
+        """The plan with the swaps applied, leftovers following their source."""
+        for day_index, meal_type in self.free:
+            day = self.days[day_index]
+            recipe_id = self.picks[(day_index, meal_type)]
+            self.plan_ids[day][meal_type]["recipe_id"] = recipe_id
+            for slot_id in self.followers.get(f"{day}_{meal_type}", ()):
+                follower_day, follower_meal_type = slot_id.split("_", 1)
+                self.plan_ids[follower_day][follower_meal_type]["recipe_id"] = recipe_id
+                self.lock_changes[slot_id]["recipe_id"] = recipe_id
+        return PlanResult(
+            self.plan_ids, self.lock_changes, self.warnings, self.leftover_sources
+        )
+
+
+def date_slot_id(day: datetime.date, meal_type: str) -> str:
+    """Slot ID of a dated plan, e.g. '2026-10-19_Dinner'."""
+    return f"{day.isoformat()}_{meal_type}"
+
+
+class PlanDay(NamedTuple):
+    """One day of a dated plan: meal_type -> slot, shaped like plan_ids slots."""
+
+    date: datetime.date
+    meals: Dict[str, Optional[Dict[str, Any]]]
+
+
+class _PendingLeftovers(NamedTuple):
+    recipe_id: int
+    slots: int
+    label: str
+    source: str
+
+
+def iter_plan_days(
+    candidates: CandidateSnapshot,
+    settings: PlanSettings,
+    num_people: int,
+    start: datetime.date,
+    num_days: Optional[int] = None,
+    locked_meals: Optional[LockedMealsDict] = None,
+    rng: Optional[random.Random] = None,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+    scores: Optional[Mapping[int, float]] = None,
+    scores_from: Optional[datetime.date] = None,
+) -> Iterator[PlanDay]:
+    """
+    Plans day after day from start, yielding each PlanDay as soon as it is
+    decided; num_days=None never stops (slice with itertools.islice). Same
+    rules as plan_meals, but keyed by date so plans longer than a week do
+    not collide on weekday names: locked_meals uses date_slot_id keys, and
+    leftovers and repeat-interval windows carry over from one day to the
+    next. Only the pending leftovers and the window of the last
+    meal_repeat_interval days are kept, so a multi-month plan can be
+    streamed to storage or an export in constant memory. scores only rank
+    the picks from scores_from on (default start), so a plan week that
+    began before today keeps its best-ranked recipes for the days to come.
+    """
+    rng = rng if rng is not None else random.Random()
+    locked_meals = locked_meals or {}
+    interval = settings.meal_repeat_interval
+    windows = _repeat_windows(candidates, settings)
+    _serve_history(windows, history)
+    ranked: Dict[str, List[int]] = {}
+    if scores:
+        ranked = {
+            meal_type: rank_by_score(
+                candidates.by_meal_type.get(meal_type, ()), scores, rng
+            )
+            for meal_type in MEAL_TYPES
+        }
+    used: Dict[str, Set[int]] = defaultdict(set)
+    pending: Dict[str, _PendingLeftovers] = {}
+
+    def lock_at(day_index: int, meal_type: str) -> Optional[LockInfo]:
+        day = start + datetime.timedelta(days=day_index)
+        lock_info = locked_meals.get(date_slot_id(day, meal_type))
+        recipe_id = lock_info.get("recipe_id") if lock_info else None
+        if recipe_id is None:
+            return None
+        if recipe_id != -1 and recipe_id not in candidates.by_id:
+            return None
+        return lock_info
+
+    # Locks are reserved in the window once they are interval days ahead
+    reserved_through = -1
+    day_index = 0
+    while num_days is None or day_index < num_days:
+        day = start + datetime.timedelta(days=day_index)
+        if interval:
+            for ahead in range(reserved_through + 1, day_index + interval):
+                if num_days is not None and ahead >= num_days:
+                    break
+                for meal_type in MEAL_TYPES:
+                    lock_info = lock_at(ahead, meal_type)
+                    if (
+                        lock_info
+                        and lock_info.get("lock_type") != "leftover"
+                        and lock_info["recipe_id"] > 0
+                    ):
+                        windows[meal_type].reserve([(ahead, lock_info["recipe_id"])])
+                reserved_through = ahead
+
+        meals: Dict[str, Optional[Dict[str, Any]]] = {}
+        for meal_type in MEAL_TYPES:
+            window = windows[meal_type]
+            window.advance(day_index)
+            slot_id = date_slot_id(day, meal_type)
+            lock_info = lock_at(day_index, meal_type)
+            if slot_id in locked_meals and lock_info is None:
+                logger.warning(
+                    f"Locked recipe for {slot_id} not found in database. Lock ignored."
+                )
+            default_id = settings.default_for(meal_type)
+            leftovers = pending.get(meal_type)
+
+            if lock_info and lock_info["recipe_id"] == -1:
+                meals[meal_type] = {
+                    "recipe_id": -1,
+                    "manual_text": lock_info.get("text", "Manual Entry"),
+                    "status": "locked",
+                    "locked_by_main": True,
+                }
+            elif lock_info and lock_info.get("lock_type") != "leftover":
+                meals[meal_type] = {
+                    "recipe_id": lock_info["recipe_id"],
+                    "status": "locked",
+                    "locked_by_main": True,
+                    "default_lock": False,
+                }
+            elif lock_info is None and slot_id not in locked_meals and default_id:
+                meals[meal_type] = {
+                    "recipe_id": int(default_id),
+                    "status": "locked",
+                    "locked_by_main": False,
+                    "default_lock": True,
+                }
+            elif leftovers:
+                # Leftovers fill the next free slots of their meal type
+                meals[meal_type] = {
+                    "recipe_id": leftovers.recipe_id,
+                    "status": "leftover",
+                    "manual_text": leftovers.label,
+                    "locked_by_main": False,
+                    "locked_by_user": False,
+                    "leftover_of": leftovers.source,
+                }
+                if leftovers.slots > 1:
+                    pending[meal_type] = leftovers._replace(slots=leftovers.slots - 1)
+                else:
+                    del pending[meal_type]
+            elif lock_info:
+                meals[meal_type] = {
+                    "recipe_id": lock_info["recipe_id"],
+                    "status": "leftover",
+                    "manual_text": lock_info.get("text"),
+                    "locked_by_main": False,
+                    "locked_by_user": False,
+                    "leftover_of": lock_info.get("source"),
+                }
+            elif not candidates.by_meal_type.get(meal_type):
+                meals[meal_type] = {
+                    "recipe_id": None,
+                    "status": "empty",
+                    "locked_by_main": False,
+                }
+            else:
+                ranked_ids = (
+                    ranked.get(meal_type)
+                    if scores_from is None or day >= scores_from
+                    else None
+                )
+                chosen = _choose_recipe(
+                    candidates,
+                    meal_type,
+                    window,
+                    ranked_ids,
+                    used[meal_type],
+                    rng,
+                )
+                window.serve(day_index, chosen.id)
+                used[meal_type].add(chosen.id)
+                meals[meal_type] = {
+                    "recipe_id": chosen.id,
+                    "status": "new",
+                    "locked_by_main": False,
+                }
+                slots = leftover_days(chosen.servings, num_people)
+                if slots:
+                    label = f"Leftover from {day_label(day.isoformat())}'s"
+                    pending[meal_type] = _PendingLeftovers(
+                        chosen.id, slots, f"{label} {meal_type.lower()}", slot_id
+                    )
+        yield PlanDay(day, meals)
+        day_index += 1
+
+
+def plan_dated_meals(
+    candidates: CandidateSnapshot,
+    settings: PlanSettings,
+    locked_meals: LockedMealsDict,
+    num_people: int,
+    start: datetime.date,
+    num_days: int,
+    rng: Optional[random.Random] = None,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+    scores: Optional[Mapping[int, float]] = None,
+    scores_from: Optional[datetime.date] = None,
+) -> PlanResult:
+    """
+    The num_days days from start planned by iter_plan_days, collected into
+    a PlanResult keyed by ISO date (slot IDs from date_slot_id), so the
+    plan improvers work on it as on plan_meals output. Leftover slots of
+    recipes picked here get leftover locks and leftover_sources entries;
+    locks whose recipe no longer exists are reported in the warnings.
+    """
+    days = [
+        (start + datetime.timedelta(days=offset)).isoformat()
+        for offset in range(num_days)
+    ]
+    warnings: List[str] = []
+    for slot_id, lock_info in locked_meals.items():
+        recipe_id = lock_info.get("recipe_id") if lock_info else None
+        if (
+            slot_id.partition("_")[0] in days
+            and recipe_id not in (None, -1)
+            and recipe_id not in candidates.by_id
+        ):
+            warnings.append(
+                f"Locked recipe ID {recipe_id} for {slot_id} not found in database. Lock ignored."
+            )
+    plan_ids: PlanIdsDict = {}
+    lock_changes: Dict[str, LockInfo] = {}
+    leftover_sources: Dict[str, str] = {}
+    for plan_day in iter_plan_days(
+        candidates,
+        settings,
+        num_people,
+        start,
+        num_days,
+        locked_meals=locked_meals,
+        rng=rng,
+        history=history,
+        scores=scores,
+        scores_from=scores_from,
+    ):
+        plan_ids[plan_day.date.isoformat()] = plan_day.meals
+        for meal_type, slot in plan_day.meals.items():
+            source = slot.get("leftover_of") if slot["status"] == "leftover" else None
+            if not source:
+                continue
+            source_day, _, source_meal_type = source.partition("_")
+            source_slot = plan_ids.get(source_day, {}).get(source_meal_type)
+            if not source_slot or source_slot["status"] != "new":
+                continue  # carried over from a lock, which stays as it is
+            slot_id = date_slot_id(plan_day.date, meal_type)
+            leftover_sources[slot_id] = source
+            lock_changes[slot_id] = {
+                "recipe_id": slot["recipe_id"],
+                "manual": False,
+                "default": False,
+                "lock_type": "leftover",
+                "text": slot["manual_text"],
+            }
+    return PlanResult(plan_ids, lock_changes, warnings, leftover_sources)
+
+
+def carry_over_locks(
+    previous: PlanIdsDict, locked_meals: LockedMealsDict
+) -> Tuple[LockedMealsDict, List[str]]:
+    """
+    Splits locked_meals for re-planning on top of the previous plan.
+    Leftover locks stay only while the slot they come from (the
+    "leftover_of" of the previous plan's slot) is still locked to the same
+    recipe; the others are stale, and their slots are planned again.
+
+    Returns the locks to plan with, kept leftover locks carrying their
+    "source" slot, and the stale leftover slot IDs.
+    """
+    locks: LockedMealsDict = {}
+    stale: List[str] = []
+    for slot_id, lock_info in locked_meals.items():
+        if lock_info.get("lock_type") != "leftover":
+            locks[slot_id] = lock_info
+            continue
+        day, _, meal_type = slot_id.partition("_")
+        source = (previous.get(day, {}).get(meal_type) or {}).get("leftover_of")
+        source_lock = locked_meals.get(source) if source else None
+        if (
+            source_lock
+            and source_lock.get("lock_type") != "leftover"
+            and source_lock.get("recipe_id") == lock_info.get("recipe_id")
+        ):
+            locks[slot_id] = {**lock_info, "source": source}
+        else:
+            stale.append(slot_id)
+    return locks, stale
+
+
+def cooked_recipe_ids(plan_ids: PlanIdsDict) -> Set[int]:
+    """Unique recipe IDs the plan cooks (manual entries and leftovers excluded)."""
+    return {
+        slot["recipe_id"]
+        for meals in plan_ids.values()
+        for slot in meals.values()
+        if slot
+        and slot.get("recipe_id") not in (None, -1)
+        and slot.get("status") != "leftover"
+    }
+
+
+class SlotChange(NamedTuple):
+    """One slot that differs between two plans (None for a missing slot)."""
+
+    slot_id: str
+    before: Optional[Dict[str, Any]]
+    after: Optional[Dict[str, Any]]
+
+
+class PlanDiff(NamedTuple):
+    """
+    Slot-level difference between two plans, plus the recipes the new plan
+    starts and stops cooking: only their ingredients can change the
+    shopping list.
+    """
+
+    changes: List[SlotChange]
+    added_recipe_ids: Set[int]
+    removed_recipe_ids: Set[int]
+
+    @property
+    def changed_recipe_ids(self) -> Set[int]:
+        return self.added_recipe_ids | self.removed_recipe_ids
+
+
+def _slot_identity(slot: Optional[Dict[str, Any]]) -> Optional[Tuple[Any, ...]]:
+    if not slot:
+        return None
+    return (slot.get("recipe_id"), slot.get("status"), slot.get("manual_text"))
+
+
+def diff_plans(before: PlanIdsDict, after: PlanIdsDict) -> PlanDiff:
+    """Compares two plans slot by slot (recipe, status and manual text)."""
+    days = list(after) + [day for day in before if day not in after]
+    changes: List[SlotChange] = []
+    for day in days:
+        old_meals = before.get(day) or {}
+        new_meals = after.get(day) or {}
+        for meal_type in MEAL_TYPES:
+            old_slot, new_slot = old_meals.get(meal_type), new_meals.get(meal_type)
+            if _slot_identity(old_slot) != _slot_identity(new_slot):
+                changes.append(SlotChange(f"{day}_{meal_type}", old_slot, new_slot))
+    old_ids, new_ids = cooked_recipe_ids(before), cooked_recipe_ids(after)
+    return PlanDiff(changes, new_ids - old_ids, old_ids - new_ids)
+
+
+class PlanCacheKey(NamedTuple):
+    """Everything that determines a seeded plan (see plan_cache_key)."""
+
+    account_id: int
+    settings: PlanSettings
+    locks_hash: str
+    catalog_key: Tuple[str, int]
+    seed: int
+    days: Tuple[str, ...]
+    num_people: int
+    inputs_hash: str  # history, the stock in pantry mode, price and nutrient data
+
+
+def _fingerprint(value: Any) -> str:
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def plan_cache_key(
+    account_id: int,
+    settings: PlanSettings,
+    locked_meals: LockedMealsDict,
+    catalog_key: Tuple[str, int],
+    seed: int,
+    days: Iterable[str],
+    num_people: int,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+    stock: Optional[Iterable[Hashable]] = None,
+    data_versions: Optional[Iterable[Any]] = None,
+) -> PlanCacheKey:
+    """
+    Builds the PlanCache key for one plan_meals call. data_versions
+    identifies the other data the plan was fitted to (the price table
+    and nutrient data keys), so a plan is not reused once they change.
+    """
+    return PlanCacheKey(
+        account_id=account_id,
+        settings=settings,
+        locks_hash=_fingerprint(locked_meals),
+        catalog_key=catalog_key,
+        seed=seed,
+        days=tuple(days),
+        num_people=num_people,
+        inputs_hash=_fingerprint(
+            [
+                history or [],
+                sorted(map(str, stock)) if stock is not None else None,
+                list(data_versions) if data_versions is not None else None,
+            ]
+        ),
+    )
+
+
+class PlanCache:
+    """
+    Bounded LRU of seeded PlanResults, so an identical request returns the
+    same plan without planning again. Entries for an older recipe catalog
+    version are evicted as soon as a newer version is seen; a request
+    still on an older version (a stale worker) misses without evicting
+    anything and its plan is not stored. Results are copied in and out
+    because callers modify the plan they get back.
+    """
+
+    def __init__(self, max_size: int = 256) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[PlanCacheKey, PlanResult]" = OrderedDict()
+        self._catalog_key: Optional[Tuple[str, int]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: PlanCacheKey) -> Optional[PlanResult]:
+        with self._lock:
+            self._check_catalog(key.catalog_key)
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(result)
+
+    def put(self, key: PlanCacheKey, result: PlanResult) -> None:
+        with self._lock:
+            if not self._check_catalog(key.catalog_key):
+                return
+            self._entries[key] = copy.deepcopy(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _check_catalog(self, catalog_key: Tuple[str, int]) -> bool:
+        """
+        Evicts every entry when catalog_key is newer than the cached
+        version; False when it is older. A new token is a new database,
+        so it always counts as newer.
+        """
+        current = self._catalog_key
+        if current is not None and catalog_key[0] == current[0]:
+            if catalog_key[1] <= current[1]:
+                return catalog_key[1] == current[1]
+        self.evictions += len(self._entries)
+        self._entries.clear()
+        self._catalog_key = catalog_key
+        return True
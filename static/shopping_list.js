@@ -1,126 +1,362 @@
 // shopping_list.js
-// Handles live updates for checking/unchecking shopping list items
+// Keeps every open shopping list tab in sync using push-only Socket.IO deltas.
+// The server broadcasts small typed changes to the account's room and this
+// script patches the DOM in place. Missed changes are fetched as JSON rows
+// from /shopping-list/changes. Polling is only used as a slow fallback while
+// the socket is disconnected.
+
+const FALLBACK_POLL_INTERVAL_MS = 15000;
 
 document.addEventListener('DOMContentLoaded', function() {
+    const container = document.getElementById('shopping-list-container');
+    const CHANGES_URL = '/shopping-list/changes';
+    if (!container) {
+        // Script is loaded from base.html; nothing to do off the shopping list page
+        return;
+    }
+
     // Get CSRF token from meta tag
     const csrfToken = document.querySelector('meta[name="csrf-token"]').getAttribute('content');
-    
-    // Initialize Socket.IO
-    const socket = io();
-    
-    // Join shopping list room when page loads
-    socket.emit('join_shopping_list');
-    
-    // Handle item updates from other users
-    socket.on('item_updated', function(data) {
-        const checkbox = document.querySelector(`#item-${data.item_id}`);
-        const label = document.querySelector(`label[for="item-${data.item_id}"]`);
-        
-        if (checkbox && !checkbox.isUpdating && checkbox.checked !== data.is_checked) {
-            console.log('Received update for item:', data);
-            checkbox.checked = data.is_checked;
-            
-            if (label) {
-                if (data.is_checked) {
-                    label.classList.add('text-muted', 'text-decoration-line-through');
-                } else {
-                    label.classList.remove('text-muted', 'text-decoration-line-through');
+    let fallbackTimer = null;
+    // Version of the list this page reflects; every delta carries the version it produced
+    let currentVersion = parseInt(container.dataset.version || '0', 10);
+
+    // --- DOM helpers ---
+    function setLabelChecked(label, isChecked) {
+        if (!label) {
+            return;
+        }
+        if (isChecked) {
+            label.classList.add('text-muted', 'text-decoration-line-through');
+        } else {
+            label.classList.remove('text-muted', 'text-decoration-line-through');
+        }
+    }
+
+    function findItemRow(itemId) {
+        return container.querySelector(`li[data-item-id="${itemId}"]`);
+    }
+
+    function removeEmptyState() {
+        const emptyState = container.querySelector('.empty-state');
+        if (emptyState) {
+            emptyState.remove();
+        }
+    }
+
+    function buildItemRow(item) {
+        const li = document.createElement('li');
+        li.className = 'list-group-item d-flex justify-content-between align-items-center';
+        li.dataset.itemId = item.id;
+        li.dataset.name = item.name;
+
+        const formCheck = document.createElement('div');
+        formCheck.className = 'form-check';
+
+        const checkbox = document.createElement('input');
+        checkbox.className = 'form-check-input item-checkbox';
+        checkbox.type = 'checkbox';
+        checkbox.id = `item-${item.id}`;
+        checkbox.dataset.itemId = item.id;
+        checkbox.checked = !!item.is_checked;
+
+        const label = document.createElement('label');
+        label.className = 'form-check-label';
+        label.htmlFor = `item-${item.id}`;
+        let text = item.name;
+        if (item.quantity) {
+            text += ` (${item.quantity}${item.unit ? ' ' + item.unit : ''})`;
+        }
+        label.textContent = text;
+        setLabelChecked(label, item.is_checked);
+
+        formCheck.appendChild(checkbox);
+        formCheck.appendChild(label);
+
+        const deleteButton = document.createElement('button');
+        deleteButton.className = 'btn btn-sm btn-danger delete-item';
+        deleteButton.dataset.itemId = item.id;
+        deleteButton.innerHTML = '<i class="fas fa-trash"></i>';
+
+        li.appendChild(formCheck);
+        li.appendChild(deleteButton);
+        return li;
+    }
+
+    function findOrCreateAisleList(aisle) {
+        const cards = Array.from(container.querySelectorAll('.aisle-card'));
+        const existing = cards.find(card => card.dataset.aisle === aisle);
+        if (existing) {
+            return existing.querySelector('ul.list-group');
+        }
+
+        const card = document.createElement('div');
+        card.className = 'card mb-3 aisle-card';
+        card.dataset.aisle = aisle;
+        const header = document.createElement('div');
+        header.className = 'card-header';
+        const title = document.createElement('h5');
+        title.className = 'mb-0';
+        title.textContent = aisle;
+        header.appendChild(title);
+        const body = document.createElement('div');
+        body.className = 'card-body';
+        const list = document.createElement('ul');
+        list.className = 'list-group';
+        body.appendChild(list);
+        card.appendChild(header);
+        card.appendChild(body);
+
+        // Keep aisles in the same alphabetical order the server renders
+        const next = cards.find(other => other.dataset.aisle.localeCompare(aisle) > 0);
+        container.insertBefore(card, next || null);
+        return list;
+    }
+
+    // --- Delta handlers ---
+    function applyItemChecked(delta) {
+        const checkbox = container.querySelector(`#item-${delta.item_id}`);
+        if (!checkbox || checkbox.isUpdating || checkbox.checked === delta.is_checked) {
+            return;
+        }
+        checkbox.checked = delta.is_checked;
+        setLabelChecked(container.querySelector(`label[for="item-${delta.item_id}"]`), delta.is_checked);
+    }
+
+    function applyItemAdded(delta) {
+        const item = delta.item;
+        if (findItemRow(item.id)) {
+            return;
+        }
+        removeEmptyState();
+        const list = findOrCreateAisleList(item.aisle || 'Other');
+        const row = buildItemRow(item);
+        const next = Array.from(list.children).find(
+            other => (other.dataset.name || '').localeCompare(item.name) > 0
+        );
+        list.insertBefore(row, next || null);
+    }
+
+    function applyItemUpserted(item) {
+        const row = findItemRow(item.id);
+        if (row) {
+            const aisleCard = row.closest('.aisle-card');
+            if (aisleCard && aisleCard.dataset.aisle === (item.aisle || 'Other')) {
+                row.replaceWith(buildItemRow(item));
+                return;
+            }
+            applyItemDeleted({ item_id: item.id }, false);
+        }
+        applyItemAdded({ item: item });
+    }
+
+    function applyItemDeleted(delta, refreshWhenEmpty = true) {
+        const row = findItemRow(delta.item_id);
+        if (!row) {
+            return;
+        }
+        const aisleCard = row.closest('.aisle-card');
+        row.remove();
+        if (aisleCard && aisleCard.querySelectorAll('li[data-item-id]').length === 0) {
+            aisleCard.remove();
+        }
+        if (refreshWhenEmpty && container.querySelectorAll('li[data-item-id]').length === 0) {
+            refreshContent();
+        }
+    }
+
+    function refreshContent() {
+        // The browser revalidates with If-None-Match, so an unchanged list costs a 304
+        fetch(container.dataset.contentUrl)
+            .then(response => {
+                const version = parseInt(response.headers.get('X-Shopping-List-Version'), 10);
+                return response.text().then(html => ({ version, html }));
+            })
+            .then(({ version, html }) => {
+                container.innerHTML = html;
+                if (!isNaN(version)) {
+                    currentVersion = version;
+                }
+            })
+            .catch(error => console.error('Error fetching updated content:', error));
+    }
+
+    // Coalesced delta from a regeneration: patch every changed row at once
+    function applyItemsChanged(delta) {
+        delta.deletes.forEach(itemId => applyItemDeleted({ item_id: itemId }, false));
+        delta.upserts.forEach(applyItemUpserted);
+        if (container.querySelectorAll('li[data-item-id]').length === 0
+            && !container.querySelector('.empty-state')) {
+            refreshContent();
+        }
+    }
+
+    // Fetch only the rows changed after `sinceVersion` and patch them in
+    function syncChanges(sinceVersion) {
+        fetch(`${CHANGES_URL}?since=${sinceVersion}`)
+            .then(response => response.json())
+            .then(changes => {
+                if (changes.reset) {
+                    refreshContent();
+                    return;
                 }
+                applyItemsChanged(changes);
+                currentVersion = Math.max(currentVersion, changes.version);
+            })
+            .catch(error => console.error('Error fetching shopping list changes:', error));
+    }
+
+    const deltaHandlers = {
+        item_checked: applyItemChecked,
+        item_added: applyItemAdded,
+        item_deleted: delta => applyItemDeleted(delta),
+        items_changed: applyItemsChanged,
+        list_regenerated: (delta, previousVersion) => syncChanges(previousVersion),
+    };
+
+    // --- Socket.IO ---
+    const socket = io();
+
+    socket.on('shopping_list_delta', function(delta) {
+        const previousVersion = currentVersion;
+        if (typeof delta.version === 'number') {
+            if (delta.version <= currentVersion) {
+                return;  // Already reflected in the page
+            }
+            if (delta.version > currentVersion + 1) {
+                // We missed something in between; catch up in one request
+                syncChanges(previousVersion);
+                return;
             }
+            currentVersion = delta.version;
+        }
+        const handler = deltaHandlers[delta.type];
+        if (handler) {
+            handler(delta, previousVersion);
+        } else {
+            console.warn('Unknown shopping list delta:', delta);
         }
     });
-    
-    // Handle disconnections
+
+    // Slow fallback polling, only while the socket is down
+    function checkForUpdates() {
+        fetch(`${container.dataset.checkUrl}?version=${currentVersion}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.needs_update) {
+                    syncChanges(currentVersion);
+                }
+            })
+            .catch(error => console.error('Error checking for updates:', error));
+    }
+
     socket.on('disconnect', () => {
-        console.warn('WebSocket disconnected. Updates may be delayed.');
+        console.warn('WebSocket disconnected. Falling back to slow polling.');
+        if (!fallbackTimer) {
+            fallbackTimer = setInterval(checkForUpdates, FALLBACK_POLL_INTERVAL_MS);
+        }
     });
-    
-    // Handle reconnections
+
+    let hasConnected = false;
     socket.on('connect', () => {
-        console.log('WebSocket reconnected. Rejoining shopping list room...');
         socket.emit('join_shopping_list');
+        if (fallbackTimer) {
+            clearInterval(fallbackTimer);
+            fallbackTimer = null;
+        }
+        // Deltas sent while we were offline are lost, so catch up once on reconnect
+        if (hasConnected) {
+            syncChanges(currentVersion);
+        }
+        hasConnected = true;
     });
-    
-    // Add event listeners to all checkboxes
-    document.querySelectorAll('.item-checkbox').forEach(checkbox => {
-        checkbox.addEventListener('change', function() {
-            const itemId = this.getAttribute('data-item-id');
-            const isChecked = this.checked;
-            const label = document.querySelector(`label[for="item-${itemId}"]`);
-            
-            // Set a flag to prevent this checkbox from being updated by WebSocket
-            this.isUpdating = true;
-            
-            // Debug logging
-            console.log('Updating item:', {
-                itemId: itemId,
-                isChecked: isChecked
-            });
-            
-            // Optimistically update UI
-            if (label) {
-                if (isChecked) {
-                    label.classList.add('text-muted', 'text-decoration-line-through');
+
+    // --- User interactions (delegated so patched rows work too) ---
+    container.addEventListener('change', function(event) {
+        const checkbox = event.target;
+        if (!checkbox.classList.contains('item-checkbox')) {
+            return;
+        }
+        const itemId = checkbox.getAttribute('data-item-id');
+        const isChecked = checkbox.checked;
+        const label = container.querySelector(`label[for="item-${itemId}"]`);
+
+        // Set a flag to prevent this checkbox from being updated by WebSocket
+        checkbox.isUpdating = true;
+
+        // Optimistically update UI
+        setLabelChecked(label, isChecked);
+
+        // Send update to server
+        fetch('/update-shopping-item-checked', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken
+            },
+            body: JSON.stringify({
+                item_id: itemId,
+                is_checked: isChecked
+            })
+        })
+        .then(response => response.json().then(data => ({ ok: response.ok, status: response.status, data: data })))
+        .then(({ ok, status, data }) => {
+            // Clear the update flag regardless of success/failure
+            checkbox.isUpdating = false;
+
+            if (!ok) {
+                // Revert UI changes
+                setLabelChecked(label, !isChecked);
+                checkbox.checked = !isChecked;
+
+                // Show appropriate error message
+                if (status === 404) {
+                    throw new Error('Item not found');
+                } else if (status === 403) {
+                    throw new Error('Not authorized to update this item');
+                } else if (status === 400) {
+                    throw new Error(data.error || 'Invalid request');
                 } else {
-                    label.classList.remove('text-muted', 'text-decoration-line-through');
+                    throw new Error(data.error || 'Failed to update item');
                 }
             }
-            
-            // Send update to server
-            fetch('/update-shopping-item-checked', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': csrfToken
-                },
-                body: JSON.stringify({
-                    item_id: itemId,
-                    is_checked: isChecked
-                })
-            })
-            .then(response => response.json().then(data => ({ ok: response.ok, status: response.status, data: data })))
-            .then(({ ok, status, data }) => {
-                // Clear the update flag regardless of success/failure
-                this.isUpdating = false;
-                
-                if (!ok) {
-                    // Revert UI changes
-                    if (label) {
-                        if (!isChecked) {
-                            label.classList.add('text-muted', 'text-decoration-line-through');
-                        } else {
-                            label.classList.remove('text-muted', 'text-decoration-line-through');
-                        }
-                    }
-                    this.checked = !isChecked;
-                    
-                    // Show appropriate error message
-                    if (status === 404) {
-                        throw new Error('Item not found');
-                    } else if (status === 403) {
-                        throw new Error('Not authorized to update this item');
-                    } else if (status === 400) {
-                        throw new Error(data.error || 'Invalid request');
-                    } else {
-                        throw new Error(data.error || 'Failed to update item');
-                    }
-                }
-                
-                if (!data.success) {
-                    throw new Error(data.error || 'Update failed');
-                }
-                
-                console.log('Updated successfully:', data);
-            })
-            .catch(error => {
-                console.error('Error:', error);
-                alert(error.message || 'Failed to update item');
-                // Clear the update flag on error
-                this.isUpdating = false;
-            });
+
+            if (!data.success) {
+                throw new Error(data.error || 'Update failed');
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert(error.message || 'Failed to update item');
+            // Clear the update flag on error
+            checkbox.isUpdating = false;
         });
     });
-    
+
+    container.addEventListener('click', function(event) {
+        const button = event.target.closest('.delete-item');
+        if (!button || !confirm('Are you sure you want to delete this item?')) {
+            return;
+        }
+        const itemId = button.dataset.itemId;
+
+        fetch(container.dataset.deleteUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken
+            },
+            body: JSON.stringify({ item_id: itemId })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                applyItemDeleted({ item_id: itemId });
+            }
+        })
+        .catch(error => console.error('Error deleting item:', error));
+    });
+
     // Cleanup when page is closed/navigated away
     window.addEventListener('beforeunload', function() {
         socket.emit('leave_shopping_list');
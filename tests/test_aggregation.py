@@ -0,0 +1,172 @@
+import os
+import sys
+from pathlib import Path
+import pytest
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app import (
+    app,
+    db,
+    Recipe,
+    Ingredient,
+    PantryItem,
+    aggregate_ingredients_reference,
+    aggregate_ingredients_sql,
+    generate_shopping_list_data,
+)
+
+
+@pytest.fixture
+def recipes():
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        pasta = Recipe(name="Pasta", servings=2, is_dinner=True)
+        pasta.ingredients = [
+            Ingredient(name="Spaghetti", quantity="500", unit="g", aisle="Pantry"),
+            Ingredient(name="Tomato", quantity="4", unit=None, aisle="Produce"),
+            Ingredient(name="Olive Oil", quantity="2", unit="tbsp", aisle="Pantry"),
+        ]
+        salad = Recipe(name="Salad", servings=2, is_lunch=True)
+        salad.ingredients = [
+            Ingredient(name="tomato ", quantity="2", unit="", aisle="Produce"),
+            Ingredient(name="Lettuce", quantity="1", unit=None, aisle=None),
+            Ingredient(name="olive oil", quantity="1", unit="tbsp", aisle="Pantry"),
+        ]
+        soup = Recipe(name="Soup", servings=4, is_dinner=True)
+        soup.ingredients = [Ingredient(name="Leek", quantity="3", aisle="Produce")]
+        db.session.add_all(
+            [
+                pasta,
+                salad,
+                soup,
+                # Covers part of the oil, all of the lettuce and (after kg -> g) the pasta
+                PantryItem(name="Olive oil", quantity="1", unit="tbsp"),
+                PantryItem(name="Lettuce", quantity="2"),
+                PantryItem(name="Spaghetti", quantity="1", unit="kg"),
+            ]
+        )
+        db.session.commit()
+        yield {r.name: r.id for r in (pasta, salad, soup)}
+        db.session.remove()
+        db.drop_all()
+
+
+def test_sql_aggregation_matches_reference(recipes):
+    recipe_ids = {recipes["Pasta"], recipes["Salad"]}
+    expected = aggregate_ingredients_reference(recipe_ids)
+    actual = aggregate_ingredients_sql(recipe_ids)
+    by_name = lambda data: {
+        aisle: sorted(items, key=lambda i: i["name"]) for aisle, items in data.items()
+    }
+    assert by_name(actual) == by_name(expected)
+    items = {i["name"]: i for aisle_items in actual.values() for i in aisle_items}
+    assert items["tomato"]["quantity"] == 6.0
+    assert items["olive oil"]["quantity"] == 2.0
+    assert items["olive oil"]["pantry_deducted"] == 1.0
+    assert "lettuce" not in items  # Fully covered by the pantry
+    assert "spaghetti" not in items  # 1 kg in the pantry covers 500 g
+
+
+def test_generate_shopping_list_data_paths_agree(recipes):
+    plan_ids = {
+        "Monday": {
+            "Lunch": {"recipe_id": recipes["Salad"], "status": "new"},
+            "Dinner": {"recipe_id": recipes["Pasta"], "status": "new"},
+        },
+        "Tuesday": {
+            "Lunch": {"recipe_id": recipes["Salad"], "status": "leftover"},
+            "Dinner": {"recipe_id": recipes["Soup"], "status": "locked"},
+        },
+    }
+    with app.test_request_context("/"):
+        assert generate_shopping_list_data(plan_ids) == generate_shopping_list_data(
+            plan_ids, use_sql=False
+        )
+
+
+def test_parse_quantity_handles_fractions_and_junk():
+    from units import parse_quantity, canonical_unit
+
+    assert parse_quantity("1/2") == 0.5
+    assert parse_quantity("1 1/2") == 1.5
+    assert parse_quantity("1½") == 1.5
+    assert parse_quantity("0,75") == 0.75
+    assert parse_quantity("a pinch") is None
+    assert parse_quantity("1/0") is None
+    assert parse_quantity("1 2") is None
+    assert parse_quantity("1 2.5") is None
+    assert parse_quantity("") is None
+    assert canonical_unit(" Grams ") == "g"
+    assert canonical_unit("Tbsp.") == "tbsp"
+    assert canonical_unit(None) == ""
+
+
+def test_quantities_are_parsed_on_write_and_summed(recipes):
+    stew = Recipe(name="Stew", servings=4, is_dinner=True)
+    stew.ingredients = [
+        Ingredient(name="Flour", quantity="1/2", unit="cups", aisle="Baking"),
+        Ingredient(name="Flour", quantity="1 1/2", unit="cup", aisle="Baking"),
+        Ingredient(name="Salt", quantity="a pinch", aisle="Baking"),
+    ]
+    db.session.add(stew)
+    db.session.commit()
+    flour = stew.ingredients[0]
+    assert (flour.quantity_value, flour.unit_canonical) == (0.5, "cup")
+    flour.quantity = "3/4"
+    assert flour.quantity_value == 0.75
+    flour.quantity = "1/2"
+    db.session.commit()
+
+    items = {
+        i["name"]: i
+        for aisle_items in aggregate_ingredients_sql({stew.id}).values()
+        for i in aisle_items
+    }
+    assert items["flour"]["quantity"] == 2.0
+    assert items["flour"]["unit"] == "cup"
+    assert "salt" not in items  # Unparseable quantity counts as 0
+    assert aggregate_ingredients_reference({stew.id}) == aggregate_ingredients_sql(
+        {stew.id}
+    )
+
+
+def test_units_convert_to_a_common_base(recipes):
+    bread = Recipe(name="Bread", servings=1, is_lunch=True)
+    bread.ingredients = [
+        Ingredient(name="Flour", quantity="500", unit="g", aisle="Baking"),
+        Ingredient(name="Milk", quantity="1", unit="cup", aisle="Dairy"),
+    ]
+    cake = Recipe(name="Cake", servings=8, is_dinner=True)
+    cake.ingredients = [
+        Ingredient(name="Flour", quantity="1", unit="kg", aisle="Baking"),
+        Ingredient(name="Milk", quantity="2", unit="tbsp", aisle="Dairy"),
+        Ingredient(name="Sugar", quantity="1", unit="kg", aisle="Baking"),
+    ]
+    db.session.add_all(
+        [
+            bread,
+            cake,
+            PantryItem(name="Sugar", quantity="250", unit="grams"),
+            PantryItem(name="Milk", quantity="1", unit="l"),
+        ]
+    )
+    db.session.commit()
+
+    recipe_ids = {bread.id, cake.id}
+    actual = aggregate_ingredients_sql(recipe_ids)
+    assert actual == aggregate_ingredients_reference(recipe_ids)
+    items = {i["name"]: i for aisle_items in actual.values() for i in aisle_items}
+    # Mixed units come back in the base unit as a single row
+    assert (items["flour"]["quantity"], items["flour"]["unit"]) == (1500.0, "g")
+    # A uniform unit is kept; the pantry is deducted across units
+    assert (items["sugar"]["quantity"], items["sugar"]["unit"]) == (0.75, "kg")
+    assert items["sugar"]["pantry_deducted"] == 0.25
+    assert "milk" not in items  # 280 ml needed, 1 l in the pantry
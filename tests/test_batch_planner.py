@@ -0,0 +1,161 @@
+import datetime
+import json
+import os
+import sys
+from pathlib import Path
+import pytest
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import app as app_module
+from app import (
+    app,
+    db,
+    User,
+    Account,
+    AccountSettings,
+    Recipe,
+    LockedMeal,
+    PlanHistory,
+    PregeneratedPlan,
+    next_plan_week_start,
+    remember_plan,
+)
+
+
+@pytest.fixture
+def accounts(monkeypatch):
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    monkeypatch.setattr(app_module.socketio, "emit", lambda *args, **kwargs: None)
+    with app.app_context():
+        db.create_all()
+        users, accounts = [], []
+        for i in range(5):
+            user = User(email=f"cook{i}@example.com", name=f"Cook {i}")
+            user.password_hash = "x"
+            account = Account(name=f"Account{i}")
+            account.users.append(user)
+            db.session.add_all([user, account])
+            users.append(user)
+            accounts.append(account)
+        db.session.add(Recipe(name="Stew", servings=6, is_dinner=True))
+        db.session.add_all(
+            Recipe(name=f"Lunch{i}", servings=2, is_lunch=True) for i in range(4)
+        )
+        db.session.flush()
+        accounts[1].settings.planning_mode = "variety"
+        accounts[2].settings.planning_mode = "overlap"
+        accounts[3].settings.meal_plan_duration = 3
+        db.session.commit()
+        yield [(user.id, account.id) for user, account in zip(users, accounts)]
+        db.session.remove()
+        db.drop_all()
+
+
+def _stored_plans():
+    return {
+        row.account_id: (row.days, json.loads(row.plan))
+        for row in PregeneratedPlan.query.all()
+    }
+
+
+def test_plan_accounts_plans_every_account_in_chunks(accounts):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["plan-accounts", "--workers", "1", "--seed", "5"])
+    assert result.exit_code == 0, result.output
+    assert "Planned 5 accounts" in result.output
+    plans = _stored_plans()
+    assert set(plans) == {account_id for _, account_id in accounts}
+    span, plan = plans[accounts[3][1]]
+    days = list(plan)
+    assert len(days) == 3 and span == f"{days[0]}/{days[-1]}"
+    # Planned ahead for next week
+    assert days[0] == next_plan_week_start("Monday").isoformat()
+    assert all(meals["Dinner"]["recipe_id"] for meals in plan.values())
+
+    # Worker processes give the same plans for the same seed
+    result = runner.invoke(
+        args=["plan-accounts", "--workers", "2", "--chunk-size", "2", "--seed", "5"]
+    )
+    assert result.exit_code == 0, result.output
+    assert _stored_plans() == plans
+
+
+def test_dashboard_adopts_the_pregenerated_plan_once(accounts, monkeypatch):
+    runner = app.test_cli_runner()
+    runner.invoke(args=["plan-accounts", "--workers", "1"])
+    user_id, account_id = accounts[0]
+    _, stored = _stored_plans()[account_id]
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+    # This week's dashboard leaves next week's plan for then
+    client.get("/")
+    with client.session_transaction() as sess:
+        assert sess["current_plan_ids"] != stored
+    assert PregeneratedPlan.query.filter_by(account_id=account_id).count() == 1
+
+    week_start = next_plan_week_start("Monday")
+
+    class NextWeek(datetime.date):
+        @classmethod
+        def today(cls):
+            return week_start
+
+    monkeypatch.setattr(app_module, "date", NextWeek)
+    client.get("/")
+    with client.session_transaction() as sess:
+        assert sess["current_plan_ids"] == stored
+    assert PregeneratedPlan.query.filter_by(account_id=account_id).count() == 0
+    remembered = PlanHistory.query.filter_by(
+        account_id=account_id, week_start=week_start
+    ).one()
+    assert json.loads(remembered.plan) == stored
+    # The plan's leftover slots come with it as leftover locks
+    leftovers = {
+        f"{lock.day}_{lock.meal_type}"
+        for lock in LockedMeal.query.filter_by(lock_type="leftover")
+        if lock.day in stored
+    }
+    assert leftovers == {
+        f"{day}_{meal_type}"
+        for day, meals in stored.items()
+        for meal_type, slot in meals.items()
+        if slot and slot["status"] == "leftover"
+    }
+    assert leftovers
+
+
+def test_plan_accounts_keeps_the_repeat_interval_across_weeks(accounts):
+    user_id, account_id = accounts[0]
+    settings = AccountSettings.query.filter_by(account_id=account_id).one()
+    settings.meal_repeat_interval = 2
+    settings.meal_plan_start_day = "Monday"
+    db.session.commit()
+    runner = app.test_cli_runner()
+    args = ["plan-accounts", "--workers", "1", "--seed", "3"]
+    assert runner.invoke(args=args).exit_code == 0
+    monday = next_plan_week_start("Monday")
+    monday_lunch = _stored_plans()[account_id][1][monday.isoformat()]["Lunch"][
+        "recipe_id"
+    ]
+    # Served on the last day of this week, the same recipe cannot open the next
+    sunday = monday - datetime.timedelta(days=1)
+    remember_plan(
+        account_id,
+        "Monday",
+        {sunday.isoformat(): {"Lunch": {"recipe_id": monday_lunch}}},
+        today=sunday,
+    )
+    result = runner.invoke(args=args)
+    assert result.exit_code == 0, result.output
+    _, plan = _stored_plans()[account_id]
+    assert plan[monday.isoformat()]["Lunch"]["recipe_id"] != monday_lunch
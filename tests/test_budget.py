@@ -0,0 +1,229 @@
+import os
+import random
+import sys
+from pathlib import Path
+import pytest
+from flask_login import login_user
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import app as app_module
+from app import (
+    app,
+    db,
+    User,
+    Account,
+    Recipe,
+    Ingredient,
+    generate_meal_plan,
+    generate_shopping_list_data,
+    get_candidate_snapshot,
+    get_recipe_costs,
+    plan_period_days,
+)
+from budget import IngredientCostRow, RecipeCosts, fit_budget, load_price_table
+from planner import (
+    MEAL_TYPE_BITS,
+    PlanSettings,
+    RecipeCandidate,
+    build_candidate_snapshot,
+    plan_meals,
+)
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def _write_prices(path, *rows):
+    path.write_text("\n".join(("name,price,quantity,unit",) + rows) + "\n")
+    return str(path)
+
+
+def test_price_table_converts_to_base_units(tmp_path):
+    prices = load_price_table(
+        _write_prices(
+            tmp_path / "prices.csv", "Rice,1.50,1,kg", "eggs,2.40,12,", "bad,x,1,g"
+        )
+    )
+    assert len(prices) == 2
+    assert prices.cost("rice", 250, "g") == pytest.approx(0.375)
+    assert prices.cost(" RICE ", 0.5, "kg") == pytest.approx(0.75)
+    assert prices.cost("eggs", 3, "") == pytest.approx(0.6)
+    assert prices.cost("rice", 1, "cup") is None  # no price by volume
+    assert prices.cost("saffron", 1, "g") is None
+    assert len(load_price_table(str(tmp_path / "missing.csv"))) == 0
+
+
+def _lunch_costs(tmp_path, lunch_prices):
+    """Dinner is a 6-serving stew (two leftover days); lunches cost lunch_prices."""
+    prices = load_price_table(
+        _write_prices(
+            tmp_path / "prices.csv",
+            *(f"item {i},{price},1," for i, price in enumerate(lunch_prices)),
+            "beef,6.00,1,",
+        )
+    )
+    rows = [IngredientCostRow(1, 6, "Beef", 1, "")]
+    rows += [
+        IngredientCostRow(100 + i, 2, f"Item {i}", 1, "")
+        for i in range(len(lunch_prices))
+    ]
+    rows.append(IngredientCostRow(200, 2, "Saffron", 1, ""))  # not priced
+    candidates = build_candidate_snapshot(
+        [RecipeCandidate(1, 6, MEAL_TYPE_BITS["Dinner"])]
+        + [
+            RecipeCandidate(recipe_id, 2, MEAL_TYPE_BITS["Lunch"])
+            for recipe_id in list(range(100, 100 + len(lunch_prices))) + [200]
+        ]
+    )
+    return candidates, RecipeCosts(rows, prices)
+
+
+def test_recipe_costs_are_a_per_serving_vector(tmp_path):
+    candidates, costs = _lunch_costs(tmp_path, [1, 2, 3])
+    assert costs.per_serving[costs.row(1)] == pytest.approx(1.0)
+    assert costs.recipe_cost(1) == pytest.approx(6.0)
+    assert costs.is_priced(101) and not costs.is_priced(200)
+    plan = {
+        "Monday": {"Lunch": {"recipe_id": 101, "status": "new"}},
+        "Tuesday": {"Lunch": {"recipe_id": 101, "status": "leftover"}},
+        "Wednesday": {"Lunch": {"recipe_id": -1, "status": "locked"}},
+    }
+    assert costs.plan_cost(plan) == (pytest.approx(2.0), True)
+
+
+def test_fit_budget_swaps_in_cheaper_recipes_and_keeps_leftovers(tmp_path):
+    lunch_prices = [1, 1, 1, 1, 1, 9, 9, 9, 9, 9, 9, 9]
+    candidates, costs = _lunch_costs(tmp_path, lunch_prices)
+    settings = PlanSettings(meal_repeat_interval=3)
+    for seed in range(10):
+        rng = random.Random(seed)
+        planned = plan_meals(candidates, settings, {}, 2, days=DAYS, rng=rng)
+        fitted = fit_budget(
+            planned, candidates, costs, settings, 2, budget=30, rng=rng
+        )
+        assert costs.plan_cost(fitted.plan_ids).total <= 30
+        assert fitted.warnings == planned.warnings
+        lunches = [fitted.plan_ids[day]["Lunch"]["recipe_id"] for day in DAYS]
+        assert 200 not in lunches or 200 in [
+            planned.plan_ids[day]["Lunch"]["recipe_id"] for day in DAYS
+        ]
+        for i in range(len(lunches) - 2):
+            assert len(set(lunches[i : i + 3])) == 3
+        # Leftover dinners are untouched
+        assert [fitted.plan_ids[day]["Dinner"] for day in DAYS] == [
+            planned.plan_ids[day]["Dinner"] for day in DAYS
+        ]
+
+
+def test_fit_budget_warns_when_the_budget_cannot_be_met(tmp_path):
+    candidates, costs = _lunch_costs(tmp_path, [5, 5, 5, 5])
+    planned = plan_meals(
+        candidates, PlanSettings(), {}, 2, days=DAYS[:3], rng=random.Random(1)
+    )
+    fitted = fit_budget(planned, candidates, costs, PlanSettings(), 2, budget=1)
+    assert fitted.plan_ids == planned.plan_ids
+    assert fitted.warnings[-1].startswith("This plan costs about £")
+
+
+@pytest.fixture
+def priced_app(tmp_path, monkeypatch):
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    monkeypatch.setattr(app_module.socketio, "emit", lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        app_module,
+        "PRICE_TABLE_PATH",
+        _write_prices(
+            tmp_path / "prices.csv",
+            *(f"item {i},{2 if i < 4 else 8},1,kg" for i in range(10)),
+        ),
+    )
+    with app.app_context():
+        db.create_all()
+        user = User(email="cook@example.com", name="Cook")
+        user.password_hash = "x"
+        account = Account(name="CookAccount")
+        account.users.append(user)
+        db.session.add_all([user, account])
+        for i in range(10):
+            recipe = Recipe(name=f"Dinner {i}", servings=2, is_dinner=True)
+            recipe.ingredients = [
+                Ingredient(name=f"Item {i}", quantity="500", unit="g")
+            ]
+            db.session.add(recipe)
+        account.settings.weekly_budget = 14.0
+        account.settings.meal_plan_duration = 4
+        db.session.commit()
+        yield user
+        db.session.remove()
+        db.drop_all()
+
+
+def test_plans_stay_within_the_weekly_budget(priced_app):
+    user = priced_app
+    with app.test_request_context("/"):
+        login_user(user)
+        for seed in range(5):
+            # The account's 4-day plan
+            plan = generate_meal_plan(2, {}, seed=seed)
+            cost = get_recipe_costs(get_candidate_snapshot()).plan_cost(plan)
+            # 4 days are 4/7 of the weekly budget; dinners cost 1 or 4
+            assert cost.complete and cost.total <= 8
+        shopping_list = generate_shopping_list_data(plan)
+    items = [item for items in shopping_list.values() for item in items]
+    assert len(items) == 4
+    assert {item["cost"] for item in items} <= {1.0, 4.0}
+    assert sum(item["cost"] for item in items) == pytest.approx(cost.total)
+
+
+def test_dashboard_shows_the_projected_cost(priced_app):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(priced_app.id)
+        sess["_fresh"] = True
+    page = client.get("/").get_data(as_text=True)
+    with client.session_transaction() as sess:
+        plan = sess["current_plan_ids"]
+    with app.test_request_context("/"):
+        cost = get_recipe_costs(get_candidate_snapshot()).plan_cost(plan).total
+    assert cost <= 8
+    assert f"Projected cost: £{cost:.2f} of £8.00 budget" in page
+
+
+def test_regenerating_a_short_plan_costs_only_the_days_shown(priced_app):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(priced_app.id)
+        sess["_fresh"] = True
+    client.post("/", data={"planning_mode": "random"})
+    with client.session_transaction() as sess:
+        plan = sess["current_plan_ids"]
+    # The plan covers the 4 configured days, priced against 4/7 of the budget
+    assert sorted(plan) == [day.isoformat() for day in plan_period_days("Monday", 4)]
+    page = client.get("/").get_data(as_text=True)
+    with app.test_request_context("/"):
+        cost = get_recipe_costs(get_candidate_snapshot()).plan_cost(plan).total
+    assert cost <= 8
+    assert f"Projected cost: £{cost:.2f} of £8.00 budget" in page
+
+
+def test_a_price_change_is_not_served_from_the_plan_cache(priced_app, tmp_path):
+    user = priced_app
+    with app.test_request_context("/"):
+        login_user(user)
+        generate_meal_plan(2, {}, seed=7)
+        # Items 0-3 become the expensive ones
+        path = _write_prices(
+            tmp_path / "prices.csv",
+            *(f"item {i},{8 if i < 4 else 2},1,kg" for i in range(10)),
+        )
+        os.utime(path, (1, 1))
+        plan = generate_meal_plan(2, {}, seed=7)
+        cost = get_recipe_costs(get_candidate_snapshot()).plan_cost(plan)
+        assert cost.complete and cost.total <= 8
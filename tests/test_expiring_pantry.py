@@ -0,0 +1,222 @@
+import datetime
+import os
+import random
+import sys
+from pathlib import Path
+import pytest
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import app as app_module
+from app import app, db, User, Account, Recipe, Ingredient, PantryItem
+from expiry import (
+    ExpiringStock,
+    ExpiryQueue,
+    PantryBatch,
+    RecipeAmountRow,
+    RecipeAmounts,
+    expiry_scores,
+    use_expiring_first,
+)
+from planner import (
+    MEAL_TYPE_BITS,
+    IngredientIndex,
+    PlanResult,
+    PlanSettings,
+    RecipeCandidate,
+    build_candidate_snapshot,
+    plan_meals,
+)
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+TODAY = datetime.date(2026, 10, 19)
+SETTINGS = PlanSettings(meal_repeat_interval=3)
+
+
+def _batch(item_id, key, days, amount, base_unit="g"):
+    return PantryBatch(
+        TODAY + datetime.timedelta(days=days), item_id, key, key, amount, base_unit
+    )
+
+
+def test_queue_pops_the_soonest_expiring_first():
+    queue = ExpiryQueue(
+        [
+            _batch(1, "milk", 4, 1000),
+            _batch(2, "spinach", 0, 200),
+            _batch(3, "ham", 9, 5),
+        ]
+    )
+    assert queue.peek().key == "spinach"
+    due = queue.due(TODAY + datetime.timedelta(days=5))
+    assert [batch.key for batch in due] == ["spinach", "milk"]
+    assert len(queue) == 3  # due() leaves the queue alone
+    queue.push(_batch(4, "cream", -1, 300))
+    assert [queue.pop().key for _ in range(4)] == ["cream", "spinach", "milk", "ham"]
+
+
+def _expiring_dinners(batches):
+    """Dinners 1-8; 5 uses spinach, 6 and 7 use milk, 8 uses ham."""
+    uses = {5: [("spinach", 200, "g")], 6: [("milk", 500, "ml")], 7: [("milk", 1, "l")]}
+    uses[8] = [("ham", 100, "g")]
+    rows = [
+        RecipeAmountRow(recipe_id, key, quantity, unit)
+        for recipe_id, ingredients in uses.items()
+        for key, quantity, unit in ingredients
+    ]
+    candidates = build_candidate_snapshot(
+        RecipeCandidate(recipe_id, 2, MEAL_TYPE_BITS["Dinner"])
+        for recipe_id in range(1, 9)
+    )
+    index = IngredientIndex(
+        {recipe_id: [key for key, _, _ in used] for recipe_id, used in uses.items()}
+    )
+    stock = ExpiringStock(ExpiryQueue(batches), index, RecipeAmounts(rows), TODAY)
+    return candidates, stock
+
+
+def test_earliest_slots_use_up_the_stock_about_to_expire():
+    candidates, stock = _expiring_dinners(
+        [
+            _batch(1, "spinach", 0, 200),
+            _batch(2, "milk", 2, 1000, "ml"),
+            _batch(3, "ham", 30, 500),  # outside the plan
+        ]
+    )
+    scores = expiry_scores(stock, len(DAYS))
+    assert set(scores) == {5, 6, 7}
+    assert scores[5] == pytest.approx(1.0)
+    assert scores[7] == pytest.approx(1 / 3) and scores[6] == pytest.approx(1 / 6)
+    for seed in range(10):
+        rng = random.Random(seed)
+        planned = plan_meals(
+            candidates, SETTINGS, {}, 2, days=DAYS, rng=rng, scores=scores
+        )
+        result = use_expiring_first(planned, candidates, stock, SETTINGS, 2)
+        dinners = [result.plan_ids[day]["Dinner"]["recipe_id"] for day in DAYS]
+        # Spinach goes today; the litre of milk before it turns on Wednesday
+        assert dinners[0] == 5
+        assert dinners[1] == 7
+        for i in range(len(dinners) - 2):
+            assert len(set(dinners[i : i + 3])) == 3
+
+
+def test_used_up_stock_stops_counting_for_later_slots():
+    candidates, stock = _expiring_dinners(
+        [_batch(1, "milk", 1, 1000, "ml"), _batch(2, "spinach", 5, 200)]
+    )
+    # Ranked the way expiry_scores ranks them: both milk recipes first
+    picks = [7, 6, 5, 1, 2, 3, 4]
+    planned = PlanResult(
+        {
+            day: {"Dinner": {"recipe_id": recipe_id, "status": "new"}}
+            for day, recipe_id in zip(DAYS, picks)
+        },
+        {},
+        [],
+        {},
+    )
+    result = use_expiring_first(planned, candidates, stock, SETTINGS, 2)
+    dinners = [result.plan_ids[day]["Dinner"]["recipe_id"] for day in DAYS]
+    # The litre recipe finishes the milk, so the spinach trades a day forward
+    assert dinners == [7, 5, 6, 1, 2, 3, 4]
+    assert planned.plan_ids["Tuesday"]["Dinner"]["recipe_id"] == 6  # a copy
+
+
+def test_plans_started_before_today_leave_past_slots_alone():
+    candidates, stock = _expiring_dinners([_batch(1, "spinach", 0, 200)])
+    # The plan week began on Saturday; Saturday and Sunday are already past
+    stock = stock._replace(start=TODAY - datetime.timedelta(days=2))
+    assert [batch.key for batch in stock.at_risk(1)] == []
+    assert [batch.key for batch in stock.at_risk(3)] == ["spinach"]
+    planned = PlanResult(
+        {
+            day: {"Dinner": {"recipe_id": recipe_id, "status": "new"}}
+            for day, recipe_id in zip(DAYS, [1, 2, 3, 4, 6, 7, 8])
+        },
+        {},
+        [],
+        {},
+    )
+    result = use_expiring_first(planned, candidates, stock, SETTINGS, 2)
+    dinners = [result.plan_ids[day]["Dinner"]["recipe_id"] for day in DAYS]
+    # The third plan day is today, the last day the spinach keeps
+    assert dinners[:3] == [1, 2, 5]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    monkeypatch.setattr(app_module.socketio, "emit", lambda *args, **kwargs: None)
+    with app.app_context():
+        db.create_all()
+        user = User(email="cook@example.com", name="Cook")
+        user.password_hash = "x"
+        account = Account(name="CookAccount")
+        account.users.append(user)
+        db.session.add_all([user, account])
+        for i in range(6):
+            recipe = Recipe(name=f"Dinner {i}", servings=2, is_dinner=True)
+            recipe.ingredients = [Ingredient(name=f"Item {i}", quantity="1")]
+            db.session.add(recipe)
+        spinach = Recipe(name="Spinach Pie", servings=2, is_dinner=True)
+        spinach.ingredients = [Ingredient(name="Spinach", quantity="200", unit="g")]
+        db.session.add(spinach)
+        db.session.flush()
+        account.settings.planning_mode = "expiring"
+        # No repeats, so a past spinach pick can always trade forward
+        account.settings.meal_repeat_interval = 7
+        db.session.commit()
+        test_client = app.test_client()
+        with test_client.session_transaction() as sess:
+            sess["_user_id"] = str(user.id)
+            sess["_fresh"] = True
+        yield test_client, spinach.id
+        db.session.remove()
+        db.drop_all()
+
+
+def test_cupboard_tracks_expiry_and_the_plan_uses_it_first(client):
+    test_client, spinach_id = client
+    today = datetime.date.today()
+    response = test_client.post(
+        "/cupboard",
+        data={
+            "add_name": "Spinach",
+            "add_qty": "200",
+            "add_unit": "g",
+            "add_expires": (today + datetime.timedelta(days=1)).isoformat(),
+        },
+    )
+    assert response.status_code == 302
+    item = PantryItem.query.filter_by(name="Spinach").one()
+    assert item.expires_on == today + datetime.timedelta(days=1)
+    # Updating the quantity keeps the date
+    test_client.post(
+        "/cupboard", data={"add_name": "spinach", "add_qty": "150", "add_unit": "g"}
+    )
+    updated = PantryItem.query.filter_by(name="Spinach").one()
+    assert updated.quantity == "150" and updated.expires_on == item.expires_on
+
+    page = test_client.get("/cupboard").get_data(as_text=True)
+    assert 'id="use-soon"' in page
+    assert "expires in 1 day" in page
+
+    test_client.get("/")
+    with test_client.session_transaction() as sess:
+        plan = sess["current_plan_ids"]
+    # The plan week starts on Monday (the default), which may be past; the
+    # spinach goes on a dinner still to come before it turns
+    keeps = [today, today + datetime.timedelta(days=1)]
+    assert spinach_id in [
+        plan[day.isoformat()]["Dinner"]["recipe_id"]
+        for day in keeps
+        if day.isoformat() in plan
+    ]
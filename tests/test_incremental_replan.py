@@ -0,0 +1,117 @@
+import os
+import sys
+from pathlib import Path
+import pytest
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import app as app_module
+from app import (
+    app,
+    db,
+    User,
+    Account,
+    Recipe,
+    Ingredient,
+    ShoppingListItem,
+    generate_shopping_list_data,
+)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    monkeypatch.setattr(app_module.socketio, "emit", lambda *args, **kwargs: None)
+    synced_names = []
+    sync_shopping_list = app_module.sync_shopping_list
+
+    def spy(account_id, shopping_list_data, names=None):
+        synced_names.append(names)
+        return sync_shopping_list(account_id, shopping_list_data, names=names)
+
+    monkeypatch.setattr(app_module, "sync_shopping_list", spy)
+    with app.app_context():
+        db.create_all()
+        user = User(email="cook@example.com", name="Cook")
+        user.password_hash = "x"
+        account = Account(name="CookAccount")
+        account.users.append(user)
+        db.session.add_all([user, account])
+        # Eight dinners for seven days: each shares salt, the rest is its own
+        for i in range(8):
+            recipe = Recipe(name=f"Dinner {i}", servings=2, is_dinner=True)
+            recipe.ingredients = [
+                Ingredient(name="Salt", quantity="1", unit="g"),
+                Ingredient(name=f"Item {i}", quantity="1"),
+            ]
+            db.session.add(recipe)
+        account.settings.meal_repeat_interval = 7
+        db.session.commit()
+        test_client = app.test_client()
+        with test_client.session_transaction() as sess:
+            sess["_user_id"] = str(user.id)
+            sess["_fresh"] = True
+        yield test_client, account, synced_names
+        db.session.remove()
+        db.drop_all()
+
+
+def _stored_list(account):
+    return sorted(
+        (item.name, item.quantity)
+        for item in ShoppingListItem.query.filter_by(account_id=account.id)
+    )
+
+
+def _expected_list(plan):
+    with app.test_request_context("/"):
+        data = generate_shopping_list_data(plan)
+    return sorted(
+        (item["name"], item["quantity"]) for items in data.values() for item in items
+    )
+
+
+def test_rerolling_one_dinner_syncs_only_its_ingredients(client):
+    test_client, account, synced_names = client
+    test_client.post("/")
+    # No list was synced from the dashboard's first plan yet
+    assert synced_names == [None]
+    with test_client.session_transaction() as sess:
+        plan = sess["current_plan_ids"]
+    assert _stored_list(account) == _expected_list(plan)
+
+    rerolled = False
+    first_day = min(plan)
+    for _ in range(20):
+        # Lock every dinner but the first day's
+        form = {f"lock_{day}_Dinner": "on" for day in plan if day != first_day}
+        form.update(
+            (f"recipeid_{day}_Dinner", str(meals["Dinner"]["recipe_id"]))
+            for day, meals in plan.items()
+        )
+        test_client.post("/", data=form)
+        with test_client.session_transaction() as sess:
+            new_plan = sess["current_plan_ids"]
+        locked_dinners = [day for day in plan if day != first_day]
+        assert [new_plan[day]["Dinner"]["recipe_id"] for day in locked_dinners] == [
+            plan[day]["Dinner"]["recipe_id"] for day in locked_dinners
+        ]
+        old_id = plan[first_day]["Dinner"]["recipe_id"]
+        new_id = new_plan[first_day]["Dinner"]["recipe_id"]
+        if old_id != new_id:
+            rerolled = True
+            old_name = db.session.get(Recipe, old_id).name.split()[-1]
+            new_name = db.session.get(Recipe, new_id).name.split()[-1]
+            assert synced_names[-1] == {"salt", f"item {old_name}", f"item {new_name}"}
+        else:
+            assert synced_names[-1] == set()
+        assert _stored_list(account) == _expected_list(new_plan)
+        plan = new_plan
+    assert rerolled
@@ -1,4 +1,7 @@
+import datetime
+import json
 import os
+import re
 import sys
 from pathlib import Path
 import pytest
@@ -11,7 +14,36 @@ ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
-from app import app, db, Recipe, User, Account, generate_meal_plan
+from sqlalchemy import event
+
+from app import (
+    app,
+    db,
+    Ingredient,
+    Recipe,
+    User,
+    Account,
+    LockedMeal,
+    PlanHistory,
+    apply_lock_changes,
+    apply_manual_leftovers,
+    export_meal_plan,
+    generate_meal_plan,
+    get_candidate_snapshot,
+    get_ingredient_index,
+    get_persistent_locks,
+    plan_cache,
+    plan_history_days,
+    plan_period_days,
+    remember_plan,
+)
+from planner import date_slot_id, day_label
+
+START = datetime.date(2026, 10, 19)  # a Monday
+
+
+def _dates(num_days):
+    return [START + datetime.timedelta(days=i) for i in range(num_days)]
 
 
 @pytest.fixture
@@ -33,45 +65,323 @@ def test_app():
         db.drop_all()
 
 
-def _generate(user, locked=None, days=None):
+def _generate(user, locked=None, dates=None):
     if locked is None:
         locked = {}
-    if days is None:
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday"]
+    if dates is None:
+        dates = _dates(4)
     with app.test_request_context("/"):
         login_user(user)
-        return generate_meal_plan(2, locked, days=days)
+        return generate_meal_plan(2, locked, dates=dates)
 
 
-def test_first_meal_leftover_label(test_app):
+def test_leftover_locks_written_in_one_commit(test_app):
     user, recipe = test_app
-    plan = _generate(user)
-    assert plan["Tuesday"]["Dinner"]["status"] == "leftover"
-    assert plan["Tuesday"]["Dinner"]["manual_text"] == "Leftover from Monday's dinner"
+    commits = []
 
+    def count_commit(session):
+        commits.append(session)
 
-def test_correct_number_of_leftovers(test_app):
-    user, recipe = test_app
-    plan = _generate(user)
-    leftovers = [
-        plan[day]["Dinner"]
-        for day in ["Tuesday", "Wednesday"]
-        if plan[day]["Dinner"]["status"] == "leftover"
-    ]
-    assert len(leftovers) == 2
+    event.listen(db.session, "after_commit", count_commit)
+    try:
+        _generate(user, dates=_dates(5))
+    finally:
+        event.remove(db.session, "after_commit", count_commit)
+    # Several leftover slots, one transaction
+    assert len(commits) == 1
+    stored = {
+        f"{lock.day}_{lock.meal_type}": lock.lock_type
+        for lock in LockedMeal.query.all()
+    }
+    assert stored["2026-10-20_Dinner"] == "leftover"
+    assert list(stored.values()).count("leftover") >= 2
 
 
-def test_skip_locked_slot(test_app):
+def test_apply_lock_changes_replaces_unlocks_and_clears(test_app):
     user, recipe = test_app
+    leftover = {"recipe_id": recipe.id, "lock_type": "leftover", "text": "Leftover"}
+    user_lock = {"recipe_id": recipe.id, "lock_type": "user"}
+    apply_lock_changes(
+        {"Monday_Dinner": user_lock, "Tuesday_Dinner": leftover, "Friday_Lunch": user_lock}
+    )
+    apply_lock_changes(
+        {"Monday_Dinner": leftover, "Friday_Lunch": None},
+        clear_lock_types=["leftover"],
+    )
+    locks = get_persistent_locks()
+    # Tuesday's leftover was cleared; Monday was replaced in the same batch
+    assert set(locks) == {"Monday_Dinner"}
+    assert locks["Monday_Dinner"]["lock_type"] == "leftover"
+    assert locks["Monday_Dinner"]["text"] == "Leftover"
+
+
+def _plan_queries(user, num_days):
+    """Statements issued to build and persist a plan with a lock on every other day."""
+    breakfast = Recipe.query.filter_by(name="Breakfast1").one()
+    dates = _dates(num_days)
+    days = [day.isoformat() for day in dates]
     locked = {
-        "Tuesday_Dinner": {
-            "recipe_id": recipe.id,
-            "manual": False,
+        date_slot_id(day, "Breakfast"): {
+            "recipe_id": breakfast.id,
+            "manual": True,
             "default": False,
-            "lock_type": "user",
         }
+        for day in dates[::2]
+    }
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.test_request_context("/"):
+        login_user(user)
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            plan = generate_meal_plan(2, locked, dates=dates)
+            apply_manual_leftovers(plan, locked, 2, days)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+    return statements
+
+
+def test_plan_query_count_is_constant(test_app):
+    user, recipe = test_app
+    _plan_queries(user, 7)  # Warm the candidate snapshot
+    # A 31-day plan with 16 locked slots costs the same as a 7-day one
+    assert len(_plan_queries(user, 31)) == len(_plan_queries(user, 7))
+    assert len(_plan_queries(user, 31)) <= 8
+
+
+def test_candidate_snapshot_is_reused_until_recipes_change(test_app):
+    user, recipe = test_app
+    _plan_queries(user, 7)
+    steady = _plan_queries(user, 7)
+    assert not [sql for sql in steady if re.search(r"FROM recipe\b", sql)]
+
+    db.session.add(Recipe(name="Lunch1", servings=2, is_lunch=True))
+    db.session.commit()
+    after_edit = _plan_queries(user, 7)
+    assert len([sql for sql in after_edit if re.search(r"FROM recipe\b", sql)]) == 1
+    plan = _generate(user)
+    assert plan[START.isoformat()]["Lunch"]["status"] == "new"
+
+
+def test_seeded_plan_is_served_from_the_cache(test_app):
+    user, recipe = test_app
+    db.session.add_all(
+        Recipe(name=f"Lunch{i}", servings=2, is_lunch=True) for i in range(6)
+    )
+    db.session.commit()
+    dates = _dates(3)
+    days = [day.isoformat() for day in dates]
+    with app.test_request_context("/"):
+        login_user(user)
+        before = plan_cache.stats()
+        first = generate_meal_plan(2, {}, dates=dates, seed=42)
+        lunches = [first[day]["Lunch"]["recipe_id"] for day in days]
+        first[days[0]]["Lunch"] = None  # callers may modify what they get
+        second = generate_meal_plan(2, {}, dates=dates, seed=42)
+        after = plan_cache.stats()
+        assert [second[day]["Lunch"]["recipe_id"] for day in days] == lunches
+        assert after["hits"] == before["hits"] + 1
+        assert after["misses"] == before["misses"] + 1
+
+
+    # A recipe edit changes the catalog version, so the next request replans
+    db.session.add(Recipe(name="Lunch6", servings=2, is_lunch=True))
+    db.session.commit()
+    with app.test_request_context("/"):
+        login_user(user)
+        generate_meal_plan(2, {}, dates=dates, seed=42)
+    assert plan_cache.stats()["misses"] == after["misses"] + 1
+
+
+def test_export_streams_a_dated_plan_past_one_week(test_app):
+    user, recipe = test_app
+    url = "/meal-plan/export.csv?start=2026-10-19&days=45&seed=3"
+    with app.test_request_context(url):
+        login_user(user)
+        response = export_meal_plan()
+        lines = response.get_data(as_text=True).splitlines()
+    assert response.mimetype == "text/csv"
+    assert lines[0] == "date,meal_type,recipe,status,note"
+    assert len(lines) == 1 + 45 * 3
+    assert lines[-1].startswith("2026-12-02,Dinner,Dinner1,")
+    assert len({line.split(",")[0] for line in lines[1:]}) == 45
+
+
+def test_export_applies_locks_and_refuses_settings_it_cannot_stream(test_app):
+    user, recipe = test_app
+    apply_lock_changes(
+        {
+            "2026-11-20_Breakfast": {"recipe_id": -1, "text": "Brunch out"},
+            "2026-11-21_Lunch": {"recipe_id": recipe.id, "lock_type": "user"},
+        }
+    )
+    url = "/meal-plan/export.csv?start=2026-10-19&days=45&seed=3"
+    with app.test_request_context(url):
+        login_user(user)
+        lines = export_meal_plan().get_data(as_text=True).splitlines()
+    assert "2026-11-20,Breakfast,,locked,Brunch out" in lines
+    assert "2026-11-21,Lunch,Dinner1,locked," in lines
+
+    user.accounts.first().settings.weekly_budget = 20.0
+    db.session.commit()
+    with app.test_request_context(url):
+        login_user(user)
+        response, status = export_meal_plan()
+    assert status == 400
+    assert response.get_json()["unsupported"] == ["weekly budget"]
+    with app.test_request_context(url + "&ignore_unsupported=1"):
+        login_user(user)
+        response = export_meal_plan()
+        assert len(response.get_data(as_text=True).splitlines()) == 1 + 45 * 3
+    assert response.headers["X-Plan-Settings-Ignored"] == "weekly budget"
+
+
+def test_plans_longer_than_a_week_are_keyed_by_date(test_app):
+    user, recipe = test_app
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+        sess["_fresh"] = True
+    client.post("/settings", data={"num_people": "2", "meal_plan_duration": "14"})
+    settings = db.session.get(User, user.id).accounts.first().settings
+    assert settings.meal_plan_duration == 14
+
+    page = client.get("/").get_data(as_text=True)
+    dates = plan_period_days("Monday", 14)
+    with client.session_transaction() as sess:
+        plan = sess["current_plan_ids"]
+    assert list(plan) == [day.isoformat() for day in dates]
+    assert day_label(dates[9].isoformat()) in page
+    # A lock in the second week stays on its date, not on a weekday
+    slot_id = date_slot_id(dates[9], "Lunch")
+    client.post(
+        "/",
+        data={f"lock_{slot_id}": "on", f"recipeid_{slot_id}": str(recipe.id)},
+    )
+    assert get_persistent_locks()[slot_id]["lock_type"] == "user"
+    assert date_slot_id(dates[2], "Lunch") not in get_persistent_locks()
+    with client.session_transaction() as sess:
+        plan = sess["current_plan_ids"]
+    assert plan[dates[9].isoformat()]["Lunch"]["recipe_id"] == recipe.id
+    assert plan[dates[2].isoformat()]["Lunch"]["recipe_id"] != recipe.id
+
+    response = client.post(
+        "/settings",
+        data={"num_people": "2", "meal_plan_duration": "45"},
+        follow_redirects=True,
+    )
+    assert "so the duration was set to 31" in response.get_data(as_text=True)
+    assert settings.meal_plan_duration == 31
+
+
+def test_plan_history_days_runs_up_to_the_week_start():
+    monday = START
+    weeks = {
+        monday - datetime.timedelta(weeks=1): {
+            "2026-10-18": {"Dinner": {"recipe_id": 3}, "Lunch": None}
+        },
+        # A two-week plan, its second week replanned the week after
+        monday - datetime.timedelta(weeks=3): {
+            "2026-09-28": {"Dinner": {"recipe_id": 1}},
+            "2026-10-05": {"Dinner": {"recipe_id": 1}},
+        },
+        monday - datetime.timedelta(weeks=2): {
+            "2026-10-05": {"Dinner": {"recipe_id": 2}},
+        },
     }
-    plan = _generate(user, locked=locked)
-    assert plan["Tuesday"]["Dinner"]["status"] == "locked"
-    assert plan["Wednesday"]["Dinner"]["status"] == "leftover"
-    assert plan["Thursday"]["Dinner"]["status"] == "leftover"
+    history = plan_history_days(weeks, monday, 21)
+    assert len(history) == 21
+    assert history[-1] == {"Dinner": 3, "Lunch": None}
+    assert history[0] == {"Dinner": 1}
+    assert history[7] == {"Dinner": 2}
+    # Days no plan covered serve nothing
+    assert history[1] == {}
+
+
+def test_the_repeat_interval_holds_across_weeks(test_app):
+    user, recipe = test_app
+    recipe.is_dinner = False
+    dinners = [Recipe(name=f"Supper{i}", servings=2, is_dinner=True) for i in range(4)]
+    db.session.add_all(dinners)
+    account = user.accounts.first()
+    account.settings.meal_repeat_interval = 3
+    account.settings.meal_plan_start_day = "Monday"
+    db.session.commit()
+    recent = [dinner.id for dinner in dinners[:2]]
+    monday, tuesday = plan_period_days("Monday", 2)
+    last_week = monday - datetime.timedelta(weeks=1)
+    remember_plan(
+        account.id,
+        "Monday",
+        {
+            (monday - datetime.timedelta(days=2)).isoformat(): {
+                "Dinner": {"recipe_id": recent[0]}
+            },
+            (monday - datetime.timedelta(days=1)).isoformat(): {
+                "Dinner": {"recipe_id": recent[1]}
+            },
+        },
+        today=last_week,
+    )
+    for seed in range(10):
+        with app.test_request_context("/"):
+            login_user(user)
+            plan = generate_meal_plan(2, {}, dates=[monday, tuesday], seed=seed)
+        assert plan[monday.isoformat()]["Dinner"]["recipe_id"] not in recent
+        assert plan[tuesday.isoformat()]["Dinner"]["recipe_id"] != recent[1]
+
+
+def test_the_dashboard_remembers_the_week_it_shows(test_app):
+    user, recipe = test_app
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+        sess["_fresh"] = True
+    client.get("/")
+    with client.session_transaction() as sess:
+        plan = sess["current_plan_ids"]
+    stored = PlanHistory.query.filter_by(account_id=user.accounts.first().id).one()
+    assert stored.week_start <= datetime.date.today()
+    assert json.loads(stored.plan) == plan
+
+
+def test_removing_an_ingredient_refreshes_the_ingredient_index(test_app):
+    user, recipe = test_app
+    app.config["WTF_CSRF_ENABLED"] = False
+    recipe.method = "Boil."
+    recipe.ingredients = [
+        Ingredient(name="Rice", quantity="200", unit="g"),
+        Ingredient(name="Peas", quantity="100", unit="g"),
+    ]
+    db.session.commit()
+    rice_key = recipe.ingredients[0].catalog_id
+    with app.test_request_context("/"):
+        index = get_ingredient_index(get_candidate_snapshot())
+    assert recipe.id in index.postings[rice_key]
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+        sess["_fresh"] = True
+    response = client.post(
+        f"/edit_recipe/{recipe.id}",
+        data={
+            # Only an ingredient is removed; the recipe itself is unchanged
+            "name": recipe.name,
+            "method": "Boil.",
+            "servings": "6",
+            "is_dinner": "y",
+            "ingredient_id[]": [str(recipe.ingredients[1].id)],
+            "ingredient_name[]": ["Peas"],
+            "ingredient_qty[]": ["100"],
+            "ingredient_unit[]": ["g"],
+            "ingredient_aisle[]": [""],
+        },
+    )
+    assert response.status_code == 302
+    with app.test_request_context("/"):
+        index = get_ingredient_index(get_candidate_snapshot())
+    assert recipe.id not in index.postings.get(rice_key, ())
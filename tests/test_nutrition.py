@@ -0,0 +1,225 @@
+import json
+import os
+import random
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+from flask_login import login_user
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import app as app_module
+from app import (
+    app,
+    db,
+    User,
+    Account,
+    Recipe,
+    Ingredient,
+    generate_meal_plan,
+    plan_period_days,
+    get_candidate_snapshot,
+    get_recipe_nutrients,
+)
+from nutrition import (
+    NUTRIENTS,
+    NutrientIngredientRow,
+    RecipeNutrients,
+    meet_nutrient_targets,
+    read_nutrient_csv,
+)
+from planner import (
+    MEAL_TYPE_BITS,
+    PlanSettings,
+    RecipeCandidate,
+    build_candidate_snapshot,
+    plan_meals,
+)
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+PROTEIN = NUTRIENTS.index("protein_g")
+
+
+def _write_nutrients(path, *rows):
+    header = ",".join(("name", "quantity", "unit") + NUTRIENTS)
+    path.write_text("\n".join((header,) + rows) + "\n")
+    return str(path)
+
+
+def test_nutrient_csv_is_read_per_base_unit(tmp_path):
+    rows, skipped = read_nutrient_csv(
+        _write_nutrients(
+            tmp_path / "nutrients.csv",
+            "Rice,100,g,350,7,78,0.6,1.3",
+            "eggs,1,,70,6.3,,4.8,0",
+            ",100,g,1,1,1,1,1",
+            "oats,abc,g,389,17,66,7,11",
+            "milk,0,ml,64,3.4,4.8,3.6,0",
+        )
+    )
+    assert skipped == [4, 5, 6]
+    assert [row.name for row in rows] == ["rice", "eggs"]
+    assert rows[0].name == "rice" and rows[0].base_unit == "g"
+    assert rows[0].values == pytest.approx((3.5, 0.07, 0.78, 0.006, 0.013))
+    assert rows[1].values[2] == 0  # missing values count as 0
+
+
+def _protein_lunches(proteins):
+    """A 6-serving stew (two leftover days) and 2-serving lunches."""
+    table = {("beef", "g"): (2.5, 0.25, 0, 0.2, 0)}
+    rows = [NutrientIngredientRow(1, 6, "beef", 600, "g")]
+    for i, protein in enumerate(proteins):
+        table[(f"item {i}", "")] = (100, protein, 10, 1, 1)
+        rows.append(NutrientIngredientRow(100 + i, 2, f"item {i}", 2, ""))
+    rows.append(NutrientIngredientRow(200, 2, "mystery", 1, ""))  # no data
+    candidates = build_candidate_snapshot(
+        [RecipeCandidate(1, 6, MEAL_TYPE_BITS["Dinner"])]
+        + [
+            RecipeCandidate(recipe_id, 2, MEAL_TYPE_BITS["Lunch"])
+            for recipe_id in list(range(100, 100 + len(proteins))) + [200]
+        ]
+    )
+    return candidates, RecipeNutrients(rows, table)
+
+
+def test_recipe_vectors_and_plan_totals(tmp_path):
+    candidates, nutrients = _protein_lunches([5, 30])
+    assert nutrients.matrix.dtype == np.float32
+    # 600 g of beef at 0.25 g protein per g over 6 servings
+    assert nutrients.matrix[nutrients.row(1), PROTEIN] == pytest.approx(25)
+    plan = {
+        "Monday": {
+            "Lunch": {"recipe_id": 101, "status": "new"},
+            "Dinner": {"recipe_id": 1, "status": "new"},
+        },
+        "Tuesday": {
+            "Lunch": {"recipe_id": -1, "status": "locked"},
+            "Dinner": {"recipe_id": 1, "status": "leftover"},
+        },
+    }
+    totals = nutrients.plan_totals(plan, 3)
+    assert totals.per_person[PROTEIN] == pytest.approx(30 + 25 + 25)
+    assert totals.household[PROTEIN] == pytest.approx(3 * 80)
+    assert totals.complete
+    plan["Tuesday"]["Lunch"] = {"recipe_id": 200, "status": "new"}
+    assert not nutrients.plan_totals(plan, 3).complete
+
+
+def test_targets_swap_in_richer_recipes_and_keep_leftovers():
+    candidates, nutrients = _protein_lunches([2, 2, 2, 2, 40, 40, 40, 40])
+    settings = PlanSettings(
+        meal_repeat_interval=3, nutrient_targets=(("protein_g", 45),)
+    )
+    for seed in range(10):
+        rng = random.Random(seed)
+        planned = plan_meals(candidates, settings, {}, 2, days=DAYS, rng=rng)
+        met = meet_nutrient_targets(
+            planned, candidates, nutrients, settings, 2, rng=rng
+        )
+        totals = nutrients.plan_totals(met.plan_ids, 2)
+        assert totals.per_person[PROTEIN] >= 45 * 7
+        assert met.warnings == planned.warnings
+        lunches = [met.plan_ids[day]["Lunch"]["recipe_id"] for day in DAYS]
+        for i in range(len(lunches) - 2):
+            assert len(set(lunches[i : i + 3])) == 3
+        assert [met.plan_ids[day]["Dinner"] for day in DAYS] == [
+            planned.plan_ids[day]["Dinner"] for day in DAYS
+        ]
+
+
+def test_unreachable_targets_are_a_warning():
+    candidates, nutrients = _protein_lunches([2, 2, 2])
+    settings = PlanSettings(nutrient_targets=(("fibre_g", 500),))
+    planned = plan_meals(
+        candidates, settings, {}, 2, days=DAYS[:3], rng=random.Random(1)
+    )
+    met = meet_nutrient_targets(planned, candidates, nutrients, settings, 2)
+    assert met.warnings[-1].startswith("This plan falls short of the daily fibre")
+
+
+@pytest.fixture
+def nutrient_app(tmp_path, monkeypatch):
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    monkeypatch.setattr(app_module.socketio, "emit", lambda *args, **kwargs: None)
+    with app.app_context():
+        db.create_all()
+        user = User(email="cook@example.com", name="Cook")
+        user.password_hash = "x"
+        account = Account(name="CookAccount")
+        account.users.append(user)
+        db.session.add_all([user, account])
+        for i in range(8):
+            recipe = Recipe(name=f"Dinner {i}", servings=2, is_dinner=True)
+            recipe.ingredients = [
+                Ingredient(name=f"Item {i}", quantity="200", unit="g")
+            ]
+            db.session.add(recipe)
+        account.settings.nutrient_targets = json.dumps({"protein_g": 30})
+        db.session.commit()
+        path = _write_nutrients(
+            tmp_path / "nutrients.csv",
+            # Dinners 0-3 give 10 g of protein a serving, 4-7 give 40 g
+            *(f"item {i},100,g,100,{10 if i < 4 else 40},0,0,0" for i in range(8)),
+        )
+        yield user.id, path
+        db.session.remove()
+        db.drop_all()
+
+
+def test_imported_nutrients_drive_plans_and_the_dashboard(nutrient_app):
+    user_id, path = nutrient_app
+    with app.test_request_context("/"):
+        before = get_recipe_nutrients(get_candidate_snapshot())
+    assert not before.has_data
+    result = app.test_cli_runner().invoke(args=["import-nutrients", path])
+    assert result.exit_code == 0, result.output
+    assert "Imported nutrients for 8 ingredients" in result.output
+
+    dates = plan_period_days("Monday", 4)
+    with app.test_request_context("/"):
+        login_user(db.session.get(User, user_id))
+        nutrients = get_recipe_nutrients(get_candidate_snapshot())
+        # The vectors are rebuilt once per catalog version, then reused
+        assert nutrients is not before
+        assert get_recipe_nutrients(get_candidate_snapshot()) is nutrients
+        for seed in range(5):
+            plan = generate_meal_plan(2, {}, dates=dates, seed=seed)
+            totals = nutrients.plan_totals(plan, 2)
+            assert totals.complete
+            assert totals.per_person[PROTEIN] >= 30 * len(dates)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+    page = client.get("/").get_data(as_text=True)
+    assert 'id="plan-nutrition"' in page
+    assert "Protein" in page and "of 210" in page
+
+
+def test_dashboard_totals_only_count_the_days_shown(nutrient_app):
+    user_id, path = nutrient_app
+    app.test_cli_runner().invoke(args=["import-nutrients", path])
+    rich_id = Recipe.query.filter_by(name="Dinner 4").one().id
+    db.session.get(User, user_id).accounts.first().settings.meal_plan_duration = 2
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+        # A week-long plan left in the session from before the change
+        sess["current_plan_ids"] = {
+            day.isoformat(): {"Dinner": {"recipe_id": rich_id, "status": "new"}}
+            for day in plan_period_days("Monday", 7)
+        }
+    page = client.get("/").get_data(as_text=True)
+    # Two days of 40 g protein a serving, against two days of a 30 g target
+    assert "Protein 80 g of 60" in page
@@ -0,0 +1,145 @@
+import itertools
+import os
+import random
+import sys
+from pathlib import Path
+import pytest
+from flask_login import login_user
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app import (
+    app,
+    db,
+    Recipe,
+    Ingredient,
+    User,
+    Account,
+    generate_meal_plan,
+    plan_period_days,
+    generate_shopping_list_data,
+)
+import overlap
+from overlap import IngredientMatrix, minimize_shopping_list
+from planner import (
+    MEAL_TYPE_BITS,
+    PLANNING_MODE_OVERLAP,
+    PlanSettings,
+    RecipeCandidate,
+    build_candidate_snapshot,
+    plan_meals,
+)
+
+DINNER = MEAL_TYPE_BITS["Dinner"]
+# Two pasta dinners share most ingredients; the others share nothing
+INGREDIENTS = {
+    1: ["pasta", "tomato"],
+    2: ["pasta", "tomato", "basil"],
+    **{i: [f"item {i}-{n}" for n in range(3)] for i in range(3, 11)},
+}
+
+
+def _plan(ingredients, servings=2, locked=None, days=("Monday", "Tuesday"), seed=0):
+    # A repeat interval keeps the random start from cooking one recipe twice
+    settings = PlanSettings(meal_repeat_interval=len(days))
+    candidates = build_candidate_snapshot(
+        RecipeCandidate(recipe_id, servings, DINNER) for recipe_id in ingredients
+    )
+    matrix = IngredientMatrix(ingredients)
+    result = plan_meals(
+        candidates, settings, locked or {}, 2, days=list(days), rng=random.Random(seed)
+    )
+    improved = minimize_shopping_list(
+        result, candidates, matrix, settings, 2, rng=random.Random(seed)
+    )
+    return result, improved, matrix
+
+
+def _dinners(plan):
+    return [meals["Dinner"]["recipe_id"] for meals in plan.plan_ids.values()]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_overlap_finds_the_recipes_sharing_ingredients(seed):
+    result, improved, matrix = _plan(INGREDIENTS, seed=seed)
+    assert sorted(_dinners(improved)) == [1, 2]
+    assert matrix.distinct_ingredients(_dinners(improved)) == 3
+    assert matrix.distinct_ingredients(_dinners(improved)) <= matrix.distinct_ingredients(
+        _dinners(result)
+    )
+
+
+def test_overlap_keeps_locks_and_moves_leftovers_with_their_recipe():
+    locked = {"Monday_Dinner": {"recipe_id": 2, "lock_type": "user"}}
+    result, improved, matrix = _plan(
+        INGREDIENTS,
+        servings=4,
+        locked=locked,
+        days=("Monday", "Tuesday", "Wednesday", "Thursday"),
+    )
+    plan = improved.plan_ids
+    assert plan["Monday"]["Dinner"]["recipe_id"] == 2
+    # Tuesday is picked to match the locked pasta; Wednesday is its leftover
+    assert plan["Tuesday"]["Dinner"]["recipe_id"] == 1
+    assert plan["Wednesday"]["Dinner"]["status"] == "leftover"
+    assert plan["Wednesday"]["Dinner"]["recipe_id"] == 1
+    assert improved.lock_changes["Wednesday_Dinner"]["recipe_id"] == 1
+    # The input plan is left untouched
+    assert result.lock_changes["Wednesday_Dinner"]["recipe_id"] == (
+        result.plan_ids["Tuesday"]["Dinner"]["recipe_id"]
+    )
+
+
+def test_the_search_does_not_depend_on_the_clock(monkeypatch):
+    days = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday")
+    expected = [
+        _dinners(_plan(INGREDIENTS, days=days, seed=seed)[1]) for seed in range(3)
+    ]
+    # A loaded machine: every clock reading is 30 ms after the last
+    clock = itertools.count(step=0.03)
+    monkeypatch.setattr(overlap.time, "perf_counter", lambda: next(clock))
+    assert [
+        _dinners(_plan(INGREDIENTS, days=days, seed=seed)[1]) for seed in range(3)
+    ] == expected
+
+
+@pytest.fixture
+def test_app():
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        user = User(email="test@example.com", name="Test")
+        user.password_hash = "x"
+        account = Account(name="TestAccount")
+        account.users.append(user)
+        db.session.add_all([user, account])
+        for recipe_id, names in INGREDIENTS.items():
+            recipe = Recipe(id=recipe_id, name=f"Dinner {recipe_id}", servings=2, is_dinner=True)
+            recipe.ingredients = [Ingredient(name=name, quantity="1") for name in names]
+            db.session.add(recipe)
+        db.session.commit()
+        yield user
+        db.session.remove()
+        db.drop_all()
+
+
+def test_overlap_mode_shortens_the_shopping_list(test_app):
+    user = test_app
+    user.accounts[0].settings.planning_mode = PLANNING_MODE_OVERLAP
+    user.accounts[0].settings.meal_repeat_interval = 2
+    db.session.commit()
+    with app.test_request_context("/"):
+        login_user(user)
+        plan = generate_meal_plan(2, {}, dates=plan_period_days("Monday", 2))
+        shopping_list = generate_shopping_list_data(plan)
+    assert sorted(item["name"] for items in shopping_list.values() for item in items) == [
+        "basil",
+        "pasta",
+        "tomato",
+    ]
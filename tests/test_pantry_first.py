@@ -0,0 +1,104 @@
+import os
+import random
+import sys
+from pathlib import Path
+import pytest
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import app as app_module
+from app import app, db, User, Account, Recipe, Ingredient, PantryItem
+from planner import (
+    MEAL_TYPE_BITS,
+    IngredientIndex,
+    PlanSettings,
+    RecipeCandidate,
+    build_candidate_snapshot,
+    plan_meals,
+)
+
+
+def test_pantry_coverage_only_scores_recipes_sharing_stock():
+    index = IngredientIndex(
+        {1: ["eggs", "butter"], 2: ["eggs", "flour", "milk", "sugar"], 3: ["rice"]}
+    )
+    assert index.pantry_coverage(["eggs", "butter", "salt"]) == {1: 1.0, 2: 0.25}
+    assert index.pantry_coverage([]) == {}
+
+
+def test_scores_rank_picks_and_each_scored_recipe_is_used_once():
+    candidates = build_candidate_snapshot(
+        RecipeCandidate(recipe_id, 2, MEAL_TYPE_BITS["Dinner"]) for recipe_id in range(1, 9)
+    )
+    result = plan_meals(
+        candidates,
+        PlanSettings(),
+        {},
+        2,
+        days=["Monday", "Tuesday", "Wednesday"],
+        rng=random.Random(3),
+        scores={5: 1.0, 6: 0.5},
+    )
+    dinners = [meals["Dinner"]["recipe_id"] for meals in result.plan_ids.values()]
+    assert dinners[:2] == [5, 6]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    monkeypatch.setattr(app_module.socketio, "emit", lambda *args, **kwargs: None)
+    with app.app_context():
+        db.create_all()
+        user = User(email="cook@example.com", name="Cook")
+        user.password_hash = "x"
+        account = Account(name="CookAccount")
+        account.users.append(user)
+        omelette = Recipe(name="Omelette", servings=2, is_dinner=True)
+        omelette.ingredients = [
+            Ingredient(name="Eggs", quantity="3"),
+            Ingredient(name="Butter", quantity="10", unit="g"),
+        ]
+        curries = []
+        for i in range(5):
+            curry = Recipe(name=f"Curry {i}", servings=2, is_dinner=True)
+            curry.ingredients = [
+                Ingredient(name="Chicken", quantity="500", unit="g"),
+                Ingredient(name="Rice", quantity="200", unit="g"),
+            ]
+            curries.append(curry)
+        db.session.add_all([user, account, omelette, *curries])
+        db.session.add_all(
+            [
+                PantryItem(name="eggs", quantity="6"),
+                PantryItem(name="Butter", quantity="250", unit="g"),
+                PantryItem(name="Rice", quantity="0", unit="g"),
+            ]
+        )
+        db.session.commit()
+        test_client = app.test_client()
+        with test_client.session_transaction() as sess:
+            sess["_user_id"] = str(user.id)
+            sess["_fresh"] = True
+        yield test_client, account, omelette.id
+        db.session.remove()
+        db.drop_all()
+
+
+def test_dashboard_pantry_mode_plans_from_the_cupboard(client):
+    test_client, account, omelette_id = client
+    response = test_client.post("/", data={"planning_mode": "pantry"})
+    assert response.status_code == 302
+    assert account.settings.planning_mode == "pantry"
+    with test_client.session_transaction() as sess:
+        plan = sess["current_plan_ids"]
+    assert plan[min(plan)]["Dinner"]["recipe_id"] == omelette_id
+    # The mode picker shows the saved setting
+    page = test_client.get("/").get_data(as_text=True)
+    assert '<option value="pantry" selected>' in page
@@ -0,0 +1,319 @@
+import datetime
+import itertools
+import random
+import sys
+from pathlib import Path
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from planner import (
+    MEAL_TYPE_BITS,
+    PlanCache,
+    PlanSettings,
+    RecipeCandidate,
+    build_candidate_snapshot,
+    carry_over_locks,
+    date_slot_id,
+    diff_plans,
+    iter_plan_days,
+    plan_cache_key,
+    plan_dated_meals,
+    plan_manual_leftovers,
+    plan_meals,
+)
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DINNER = 1
+BREAKFAST = 2
+
+
+def _candidates(lunches=0):
+    recipes = [
+        RecipeCandidate(DINNER, 6, MEAL_TYPE_BITS["Dinner"]),
+        RecipeCandidate(BREAKFAST, 4, MEAL_TYPE_BITS["Breakfast"]),
+    ]
+    recipes += [
+        RecipeCandidate(100 + i, 2, MEAL_TYPE_BITS["Lunch"]) for i in range(lunches)
+    ]
+    return build_candidate_snapshot(recipes)
+
+
+def _plan(locked=None, days=None, settings=PlanSettings(), lunches=0, **kwargs):
+    return plan_meals(
+        _candidates(lunches),
+        settings,
+        locked or {},
+        2,
+        days=days or DAYS[:4],
+        rng=random.Random(7),
+        **kwargs,
+    )
+
+
+def test_first_meal_leftover_label():
+    plan = _plan().plan_ids
+    assert plan["Tuesday"]["Dinner"]["status"] == "leftover"
+    assert plan["Tuesday"]["Dinner"]["manual_text"] == "Leftover from Monday's dinner"
+
+
+def test_correct_number_of_leftovers():
+    result = _plan()
+    leftovers = [
+        result.plan_ids[day]["Dinner"]
+        for day in ["Tuesday", "Wednesday"]
+        if result.plan_ids[day]["Dinner"]["status"] == "leftover"
+    ]
+    assert len(leftovers) == 2
+    # The leftover slots come back as lock changes instead of being written
+    assert result.lock_changes["Tuesday_Dinner"]["lock_type"] == "leftover"
+    dinner_locks = {slot for slot in result.lock_changes if slot.endswith("_Dinner")}
+    assert dinner_locks == {"Tuesday_Dinner", "Wednesday_Dinner"}
+
+
+def test_skip_locked_slot():
+    locked = {
+        "Tuesday_Dinner": {
+            "recipe_id": DINNER,
+            "manual": False,
+            "default": False,
+            "lock_type": "user",
+        }
+    }
+    plan = _plan(locked=locked).plan_ids
+    assert plan["Tuesday"]["Dinner"]["status"] == "locked"
+    assert plan["Wednesday"]["Dinner"]["status"] == "leftover"
+    assert plan["Thursday"]["Dinner"]["status"] == "leftover"
+
+
+def test_missing_locked_recipe_is_a_warning():
+    locked = {"Monday_Lunch": {"recipe_id": 999, "lock_type": "user"}}
+    result = _plan(locked=locked)
+    assert result.warnings == [
+        "Locked recipe ID 999 for Monday_Lunch not found in database. Lock ignored."
+    ]
+    assert result.plan_ids["Monday"]["Lunch"]["status"] == "empty"
+
+
+def test_same_seed_gives_same_plan():
+    first = _plan(days=DAYS, lunches=5)
+    second = _plan(days=DAYS, lunches=5)
+    assert first.plan_ids == second.plan_ids
+
+
+def test_manual_leftovers():
+    locked = {"Monday_Breakfast": {"recipe_id": BREAKFAST, "manual": True}}
+    plan = _plan(locked=locked).plan_ids
+    locks = plan_manual_leftovers(_candidates(), plan, locked, 2, DAYS[:4])
+    assert set(locks) == {"Tuesday_Breakfast"}
+    assert plan["Tuesday"]["Breakfast"]["status"] == "leftover"
+
+
+def test_leftover_locks_last_while_their_source_keeps_its_recipe():
+    previous = _plan().plan_ids
+    assert previous["Tuesday"]["Dinner"]["leftover_of"] == "Monday_Dinner"
+    leftover = {"recipe_id": DINNER, "lock_type": "leftover", "text": "Leftover"}
+    locked = {
+        "Monday_Dinner": {"recipe_id": DINNER, "lock_type": "user"},
+        "Tuesday_Dinner": leftover,
+        "Wednesday_Dinner": leftover,
+    }
+    locks, stale = carry_over_locks(previous, locked)
+    assert stale == []
+    assert locks["Tuesday_Dinner"]["source"] == "Monday_Dinner"
+    replanned = _plan(locked=locks).plan_ids
+    assert replanned["Tuesday"]["Dinner"]["status"] == "leftover"
+    assert replanned["Tuesday"]["Dinner"]["leftover_of"] == "Monday_Dinner"
+    # Once Monday is unlocked its leftovers are planned again
+    del locked["Monday_Dinner"]
+    locks, stale = carry_over_locks(previous, locked)
+    assert stale == ["Tuesday_Dinner", "Wednesday_Dinner"]
+    assert set(locks) == set()
+
+
+def test_diff_plans_lists_changed_slots_and_recipes():
+    before = _plan(lunches=3).plan_ids
+    after = {day: dict(meals) for day, meals in before.items()}
+    old_lunch = before["Monday"]["Lunch"]["recipe_id"]
+    after["Monday"]["Lunch"] = {"recipe_id": 999, "status": "new"}
+    diff = diff_plans(before, after)
+    assert [change.slot_id for change in diff.changes] == ["Monday_Lunch"]
+    assert diff.changes[0].before["recipe_id"] == old_lunch
+    assert diff.added_recipe_ids == {999}
+    still_cooked = {
+        meals["Lunch"]["recipe_id"] for day, meals in before.items() if day != "Monday"
+    }
+    assert diff.removed_recipe_ids == {old_lunch} - still_cooked
+    assert diff_plans(before, before).changes == []
+
+
+START = datetime.date(2026, 10, 19)  # a Monday
+
+
+def _stream(num_days=None, locked=None, settings=PlanSettings(), lunches=0):
+    return iter_plan_days(
+        _candidates(lunches),
+        settings,
+        2,
+        START,
+        num_days,
+        locked_meals=locked,
+        rng=random.Random(7),
+    )
+
+
+def test_plan_stream_is_keyed_by_date_and_carries_leftovers_over():
+    days = list(_stream(31))
+    assert [plan_day.date for plan_day in days] == [
+        START + datetime.timedelta(days=i) for i in range(31)
+    ]
+    # The 6-serving dinner feeds two more days, week after week
+    statuses = [plan_day.meals["Dinner"]["status"] for plan_day in days]
+    assert statuses == (["new", "leftover", "leftover"] * 11)[:31]
+    assert days[7].meals["Dinner"]["leftover_of"] == date_slot_id(
+        START + datetime.timedelta(days=6), "Dinner"
+    )
+    assert days[1].meals["Dinner"]["manual_text"] == (
+        "Leftover from Monday 19 October's dinner"
+    )
+
+
+def test_plan_stream_holds_repeat_interval_and_locks_for_months():
+    locked_day = START + datetime.timedelta(days=50)
+    locked = {
+        date_slot_id(locked_day, "Lunch"): {"recipe_id": 100, "lock_type": "user"}
+    }
+    stream = _stream(
+        locked=locked, settings=PlanSettings(meal_repeat_interval=4), lunches=5
+    )
+    lunches = [
+        plan_day.meals["Lunch"]["recipe_id"] for plan_day in itertools.islice(stream, 120)
+    ]
+    assert lunches[50] == 100
+    for i in range(len(lunches) - 3):
+        assert len(set(lunches[i : i + 4])) == 4
+
+
+def test_dated_plan_result_records_leftover_locks_by_date():
+    tuesday = date_slot_id(START + datetime.timedelta(days=1), "Dinner")
+    locked = {
+        date_slot_id(START, "Breakfast"): {"recipe_id": 999, "lock_type": "user"},
+        # Outside the plan, so not reported
+        "2026-12-25_Lunch": {"recipe_id": 998, "lock_type": "user"},
+    }
+    result = plan_dated_meals(
+        _candidates(), PlanSettings(), locked, 2, START, 7, rng=random.Random(7)
+    )
+    assert list(result.plan_ids) == [
+        (START + datetime.timedelta(days=i)).isoformat() for i in range(7)
+    ]
+    assert result.leftover_sources[tuesday] == date_slot_id(START, "Dinner")
+    assert result.lock_changes[tuesday] == {
+        "recipe_id": DINNER,
+        "manual": False,
+        "default": False,
+        "lock_type": "leftover",
+        "text": "Leftover from Monday 19 October's dinner",
+    }
+    assert set(result.lock_changes) == set(result.leftover_sources)
+    assert result.warnings == [
+        "Locked recipe ID 999 for 2026-10-19_Breakfast not found in database. "
+        "Lock ignored."
+    ]
+
+
+def _lunches(interval, lunches, **kwargs):
+    settings = PlanSettings(meal_repeat_interval=interval)
+    plan = _plan(days=DAYS, settings=settings, lunches=lunches, **kwargs).plan_ids
+    return [plan[day]["Lunch"]["recipe_id"] for day in DAYS]
+
+
+def test_repeat_interval_spaces_out_recipes():
+    lunches = _lunches(interval=3, lunches=4)
+    for i, recipe_id in enumerate(lunches):
+        assert recipe_id not in lunches[max(i - 2, 0) : i]
+
+
+def test_repeat_interval_honours_history_and_locks():
+    yesterday, wednesday = 100, 101
+    locked = {
+        "Wednesday_Lunch": {
+            "recipe_id": wednesday,
+            "manual": False,
+            "default": False,
+            "lock_type": "user",
+        }
+    }
+    lunches = _lunches(
+        interval=3, lunches=5, history=[{"Lunch": yesterday}], locked=locked
+    )
+    assert lunches[2] == wednesday
+    assert yesterday not in lunches[:2]
+    assert wednesday not in lunches[:2] + lunches[3:5]
+
+
+def test_repeat_interval_falls_back_when_too_few_recipes():
+    lunches = _lunches(interval=5, lunches=2)
+    assert all(lunches)
+    # Once both are in the window the least recently served one repeats
+    assert lunches[2] == lunches[0]
+
+
+def _cache_key(seed, catalog_key=("token", 1), locked=None):
+    return plan_cache_key(
+        1, PlanSettings(), locked or {}, catalog_key, seed, DAYS[:4], 2
+    )
+
+
+def test_plan_cache_is_a_bounded_lru():
+    cache = PlanCache(max_size=2)
+    for seed in range(3):
+        cache.put(_cache_key(seed), _plan())
+    assert cache.get(_cache_key(0)) is None  # evicted, least recently used
+    assert cache.get(_cache_key(2)) == _plan()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    # Another lock set is another entry
+    assert cache.get(_cache_key(2, locked={"Monday_Lunch": {"recipe_id": 1}})) is None
+
+
+def test_plan_cache_hands_out_copies_and_drops_old_catalog_versions():
+    cache = PlanCache()
+    cache.put(_cache_key(1), _plan())
+    cached = cache.get(_cache_key(1))
+    cached.plan_ids["Monday"]["Dinner"] = None
+    assert cache.get(_cache_key(1)).plan_ids["Monday"]["Dinner"] is not None
+
+    assert cache.get(_cache_key(1, catalog_key=("token", 2))) is None
+    assert cache.stats()["size"] == 0
+    assert cache.get(_cache_key(1)) is None
+
+
+def test_a_stale_catalog_version_does_not_empty_the_plan_cache():
+    cache = PlanCache()
+    cache.put(_cache_key(1, catalog_key=("token", 2)), _plan())
+    # A worker still on version 1 misses without evicting or storing anything
+    cache.put(_cache_key(1), _plan())
+    assert cache.get(_cache_key(1)) is None
+    assert cache.stats()["size"] == 1
+    assert cache.get(_cache_key(1, catalog_key=("token", 2))) == _plan()
+    # Another database starts over
+    assert cache.get(_cache_key(1, catalog_key=("other", 1))) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_plan_cache_key_covers_the_price_and_nutrient_data():
+    key = plan_cache_key(
+        1, PlanSettings(), {}, ("token", 1), 1, DAYS, 2, data_versions=["a", None]
+    )
+    same = plan_cache_key(
+        1, PlanSettings(), {}, ("token", 1), 1, DAYS, 2, data_versions=["a", None]
+    )
+    changed = plan_cache_key(
+        1, PlanSettings(), {}, ("token", 1), 1, DAYS, 2, data_versions=["b", None]
+    )
+    assert key == same
+    assert key != changed
@@ -0,0 +1,114 @@
+import os
+import re
+import sys
+from pathlib import Path
+import pytest
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from sqlalchemy import event
+
+import app as app_module
+from app import (
+    app,
+    db,
+    User,
+    Account,
+    Recipe,
+    Ingredient,
+    PantryItem,
+    ShoppingListItem,
+    aggregate_ingredients_sql,
+    update_pantry,
+)
+
+SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    monkeypatch.setattr(app_module.socketio, "emit", lambda *args, **kwargs: None)
+    with app.app_context():
+        db.create_all()
+        user = User(email="planner@example.com", name="Planner")
+        user.password_hash = "x"
+        account = Account(name="PlanAccount")
+        account.users.append(user)
+        recipe = Recipe(name="Chili", servings=4, is_dinner=True)
+        recipe.ingredients = [
+            Ingredient(name="Beans", quantity="400", unit="g", aisle="Canned"),
+            Ingredient(name="Onion", quantity="1", aisle="Produce"),
+        ]
+        db.session.add_all(
+            [user, account, recipe, PantryItem(name="Onion", quantity="2")]
+        )
+        db.session.add(
+            ShoppingListItem(account_id=1, name="Beans", quantity=400, unit="g")
+        )
+        db.session.commit()
+        test_client = app.test_client()
+        with test_client.session_transaction() as sess:
+            sess["_user_id"] = str(user.id)
+            sess["_fresh"] = True
+        yield test_client, recipe.id
+        db.session.remove()
+        db.drop_all()
+
+
+def capture_statements():
+    """Records every SELECT/UPDATE sent to the database while active."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return statements, lambda: event.remove(
+        engine, "before_cursor_execute", before_cursor_execute
+    )
+
+
+def full_table_scans(statements):
+    """EXPLAIN QUERY PLAN each statement; return (table, sql) for table scans."""
+    tables = set(db.metadata.tables)
+    scans = []
+    for statement, parameters in statements:
+        plan = db.session.connection().exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + statement, parameters
+        )
+        for row in plan:
+            match = SCAN_RE.match(row.detail)
+            if match and match.group(1) in tables and "USING" not in row.detail:
+                scans.append((match.group(1), statement))
+    return scans
+
+
+def test_hot_queries_use_indexes(client):
+    test_client, recipe_id = client
+    statements, stop = capture_statements()
+    try:
+        aggregate_ingredients_sql({recipe_id})
+        with app.test_request_context("/"):
+            update_pantry("onion ", "3", "")
+        Recipe.query.filter_by(is_breakfast=True).all()
+        Recipe.query.filter_by(is_lunch=True).all()
+        Recipe.query.filter_by(is_dinner=True).all()
+        assert test_client.get("/get-shopping-list-content").status_code == 200
+        assert test_client.get("/shopping-list/changes?since=0").status_code == 200
+        test_client.post(
+            "/manage_aisles", data={"aisle_beans": "Tins", "original_aisle_beans": ""}
+        )
+    finally:
+        stop()
+    assert statements
+    assert full_table_scans(statements) == []
@@ -0,0 +1,302 @@
+import os
+import sys
+from pathlib import Path
+import pytest
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import app as app_module
+from app import app, db, User, Account, ShoppingListItem
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    app.config["WTF_CSRF_ENABLED"] = False
+    emitted = []
+    monkeypatch.setattr(
+        app_module.socketio,
+        "emit",
+        lambda event, data, room=None: emitted.append((event, data, room)),
+    )
+    with app.app_context():
+        db.create_all()
+        user = User(email="shopper@example.com", name="Shopper")
+        user.password_hash = "x"
+        account = Account(name="ShopAccount")
+        account.users.append(user)
+        db.session.add_all([user, account])
+        db.session.commit()
+        test_client = app.test_client()
+        with test_client.session_transaction() as sess:
+            sess["_user_id"] = str(user.id)
+            sess["_fresh"] = True
+        yield test_client, account, emitted
+        db.session.remove()
+        db.drop_all()
+
+
+def _add_item(account, name="Milk", aisle="Dairy"):
+    item = ShoppingListItem(
+        account_id=account.id, name=name, quantity=1, unit="l", aisle=aisle
+    )
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def test_add_item_broadcasts_typed_delta(client):
+    test_client, account, emitted = client
+    test_client.post(
+        "/add-shopping-item", data={"name": "Eggs", "quantity": "6", "aisle": "Dairy"}
+    )
+    event, data, room = emitted[-1]
+    assert event == "shopping_list_delta"
+    assert room == f"shopping_list_{account.id}"
+    assert data["type"] == "item_added"
+    assert data["item"]["name"] == "Eggs"
+
+
+def test_check_and_delete_broadcast_deltas(client):
+    test_client, account, emitted = client
+    item = _add_item(account)
+    item_id = item.id
+
+    test_client.post(
+        "/update-shopping-item-checked",
+        json={"item_id": item_id, "is_checked": True},
+        headers={"X-CSRFToken": "test"},
+    )
+    assert emitted[-1][1]["type"] == "item_checked"
+    assert emitted[-1][1]["item_id"] == item_id
+    assert emitted[-1][1]["is_checked"] is True
+
+    test_client.post("/delete-shopping-item", json={"item_id": item_id})
+    assert emitted[-1][1] == {"type": "item_deleted", "version": 2, "item_id": item_id}
+
+
+def test_writes_bump_version_and_deltas_carry_it(client):
+    test_client, account, emitted = client
+    test_client.post("/add-shopping-item", data={"name": "Bread"})
+    test_client.post("/add-shopping-item", data={"name": "Jam"})
+    assert [data["version"] for _, data, _ in emitted] == [1, 2]
+
+    response = test_client.get("/check-shopping-list-updates?version=2")
+    assert response.get_json() == {"needs_update": False, "version": 2}
+    response = test_client.get("/check-shopping-list-updates?version=1")
+    assert response.get_json()["needs_update"] is True
+
+    # The version is part of every delta, not left to the caller
+    app_module.emit_shopping_list_delta(account.id, "list_regenerated", 3)
+    assert emitted[-1][1] == {"type": "list_regenerated", "version": 3}
+    with pytest.raises(TypeError):
+        app_module.emit_shopping_list_delta(account.id, "list_regenerated")
+
+
+def test_shopping_list_content_conditional_get(client):
+    test_client, account, emitted = client
+    _add_item(account)
+    first = test_client.get("/get-shopping-list-content")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["X-Shopping-List-Version"] == "0"
+
+    cached = test_client.get(
+        "/get-shopping-list-content", headers={"If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+
+    test_client.post("/add-shopping-item", data={"name": "Butter"})
+    changed = test_client.get(
+        "/get-shopping-list-content", headers={"If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+    assert b"Butter" in changed.data
+
+    page = test_client.get("/shopping-list")
+    cached_page = test_client.get(
+        "/shopping-list", headers={"If-None-Match": page.headers["ETag"]}
+    )
+    assert cached_page.status_code == 304
+
+
+def test_changes_since_version_returns_only_changed_rows(client):
+    test_client, account, emitted = client
+    test_client.post("/add-shopping-item", data={"name": "Rice"})
+    test_client.post("/add-shopping-item", data={"name": "Beans"})
+    rice_id, beans_id = [data["item"]["id"] for _, data, _ in emitted]
+    test_client.post("/delete-shopping-item", json={"item_id": rice_id})
+
+    changes = test_client.get("/shopping-list/changes?since=1").get_json()
+    assert changes["version"] == 3
+    assert changes["reset"] is False
+    assert [item["name"] for item in changes["upserts"]] == ["Beans"]
+    assert changes["deletes"] == [rice_id]
+
+    assert test_client.get("/shopping-list/changes?since=3").get_json()["upserts"] == []
+    assert test_client.get("/shopping-list/changes?since=9").get_json()["reset"] is True
+    assert test_client.get("/shopping-list/changes").status_code == 400
+
+
+def test_change_log_is_pruned_past_retention(client, monkeypatch):
+    test_client, account, emitted = client
+    monkeypatch.setattr(app_module, "SHOPPING_LIST_CHANGE_RETENTION", 2)
+    for name in ["A", "B", "C", "D"]:
+        test_client.post("/add-shopping-item", data={"name": name})
+    assert test_client.get("/shopping-list/changes?since=1").get_json()["reset"] is True
+    changes = test_client.get("/shopping-list/changes?since=2").get_json()
+    assert sorted(item["name"] for item in changes["upserts"]) == ["C", "D"]
+    assert app_module.ShoppingListChange.query.count() == 2
+
+
+def test_sync_shopping_list_applies_minimal_diff(client):
+    test_client, account, emitted = client
+    milk = _add_item(account, name="Milk", aisle="Dairy")
+    bread = _add_item(account, name="Bread", aisle="Bakery")
+    milk.is_checked = True
+    db.session.commit()
+    milk_id, bread_id = milk.id, bread.id
+
+    result = app_module.sync_shopping_list(
+        account.id,
+        {
+            "Dairy": [{"name": "milk", "quantity": 1, "unit": "l"}],
+            "Produce": [{"name": "apples", "quantity": 4, "unit": ""}],
+        },
+    )
+
+    rows = {row.name: row for row in ShoppingListItem.query.all()}
+    assert set(rows) == {"Milk", "apples"}
+    # Unchanged row keeps its ID and checked state and is not rewritten
+    assert rows["Milk"].id == milk_id and rows["Milk"].is_checked is True
+    assert result["deletes"] == [bread_id]
+    assert [item["name"] for item in result["upserts"]] == ["apples"]
+    assert [data["type"] for _, data, _ in emitted] == ["items_changed"]
+
+    # Re-running with the same data is a no-op
+    again = app_module.sync_shopping_list(
+        account.id,
+        {
+            "Dairy": [{"name": "milk", "quantity": 1, "unit": "l"}],
+            "Produce": [{"name": "apples", "quantity": 4, "unit": ""}],
+        },
+    )
+    assert again["version"] is None
+    assert len(emitted) == 1
+
+
+def test_a_display_unit_change_keeps_the_row_and_its_tick(client):
+    test_client, account, emitted = client
+    flour = _add_item(account, name="Flour", aisle="Baking")
+    flour.quantity, flour.unit, flour.is_checked = 500, "g", True
+    db.session.commit()
+    flour_id = flour.id
+
+    result = app_module.sync_shopping_list(
+        account.id, {"Baking": [{"name": "flour", "quantity": 1.5, "unit": "kg"}]}
+    )
+    row = ShoppingListItem.query.one()
+    # Same ingredient, same base unit: updated in place, still ticked
+    assert (row.id, row.quantity, row.unit) == (flour_id, 1.5, "kg")
+    assert row.is_checked is True
+    assert result["deletes"] == []
+    assert [item["id"] for item in result["upserts"]] == [flour_id]
+
+
+def test_aisle_change_updates_catalog_and_moves_list_rows(client):
+    test_client, account, emitted = client
+    recipe = app_module.Recipe(name="Porridge", servings=1, is_breakfast=True)
+    recipe.ingredients = [app_module.Ingredient(name="Oats", quantity="80", unit="g")]
+    db.session.add_all(
+        [recipe, app_module.PantryItem(name="oats ", quantity="50", unit="g")]
+    )
+    app_module.set_catalog_aisles({"Oats": "Cereal"})
+    item = _add_item(account, name="OATS", aisle=None)
+    assert item.aisle == "Cereal"
+    catalog = app_module.IngredientCatalog.query.all()
+    # Ingredient, pantry item and shopping row share one catalog entry
+    assert [(c.normalized_name, c.aisle) for c in catalog] == [("oats", "Cereal")]
+    assert item.catalog_id == recipe.ingredients[0].catalog_id == catalog[0].id
+    assert app_module.get_distinct_aisles() == ["Cereal"]
+
+    test_client.post(
+        "/manage_aisles",
+        data={"aisle_oats": "Breakfast", "original_aisle_oats": "Cereal"},
+    )
+    db.session.expire_all()
+    assert app_module.IngredientCatalog.query.one().aisle == "Breakfast"
+    assert db.session.get(ShoppingListItem, item.id).aisle == "Breakfast"
+    assert emitted[-1][1]["type"] == "list_regenerated"
+    # Aggregation reads the aisle from the catalog too
+    assert list(app_module.aggregate_ingredients_sql({recipe.id})) == ["Breakfast"]
+
+
+def test_the_catalog_alone_sets_the_aisle(client):
+    test_client, account, emitted = client
+    recipe = app_module.Recipe(name="Porridge", servings=1, is_breakfast=True)
+    recipe.ingredients = [app_module.Ingredient(name="Oats", quantity="80", unit="g")]
+    db.session.add(recipe)
+    app_module.set_catalog_aisles({"oats": "Cereal"})
+    db.session.commit()
+    # An old per-row aisle write leaves the catalog alone
+    recipe.ingredients[0].aisle = "Baking"
+    db.session.add(app_module.PantryItem(name="Oats", aisle="Pantry"))
+    db.session.commit()
+    entry = app_module.IngredientCatalog.query.one()
+    assert entry.aisle == "Cereal"
+    # Clearing the catalog aisle does not fall back to the row's own
+    test_client.post(
+        "/manage_aisles", data={"aisle_oats": "", "original_aisle_oats": "Cereal"}
+    )
+    db.session.expire_all()
+    assert app_module.catalog_aisle(recipe.ingredients[0]) is None
+    assert list(app_module.aggregate_ingredients_sql({recipe.id})) == ["Other"]
+
+
+def test_editing_a_recipe_aisle_updates_the_catalog(client):
+    test_client, account, emitted = client
+    recipe = app_module.Recipe(name="Porridge", servings=1, is_breakfast=True)
+    recipe.ingredients = [app_module.Ingredient(name="Oats", quantity="80", unit="g")]
+    db.session.add(recipe)
+    app_module.set_catalog_aisles({"oats": "Cereal"})
+    db.session.commit()
+    item = _add_item(account, name="Oats", aisle=None)
+    ingredient = recipe.ingredients[0]
+    page = test_client.get(f"/edit_recipe/{recipe.id}").get_data(as_text=True)
+    assert 'value="Cereal"' in page
+
+    form = {
+        "name": "Porridge",
+        "servings": "1",
+        "is_breakfast": "y",
+        "ingredient_id[]": [str(ingredient.id), ""],
+        "ingredient_name[]": ["Oats", "Milk"],
+        "ingredient_qty[]": ["80", "200"],
+        "ingredient_unit[]": ["g", "ml"],
+        "ingredient_aisle[]": ["Breakfast", ""],
+    }
+    test_client.post(f"/edit_recipe/{recipe.id}", data=form)
+    db.session.expire_all()
+    entries = dict(
+        db.session.query(
+            app_module.IngredientCatalog.normalized_name,
+            app_module.IngredientCatalog.aisle,
+        )
+    )
+    assert entries == {"oats": "Breakfast", "milk": None}
+    assert db.session.get(app_module.Ingredient, ingredient.id).aisle is None
+    assert db.session.get(ShoppingListItem, item.id).aisle == "Breakfast"
+    assert emitted[-1][1]["type"] == "list_regenerated"
+
+    # Clearing it on the form clears the catalog aisle
+    form["ingredient_aisle[]"] = ["", ""]
+    test_client.post(f"/edit_recipe/{recipe.id}", data=form)
+    db.session.expire_all()
+    oats = app_module.IngredientCatalog.query.filter_by(normalized_name="oats").one()
+    assert oats.aisle is None
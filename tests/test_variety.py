@@ -0,0 +1,140 @@
+import itertools
+import os
+import random
+import sys
+from pathlib import Path
+import pytest
+from flask_login import login_user
+
+os.environ["EVENTLET_NO_GREENDNS"] = "yes"
+
+# Ensure repository root is on the Python path when running via the pytest CLI
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app import (
+    app,
+    db,
+    Recipe,
+    Ingredient,
+    User,
+    Account,
+    generate_meal_plan,
+    plan_period_days,
+)
+from overlap import IngredientMatrix
+from planner import (
+    MEAL_TYPE_BITS,
+    PLANNING_MODE_VARIETY,
+    PlanResult,
+    PlanSettings,
+    RecipeCandidate,
+    build_candidate_snapshot,
+    plan_meals,
+)
+import variety
+from variety import best_of_plans, plan_grid, score_plans
+
+DAYS = ["Monday", "Tuesday", "Wednesday"]
+# Three pasta dinners share pasta and tomato; the others share nothing
+INGREDIENTS = {
+    **{i: ["pasta", "tomato", f"sauce {i}"] for i in (1, 2, 3)},
+    **{i: [f"item {i}-{n}" for n in range(3)] for i in range(4, 10)},
+}
+CANDIDATES = build_candidate_snapshot(
+    RecipeCandidate(recipe_id, 2, MEAL_TYPE_BITS["Dinner"]) for recipe_id in INGREDIENTS
+)
+MATRIX = IngredientMatrix(INGREDIENTS)
+
+
+def _dinners(*recipe_ids):
+    plan_ids = {
+        day: {
+            "Breakfast": None,
+            "Lunch": None,
+            "Dinner": {"recipe_id": recipe_id, "status": "new"},
+        }
+        for day, recipe_id in zip(DAYS, recipe_ids)
+    }
+    return PlanResult(plan_ids, {}, [], {})
+
+
+def _score(*plans):
+    return score_plans(plan_grid(plans, DAYS), MATRIX, CANDIDATES, 2).tolist()
+
+
+def test_scores_prefer_varied_ingredients_and_spaced_repeats():
+    pasta_week, varied_week = _score(_dinners(1, 2, 3), _dinners(1, 4, 5))
+    assert varied_week > pasta_week
+    back_to_back, spaced = _score(_dinners(4, 4, 5), _dinners(4, 5, 4))
+    assert spaced > back_to_back
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_best_of_plans_never_scores_below_a_single_draw(seed):
+    settings = PlanSettings()
+    single = plan_meals(CANDIDATES, settings, {}, 2, days=DAYS, rng=random.Random(seed))
+    best = best_of_plans(
+        CANDIDATES,
+        settings,
+        {},
+        2,
+        MATRIX,
+        days=DAYS,
+        rng=random.Random(seed),
+        time_budget_ms=10_000,
+        max_plans=64,
+    )
+    assert _score(best)[0] >= _score(single)[0]
+    # Three dinners from nine recipes: the best plan has no shared ingredient
+    # or repeat
+    assert _score(best)[0] == pytest.approx(2.5)
+
+
+def test_the_same_seed_gives_the_same_plan_however_slow_the_machine(monkeypatch):
+    def search(seed):
+        rng = random.Random(seed)
+        best = best_of_plans(
+            CANDIDATES, PlanSettings(), {}, 2, MATRIX, days=DAYS, rng=rng
+        )
+        return best.plan_ids, rng.random()
+
+    expected = [search(seed) for seed in range(3)]
+    # A loaded machine: every clock reading is 20 ms after the last
+    clock = itertools.count(step=0.02)
+    monkeypatch.setattr(variety.time, "perf_counter", lambda: next(clock))
+    assert [search(seed) for seed in range(3)] == expected
+
+
+@pytest.fixture
+def test_app():
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        user = User(email="test@example.com", name="Test")
+        user.password_hash = "x"
+        account = Account(name="TestAccount")
+        account.users.append(user)
+        db.session.add_all([user, account])
+        for recipe_id, names in INGREDIENTS.items():
+            recipe = Recipe(
+                id=recipe_id, name=f"Dinner {recipe_id}", servings=2, is_dinner=True
+            )
+            recipe.ingredients = [Ingredient(name=name, quantity="1") for name in names]
+            db.session.add(recipe)
+        account.settings.planning_mode = PLANNING_MODE_VARIETY
+        db.session.commit()
+        yield user
+        db.session.remove()
+        db.drop_all()
+
+
+def test_variety_mode_plans_through_the_app(test_app):
+    with app.test_request_context("/"):
+        login_user(test_app)
+        plan = generate_meal_plan(2, {}, dates=plan_period_days("Monday", 3), seed=1)
+    dinners = [meals["Dinner"]["recipe_id"] for meals in plan.values()]
+    assert len(set(dinners)) == 3
+    assert len({r for r in dinners if r in (1, 2, 3)}) <= 1
@@ -0,0 +1,168 @@
+# meal_planner/units.py
+"""
+Quantity parsing and unit normalization shared by the app and migrations.
+
+Recipe and pantry quantities are entered as free text ("2", "1/2",
+"1 1/2", "0.75", "½"). They are parsed once when written and stored next
+to the original text so aggregation never has to parse strings.
+"""
+
+import re
+from fractions import Fraction
+from typing import Dict, Optional, Tuple
+
+# Unicode vulgar fractions people paste from recipe sites
+_UNICODE_FRACTIONS: Dict[str, str] = {
+    "½": "1/2",
+    "⅓": "1/3",
+    "⅔": "2/3",
+    "¼": "1/4",
+    "¾": "3/4",
+    "⅕": "1/5",
+    "⅖": "2/5",
+    "⅗": "3/5",
+    "⅘": "4/5",
+    "⅙": "1/6",
+    "⅚": "5/6",
+    "⅛": "1/8",
+    "⅜": "3/8",
+    "⅝": "5/8",
+    "⅞": "7/8",
+}
+
+# "1 1/2", "1/2", "1.5", "2" (after unicode fractions are expanded); a
+# whole part is only allowed before a fraction, so "1 2" does not parse
+_QUANTITY_RE = re.compile(
+    r"^(?:(?P<whole>\d+)\s+(?=\d+\s*/))?"
+    r"(?P<num>\d+(?:\.\d+)?)(?:\s*/\s*(?P<den>\d+))?$"
+)
+
+# Spelling variants mapped to the canonical unit symbol
+UNIT_ALIASES: Dict[str, str] = {
+    "gram": "g",
+    "grams": "g",
+    "gr": "g",
+    "grm": "g",
+    "kilogram": "kg",
+    "kilograms": "kg",
+    "kgs": "kg",
+    "kilo": "kg",
+    "kilos": "kg",
+    "milligram": "mg",
+    "milligrams": "mg",
+    "millilitre": "ml",
+    "millilitres": "ml",
+    "milliliter": "ml",
+    "milliliters": "ml",
+    "mls": "ml",
+    "litre": "l",
+    "litres": "l",
+    "liter": "l",
+    "liters": "l",
+    "ltr": "l",
+    "tablespoon": "tbsp",
+    "tablespoons": "tbsp",
+    "tbsps": "tbsp",
+    "tbs": "tbsp",
+    "tbl": "tbsp",
+    "teaspoon": "tsp",
+    "teaspoons": "tsp",
+    "tsps": "tsp",
+    "cups": "cup",
+    "centilitre": "cl",
+    "centilitres": "cl",
+    "centiliter": "cl",
+    "centiliters": "cl",
+    "decilitre": "dl",
+    "decilitres": "dl",
+    "deciliter": "dl",
+    "deciliters": "dl",
+    "fl. oz": "fl oz",
+    "floz": "fl oz",
+    "fluid ounce": "fl oz",
+    "fluid ounces": "fl oz",
+    "pints": "pint",
+    "pt": "pint",
+    "ounce": "oz",
+    "ounces": "oz",
+    "pound": "lb",
+    "pounds": "lb",
+    "lbs": "lb",
+    "piece": "",
+    "pieces": "",
+    "pc": "",
+    "pcs": "",
+    "each": "",
+    "unit": "",
+    "units": "",
+    "x": "",
+}
+
+# Canonical unit -> (base unit, factor to base). One base per dimension:
+# grams for mass, millilitres for volume, "" (a plain count) for items.
+# Units missing here (e.g. "tin", "clove") are their own base with factor 1.
+UNIT_REGISTRY: Dict[str, Tuple[str, float]] = {
+    # Mass
+    "mg": ("g", 0.001),
+    "g": ("g", 1.0),
+    "kg": ("g", 1000.0),
+    "oz": ("g", 28.349523125),
+    "lb": ("g", 453.59237),
+    # Volume (metric spoons and cup)
+    "ml": ("ml", 1.0),
+    "cl": ("ml", 10.0),
+    "dl": ("ml", 100.0),
+    "l": ("ml", 1000.0),
+    "tsp": ("ml", 5.0),
+    "tbsp": ("ml", 15.0),
+    "cup": ("ml", 250.0),
+    "fl oz": ("ml", 28.4130625),
+    "pint": ("ml", 568.26125),
+    # Count
+    "": ("", 1.0),
+    "dozen": ("", 12.0),
+}
+
+
+def parse_quantity(text: Optional[str]) -> Optional[float]:
+    """
+    Parses a free-text quantity into a float.
+
+    Handles whole numbers, decimals (with '.' or ','), simple fractions
+    ("1/2"), mixed numbers ("1 1/2", "1½") and unicode fractions. Returns
+    None for empty or unparseable input.
+    """
+    if text is None:
+        return None
+    value = str(text).strip().lower()
+    if not value:
+        return None
+    for symbol, fraction in _UNICODE_FRACTIONS.items():
+        # "1½" -> "1 1/2"
+        value = value.replace(symbol, f" {fraction}")
+    value = value.replace(",", ".").strip()
+    match = _QUANTITY_RE.match(value)
+    if not match:
+        return None
+    try:
+        amount = Fraction(match.group("num"))
+        if match.group("den"):
+            amount /= Fraction(int(match.group("den")))
+        if match.group("whole"):
+            amount += int(match.group("whole"))
+    except ZeroDivisionError:
+        return None
+    return float(amount)
+
+
+def canonical_unit(unit: Optional[str]) -> str:
+    """Normalizes a unit string ("Grams", "tbsp.", None) to its canonical symbol."""
+    if not unit:
+        return ""
+    value = unit.strip().lower().rstrip(".")
+    return UNIT_ALIASES.get(value, value)
+
+
+def unit_base(unit: str) -> Tuple[str, float]:
+    """Returns (base unit, factor to base) for a canonical unit."""
+    return UNIT_REGISTRY.get(unit, (unit, 1.0))
@@ -0,0 +1,191 @@
+# meal_planner/variety.py
+"""
+Best-of-K plan search for the "variety" planning mode.
+
+A single random draw easily lands three pasta dinners in one week. This
+mode draws plans in batches with planner.plan_meals and scores each batch
+at once with NumPy, on three measures: how varied the ingredients are,
+how far apart repeated recipes are, and how many planned leftover
+servings actually land in the plan. It keeps the best of a fixed
+number of plans, each drawn from its own seed taken from the caller's
+rng, so a seed always gives the same plan; the time budget is only a
+safety limit.
+"""
+
+import logging
+import random
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from overlap import IngredientMatrix
+from planner import (
+    MEAL_TYPES,
+    WEEK_DAYS,
+    CandidateSnapshot,
+    LockedMealsDict,
+    PlanResult,
+    PlanSettings,
+    leftover_days,
+    plan_meals,
+)
+
+logger = logging.getLogger(__name__)
+
+# Plans drawn per search, and the time a search may take at most, in
+# milliseconds (a safety limit, far above what max_plans normally needs)
+DEFAULT_MAX_PLANS = 64
+DEFAULT_TIME_BUDGET_MS = 1000.0
+# Plans drawn between two scoring passes
+BATCH_SIZE = 32
+
+
+class VarietyWeights(NamedTuple):
+    """Weight of each measure in a plan's score (each measure is 0..1)."""
+
+    diversity: float = 1.0
+    spacing: float = 1.0
+    leftovers: float = 0.5
+
+
+class PlanGrid(NamedTuple):
+    """
+    A batch of plans as K x days x meal types arrays: the recipe each
+    slot cooks (0 for slots that cook nothing) and the leftover slots.
+    """
+
+    cooked: np.ndarray
+    leftover: np.ndarray
+
+
+def plan_grid(plans: Sequence[PlanResult], days: Sequence[str]) -> PlanGrid:
+    cooked = np.zeros((len(plans), len(days), len(MEAL_TYPES)), dtype=np.int64)
+    leftover = np.zeros(cooked.shape, dtype=bool)
+    for k, plan in enumerate(plans):
+        for d, day in enumerate(days):
+            meals = plan.plan_ids.get(day) or {}
+            for m, meal_type in enumerate(MEAL_TYPES):
+                slot = meals.get(meal_type)
+                if not slot:
+                    continue
+                if slot.get("status") == "leftover":
+                    leftover[k, d, m] = True
+                elif (slot.get("recipe_id") or 0) > 0:
+                    cooked[k, d, m] = slot["recipe_id"]
+    return PlanGrid(cooked, leftover)
+
+
+def score_plans(
+    grid: PlanGrid,
+    matrix: IngredientMatrix,
+    candidates: CandidateSnapshot,
+    num_people: int,
+    weights: VarietyWeights = VarietyWeights(),
+) -> np.ndarray:
+    """
+    Scores every plan of the grid at once (higher is better):
+
+    - diversity: distinct ingredients over ingredient uses of the cooked
+      recipes, 1 when no two meals share an ingredient;
+    - spacing: 1 / (1 + sum of 1 / gap) over pairs of days cooking the
+      same recipe for the same meal type, 1 without repeats;
+    - leftovers: planned leftover slots over the leftover slots the
+      cooked recipes yield, 1 when nothing is left over.
+    """
+    cooked = grid.cooked
+    num_plans, num_days = cooked.shape[:2]
+    recipe_ids, inverse = np.unique(cooked, return_inverse=True)
+    inverse = inverse.reshape(cooked.shape)
+    rows = np.array([matrix.row(int(recipe_id)) for recipe_id in recipe_ids])
+    yields = np.array(
+        [
+            leftover_days(candidates.by_id[int(recipe_id)].servings, num_people)
+            if int(recipe_id) in candidates.by_id
+            else 0
+            for recipe_id in recipe_ids
+        ]
+    )
+
+    # Row 0 of the matrix is empty, so slots cooking nothing add nothing
+    incidence = matrix.matrix[rows[inverse].reshape(num_plans, -1)]
+    uses = incidence.sum(axis=1)
+    total = uses.sum(axis=1)
+    diversity = np.where(total > 0, (uses > 0).sum(axis=1) / np.maximum(total, 1), 1.0)
+
+    # K x day x day x meal type: the same recipe on both days
+    same = (cooked[:, :, None, :] == cooked[:, None, :, :]) & (
+        cooked[:, :, None, :] > 0
+    )
+    gaps = np.arange(num_days)[None, :] - np.arange(num_days)[:, None]
+    closeness = np.where(gaps > 0, 1.0 / np.maximum(gaps, 1), 0.0)
+    repeats = (same * closeness[None, :, :, None]).sum(axis=(1, 2, 3))
+    spacing = 1.0 / (1.0 + repeats)
+
+    produced = yields[inverse].sum(axis=(1, 2))
+    planned = grid.leftover.sum(axis=(1, 2))
+    leftovers = np.where(
+        produced > 0, np.minimum(planned, produced) / np.maximum(produced, 1), 1.0
+    )
+
+    return (
+        weights.diversity * diversity
+        + weights.spacing * spacing
+        + weights.leftovers * leftovers
+    )
+
+
+def best_of_plans(
+    candidates: CandidateSnapshot,
+    settings: PlanSettings,
+    locked_meals: LockedMealsDict,
+    num_people: int,
+    matrix: IngredientMatrix,
+    days: Optional[List[str]] = None,
+    rng: Optional[random.Random] = None,
+    history: Optional[List[Dict[str, Optional[int]]]] = None,
+    time_budget_ms: float = DEFAULT_TIME_BUDGET_MS,
+    max_plans: int = DEFAULT_MAX_PLANS,
+    weights: VarietyWeights = VarietyWeights(),
+) -> PlanResult:
+    """
+    Draws max_plans plans with plan_meals (same locks, defaults, leftovers
+    and repeat interval as a single draw) and returns the one score_plans
+    rates highest. Each plan gets its own seed, all taken from rng up
+    front, so the result and rng's state afterwards depend only on rng.
+
+    time_budget_ms is an upper limit for pathological catalogs, not a
+    tuning knob: if it runs out the search keeps the best plan so far and
+    logs a warning, and that plan is no longer reproducible.
+    """
+    rng = rng if rng is not None else random.Random()
+    days = list(days) if days is not None else list(WEEK_DAYS)
+    seeds = [rng.getrandbits(64) for _ in range(max(max_plans, 1))]
+    deadline = time.perf_counter() + time_budget_ms / 1000
+    best: Optional[PlanResult] = None
+    best_score = -np.inf
+    for start in range(0, len(seeds), BATCH_SIZE):
+        batch = [
+            plan_meals(
+                candidates,
+                settings,
+                locked_meals,
+                num_people,
+                days=days,
+                rng=random.Random(seed),
+                history=history,
+            )
+            for seed in seeds[start : start + BATCH_SIZE]
+        ]
+        grid = plan_grid(batch, days)
+        scores = score_plans(grid, matrix, candidates, num_people, weights)
+        index = int(np.argmax(scores))
+        if scores[index] > best_score:
+            best, best_score = batch[index], scores[index]
+        if start + BATCH_SIZE < len(seeds) and time.perf_counter() >= deadline:
+            logger.warning(
+                f"Variety search stopped after {start + BATCH_SIZE} of "
+                f"{len(seeds)} plans ({time_budget_ms:.0f} ms limit)"
+            )
+            break
+    return best